@@ -5,6 +5,7 @@ import pandas as pd
 import subprocess
 import numpy as np
 import wx
+from weights import weight_band
 
 file_name='data.csv'
 airline_companies = {1:'东方航空', 2:'中国国际航空', 3:'南方航空', 4:'上海航空',5:'春秋航空',6:'吉祥航空',7:'深圳航空',8:'中华航空',9:'全日空航空'}
@@ -14,18 +15,20 @@ Shelf_total={}#用于存储所有航空公司的相对应的货架
 tag_row_of_airlines_in_shelf=0#记录存放货架的列编号
 is_thought={}#用于记录航空公司的货架是否已经被建立了
 
-#目前还未编写的功能：1、自动调整货架中货箱按重量规律放置的功能    2、调度    3、航司名录在增加新条目之后退出程序不能存档
+#目前还未编写的功能：1、自动调整货架中已有货箱按重量规律放置的功能（新入库的货箱已按重量选层）    2、调度    3、航司名录在增加新条目之后退出程序不能存档
 
 
 
 class Shelf:
-    def __init__(self):
-        """初始化一个 6×30×6 的货架，所有位置状态设为 0（空）。"""
-        self.shelf = np.zeros((6, 1, 6), dtype=int)
+    def __init__(self, rows=6, columns=1, layers=6):
+        """初始化一个 rows×columns×layers（默认 6×1×6）的货架，所有位置状态设为 0（空）。"""
+        self.shelf = np.zeros((rows, columns, layers), dtype=int)
+        self.layer_free = np.full(layers, rows * columns)#每层的空位数，按重量选层时直接查询
 
     def is_valid_position(self, x,y,z):
         """检查坐标 (x, y, z) 是否有效。"""
-        return 0 <= x < 6 and 0 <= y < 1 and 0 <= z < 6
+        rows, columns, layers = self.shelf.shape
+        return 0 <= x < rows and 0 <= y < columns and 0 <= z < layers
 
     def is_empty(self, x, y, z):
         """检查位置 (x, y, z) 是否为空。"""
@@ -46,6 +49,7 @@ class Shelf:
         if self.is_full(x, y, z):
             raise ValueError("该位置已有货物")
         self.shelf[x, y, z] = 1
+        self.layer_free[z] -= 1
 
     def remove_item(self, x,y,z):
         """从指定位置 (x, y, z) 出库货物。"""
@@ -54,6 +58,7 @@ class Shelf:
         if self.is_empty(x,y,z):
             raise ValueError("该位置没有货物")
         self.shelf[x, y, z] = 0
+        self.layer_free[z] += 1
 
 
     def move_item(self, x,y,z):
@@ -63,18 +68,30 @@ class Shelf:
         if self.is_full(x,y,z):
             raise ValueError("该位置已经有货物")
         self.shelf[x, y, z] = 1
+        self.layer_free[z] -= 1
         return True
 
     def find_next_available(self):
         """找到下一个适合存放货物的空位，返回坐标 (x, y, z) 或 None（货架已满）。"""
-        for z in range(6):
-            for x in range(6):
-                if self.shelf[x, 0, z] == 0:
-                    return x,0,z
-
-    def auto_store(self):
-        """自动找到空位并存放货物，返回存放位置。"""
-        pos = self.find_next_available()
+        for z in range(self.shelf.shape[2]):
+            free = np.argwhere(self.shelf[:, :, z] == 0)#该层所有列的空位，按行、列顺序
+            if len(free):
+                x, y = free[0]
+                return int(x), int(y), z
+
+    def find_slot_for_weight(self, weight):
+        """按重量选层（越重越靠下），返回离理想层最近的空位坐标 (x, y, z) 或 None（货架已满）。"""
+        free_layers = np.flatnonzero(self.layer_free)
+        if len(free_layers) == 0:
+            return None
+        band = weight_band(weight, len(self.layer_free))
+        z = int(free_layers[np.argmin(np.abs(free_layers - band))])
+        x, y = np.argwhere(self.shelf[:, :, z] == 0)[0]#layer_free统计的是所有列的空位
+        return int(x), int(y), z
+
+    def auto_store(self, weight=None):
+        """自动找到空位并存放货物，给出重量时按重量选层，返回存放位置。"""
+        pos = self.find_next_available() if weight is None else self.find_slot_for_weight(weight)
         if pos is None:
             raise ValueError("货架已满")
         self.store_item(*pos)
@@ -190,197 +207,203 @@ def show_box():
                 print('%d号AEK货箱，ID：%s,所属航司：%s,入场时间：%s,重量：%s,位置：%d行%d列%d层' % (number, temp[0], temp[1], temp[2], temp[3],int(temp[4][1]),is_thought[temp[1]],int(temp[4][7])))
                 number += 1
 
-while True :
-    # step 1.先判断货物是否能够被扫描设备录入信息
-    #这块需要一个返回值来判断是否自动录入是有效的
-    # automatic_identification=f()
-    if automatic_identification:
-    # step 1.1   如果可以通过扫描仪直接录入信息
-
-        pass  # 还没写
-
-    # step 1.2   只能靠人工手动输入信息
-    else:
-        menu()
-        #判断操作序号是否合法
-        while True :
-            flag=True
-            op = input('请输入操作的序号：')
-            if op not in ('1','2','3','4','0'):
-                print('输入的操作序号不合法，请重新输入！')
-            else :
-                flag=False
-            if not flag :
-                break
-        if op == '1':
-            while True:
-                temp = True#用于判断有重复ID情况的时候，是否要退出程序
-                box_ID = input('请输入货箱的ID：')
-                with open(file_name, mode='r', encoding='utf-8') as f:
-                    id_box = csv.reader(f)
-                    rows=list(id_box)
-                    for j in rows:
-                        if box_ID == j[0] :
-                            print('出错了！此ID对应的货物已经存在！')
-                            instru=input('是否要退出程序？ 请输入Yes or no:')
-                            if instru=='Yes':
-                                break#退出程序
-                            else:
-                                temp=False#继续输入ID
-                                break
-                if temp :
-                    break
-            while True:
-                temp_2=True
-                print('请输入货箱隶属的航司的相应序号：')
-                print(airline_companies)
-                number = int(input())
-                if number <= len(airline_companies) and number >= 0 :
-                    box_airlines=airline_companies[number]
-                    temp_2=False
-                else:
-                    print('序号不合法，请重新输入！')
-                if not temp_2:
-                    break
-            box_weight = input('请输入货箱的重量(仅数字)：')+'kg'#这里还没有设置货物的最高限重与最低限重
-            box_time_entry = time.strftime('%Y-%m-%d %H:%M:%S',time.localtime())
-
-            #预设每家航空公司最开始都是统一拥有一个6*1*6的存放大小（行数为六，列数为一，高度为六），货场总大小为6*30*6
-            if airline_companies[number] in is_thought:#这个时候说明这个航空公司对应的货架已经存在了
-                cargo=Shelf_total[airline_companies[number]]
-                box_site=list(cargo.auto_store())
-            else:#对应不存在的情况
-                cargo=Shelf()
-                box_site=list(cargo.auto_store())
-                is_thought[airline_companies[number]]=tag_row_of_airlines_in_shelf
-                Shelf_total[airline_companies[number]]=cargo
-                tag_row_of_airlines_in_shelf+=1
-            aek_box(box_ID,box_airlines,box_weight,box_time_entry,box_site)#实例化box的类对象，类属性依次为ID、航司、重量、入场时间、算法计算得出来的位置
-        elif op=='2':#显示库中货箱-必须先判断有没有货！
-            show_box()
-        elif op=='3':#查询库中货箱
+if __name__ == '__main__':
+    while True :
+        # step 1.先判断货物是否能够被扫描设备录入信息
+        #这块需要一个返回值来判断是否自动录入是有效的
+        # automatic_identification=f()
+        if automatic_identification:
+        # step 1.1   如果可以通过扫描仪直接录入信息
+
+            # 扫码设备请接入 api_server.py 提供的本地API服务（数据库版货场），此处仍只支持手动录入
+            pass  # 还没写
+
+        # step 1.2   只能靠人工手动输入信息
+        else:
+            menu()
+            #判断操作序号是否合法
             while True :
-                temp_3=True
-                print(keywords)
-                kw = input('请输入查询的属性：')#现在只限制能查一个关键字
-                for k,v in key_words.items() :
-                    if kw == k:
-                        temp_3 = False
-                        key=input('请输入要查询的%s：'%kw)
-                        result_queue=query_box(key_words[kw],key)
-                        break
-                if not temp_3:
-                    break
+                flag=True
+                op = input('请输入操作的序号：')
+                if op not in ('1','2','3','4','0'):
+                    print('输入的操作序号不合法，请重新输入！')
                 else :
-                    print('关键字不合法，请重新输入！')
-            # #如果关键值对应多个货箱呢？？？用列表进行输出
-            if len(result_queue)>0 :
-                num=1
-                for i in result_queue:
-                    print('%d号货箱：ID：%s,所属航司：%s,入场时间：%s,重量：%s,位置：%s行%d列%d层' % (num,i[0],i[1],i[2],i[3],int(i[4][1]),is_thought[i[1]],int(i[4][7])))
-                    num += 1
-                op2 = input('输入5修改货箱的信息，输入6删除货箱的信息，输入7退出：')
-                if op2 == '5':#修改信息支持多关键字修改
-                    while True :
-                        temp_4=True
-                        info_box_id=input('请输入要修改货箱ID：')
-                        for find_id in result_queue:
-                            if info_box_id == find_id[0]:
-                                temp_4 = False
-                                while True :#进行查询结果的编号合法性检验
-                                    temp_4_1=True
-                                    print(keywords)  # 显示全部可以修改的属性
-                                    target=input('请输入要修改货箱的属性')
-                                    if target in keywords:
-                                        with open(file_name, mode='r', encoding='utf-8') as f:
-                                            find_box = csv.reader(f)
-                                            rows_2 = list(find_box)
-                                            if target == 'ID':
-                                                info = input('请输入修改的内容：')
-                                                for row in rows_2:
-                                                    if row[0]==info_box_id :
-                                                        row[0]=info
-                                            elif target == '航司':#如果改航司的话，改了之后的存放位置是改不了的
-                                                # for row in rows_2:
-                                                #     if row[0]==info_box_id :
-                                                #             row[1]=info
-                                                print('航司不能被修改！')
-                                            elif target == '位置':
-                                                temp_7=True
-                                                while True :
+                    flag=False
+                if not flag :
+                    break
+            if op == '1':
+                while True:
+                    temp = True#用于判断有重复ID情况的时候，是否要退出程序
+                    box_ID = input('请输入货箱的ID：')
+                    with open(file_name, mode='r', encoding='utf-8') as f:
+                        id_box = csv.reader(f)
+                        rows=list(id_box)
+                        for j in rows:
+                            if box_ID == j[0] :
+                                print('出错了！此ID对应的货物已经存在！')
+                                instru=input('是否要退出程序？ 请输入Yes or no:')
+                                if instru=='Yes':
+                                    break#退出程序
+                                else:
+                                    temp=False#继续输入ID
+                                    break
+                    if temp :
+                        break
+                while True:
+                    temp_2=True
+                    print('请输入货箱隶属的航司的相应序号：')
+                    print(airline_companies)
+                    number = int(input())
+                    if number <= len(airline_companies) and number >= 0 :
+                        box_airlines=airline_companies[number]
+                        temp_2=False
+                    else:
+                        print('序号不合法，请重新输入！')
+                    if not temp_2:
+                        break
+                box_weight = input('请输入货箱的重量(仅数字)：')+'kg'#这里还没有设置货物的最高限重与最低限重
+                try:
+                    weight_value = int(box_weight[:-2])
+                except ValueError:
+                    weight_value = None#重量不是数字时按原顺序放置
+                box_time_entry = time.strftime('%Y-%m-%d %H:%M:%S',time.localtime())
+
+                #预设每家航空公司最开始都是统一拥有一个6*1*6的存放大小（行数为六，列数为一，高度为六），货场总大小为6*30*6
+                if airline_companies[number] in is_thought:#这个时候说明这个航空公司对应的货架已经存在了
+                    cargo=Shelf_total[airline_companies[number]]
+                    box_site=list(cargo.auto_store(weight_value))
+                else:#对应不存在的情况
+                    cargo=Shelf()
+                    box_site=list(cargo.auto_store(weight_value))
+                    is_thought[airline_companies[number]]=tag_row_of_airlines_in_shelf
+                    Shelf_total[airline_companies[number]]=cargo
+                    tag_row_of_airlines_in_shelf+=1
+                aek_box(box_ID,box_airlines,box_weight,box_time_entry,box_site)#实例化box的类对象，类属性依次为ID、航司、重量、入场时间、算法计算得出来的位置
+            elif op=='2':#显示库中货箱-必须先判断有没有货！
+                show_box()
+            elif op=='3':#查询库中货箱
+                while True :
+                    temp_3=True
+                    print(keywords)
+                    kw = input('请输入查询的属性：')#现在只限制能查一个关键字
+                    for k,v in key_words.items() :
+                        if kw == k:
+                            temp_3 = False
+                            key=input('请输入要查询的%s：'%kw)
+                            result_queue=query_box(key_words[kw],key)
+                            break
+                    if not temp_3:
+                        break
+                    else :
+                        print('关键字不合法，请重新输入！')
+                # #如果关键值对应多个货箱呢？？？用列表进行输出
+                if len(result_queue)>0 :
+                    num=1
+                    for i in result_queue:
+                        print('%d号货箱：ID：%s,所属航司：%s,入场时间：%s,重量：%s,位置：%s行%d列%d层' % (num,i[0],i[1],i[2],i[3],int(i[4][1]),is_thought[i[1]],int(i[4][7])))
+                        num += 1
+                    op2 = input('输入5修改货箱的信息，输入6删除货箱的信息，输入7退出：')
+                    if op2 == '5':#修改信息支持多关键字修改
+                        while True :
+                            temp_4=True
+                            info_box_id=input('请输入要修改货箱ID：')
+                            for find_id in result_queue:
+                                if info_box_id == find_id[0]:
+                                    temp_4 = False
+                                    while True :#进行查询结果的编号合法性检验
+                                        temp_4_1=True
+                                        print(keywords)  # 显示全部可以修改的属性
+                                        target=input('请输入要修改货箱的属性')
+                                        if target in keywords:
+                                            with open(file_name, mode='r', encoding='utf-8') as f:
+                                                find_box = csv.reader(f)
+                                                rows_2 = list(find_box)
+                                                if target == 'ID':
+                                                    info = input('请输入修改的内容：')
                                                     for row in rows_2:
-                                                        if row[0] == info_box_id:
-                                                            x_site_change = input('请输入目的位置的行数:')
-                                                            z_site_change = input('请输入目的位置的层数:')
-                                                            cargo_shelf = Shelf_total[find_id[1]]
-                                                            if cargo_shelf.move_item(int(x_site_change), 0, int(z_site_change)) :
-                                                                # print(type(row[4]))
-                                                                row[4]=row[4][:1]+x_site_change+row[4][2:7]+z_site_change+row[4][4][8:]
-                                                                temp_7=False
-                                                                break
-                                                    if not temp_7:
-                                                        break
-                                        with open(file_name, 'w', encoding='utf-8',newline='') as file:
-                                            writer = csv.writer(file)
-                                            writer.writerows(rows_2)  # 将修改后的数据写回 CSV 文件
-                                        temp_4_1=False
-                                    else :
-                                        print('属性不存在，请重新输入！')
-                                    if not temp_4_1 :
-                                        decision=input('是否继续修改？继续请只输入Yes')
-                                        if decision=='Yes':
-                                            info_box_id=input('请输入要修改信息的货箱ID：')#这里没有合法性检查
-                                        else:
-                                            break
+                                                        if row[0]==info_box_id :
+                                                            row[0]=info
+                                                elif target == '航司':#如果改航司的话，改了之后的存放位置是改不了的
+                                                    # for row in rows_2:
+                                                    #     if row[0]==info_box_id :
+                                                    #             row[1]=info
+                                                    print('航司不能被修改！')
+                                                elif target == '位置':
+                                                    temp_7=True
+                                                    while True :
+                                                        for row in rows_2:
+                                                            if row[0] == info_box_id:
+                                                                x_site_change = input('请输入目的位置的行数:')
+                                                                z_site_change = input('请输入目的位置的层数:')
+                                                                cargo_shelf = Shelf_total[find_id[1]]
+                                                                if cargo_shelf.move_item(int(x_site_change), 0, int(z_site_change)) :
+                                                                    # print(type(row[4]))
+                                                                    row[4]=row[4][:1]+x_site_change+row[4][2:7]+z_site_change+row[4][4][8:]
+                                                                    temp_7=False
+                                                                    break
+                                                        if not temp_7:
+                                                            break
+                                            with open(file_name, 'w', encoding='utf-8',newline='') as file:
+                                                writer = csv.writer(file)
+                                                writer.writerows(rows_2)  # 将修改后的数据写回 CSV 文件
+                                            temp_4_1=False
+                                        else :
+                                            print('属性不存在，请重新输入！')
+                                        if not temp_4_1 :
+                                            decision=input('是否继续修改？继续请只输入Yes')
+                                            if decision=='Yes':
+                                                info_box_id=input('请输入要修改信息的货箱ID：')#这里没有合法性检查
+                                            else:
+                                                break
+                                    break
+                            if not temp_4:
                                 break
-                        if not temp_4:
-                            break
-                        else:
-                            print('ID不存在，请重新输入！')
-                elif op2 == '6':
-                    while True:
-                        temp_5 = True
-                        info_box_id = input('请输入要删除的货箱ID：')
-                        for find_id in result_queue:
-                            if info_box_id == find_id[0]:
-                                temp_5 = False
-                                cargo_shelf=Shelf_total[find_id[1]]
-                                site_x=int(find_id[4][1])
-                                site_z=int(find_id[4][7])
-                                cargo_shelf.remove_item(site_x,0,site_z)
-                                with open(file_name, mode='r', encoding='utf-8') as f:
-                                    find_box = csv.reader(f)
-                                    rows_2 = list(find_box)
-                                    row_num=0
-                                    for row in rows_2:
-                                        if row[0]==info_box_id :
-                                            delete_row_from_csv(file_name, row_num)
-                                        row_num+=1
+                            else:
+                                print('ID不存在，请重新输入！')
+                    elif op2 == '6':
+                        while True:
+                            temp_5 = True
+                            info_box_id = input('请输入要删除的货箱ID：')
+                            for find_id in result_queue:
+                                if info_box_id == find_id[0]:
+                                    temp_5 = False
+                                    cargo_shelf=Shelf_total[find_id[1]]
+                                    site_x=int(find_id[4][1])
+                                    site_z=int(find_id[4][7])
+                                    cargo_shelf.remove_item(site_x,0,site_z)
+                                    with open(file_name, mode='r', encoding='utf-8') as f:
+                                        find_box = csv.reader(f)
+                                        rows_2 = list(find_box)
+                                        row_num=0
+                                        for row in rows_2:
+                                            if row[0]==info_box_id :
+                                                delete_row_from_csv(file_name, row_num)
+                                            row_num+=1
+                                    break
+                            if not temp_5:
                                 break
-                        if not temp_5:
+                            else:
+                                print('ID不存在，请重新输入！')
+                    elif op2 == '7':
+                        pass
+                    else:
+                        print('指令错误，将回退到主页面！')
+                else :
+                    print('未找到任何相符合的结果！')
+            elif op== '4':
+                tag=len(airline_companies)+1
+                while True :
+                    temp_6 = True
+                    airline_companies_name=input('请输入对应航司的名称:')
+                    for k,v in airline_companies.items() :
+                        if airline_companies_name == v :
+                            print('该航司已存在！请重新输入')
+                            temp_6 = False
                             break
-                        else:
-                            print('ID不存在，请重新输入！')
-                elif op2 == '7':
-                    pass
-                else:
-                    print('指令错误，将回退到主页面！')
-            else :
-                print('未找到任何相符合的结果！')
-        elif op== '4':
-            tag=len(airline_companies)+1
-            while True :
-                temp_6 = True
-                airline_companies_name=input('请输入对应航司的名称:')
-                for k,v in airline_companies.items() :
-                    if airline_companies_name == v :
-                        print('该航司已存在！请重新输入')
-                        temp_6 = False
+                    if temp_6:
+                        airline_companies[tag] = airline_companies_name
+                        print('航司添加成功！')
                         break
-                if temp_6:
-                    airline_companies[tag] = airline_companies_name
-                    print('航司添加成功！')
-                    break
-        elif op=='0':
-            quit()
-            break
+            elif op=='0':
+                quit()
+                break
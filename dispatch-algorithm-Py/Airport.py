@@ -1,13 +1,42 @@
 import wx
 import wx.grid
+import bisect
+import heapq
+import json
+import queue
 import sqlite3
+import threading
 import time
+import uuid
 import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from instrumentation import instruments
+import events
+from events import Event, EventBus
+from analytics import YardAnalytics
+from api_server import ApiServer
+from dwell import DwellMonitor, stored_epoch
+from id_index import CargoIdIndex
+from journal import Journal
+from outbound import POLICIES, POLICY_LABELS, OutboundSelector
+from reslotting import ReslottingScheduler
+from weights import HEAVY_RATIO, LIGHT_RATIO, MAX_WEIGHT, WEIGHT_BANDS, weight_band
 
 DATABASE_NAME = "cargo.db"
-MAX_WEIGHT = 500
+JOURNAL_NAME = "cargo.oplog"
+# 在库超过该小时数的货箱在主界面提示
+DWELL_ALERT_HOURS = 72
+# 各工位每隔STATION_HEARTBEAT秒登记已应用的变更日志序号，并清理所有工位都已应用的变更；
+# 超过CHANGE_RETENTION秒未登记的工位视为离线，不再阻止清理，恢复后按数据库整体重建
+STATION_HEARTBEAT = 30
+CHANGE_RETENTION = 24 * 3600
+# 货位状态：预留表示已被进行中的入库请求选中、尚未提交数据库
+SLOT_EMPTY, SLOT_OCCUPIED, SLOT_RESERVED = 0, 1, 2
+# cargo表的业务列，查询时显式列出，不随新增的辅助列（如stored_at）变化
+CARGO_COLUMNS = "id, airline, timestamp, weight, position"
+CARGO_INSERT_SQL = "INSERT INTO cargo (id, airline, timestamp, weight, position, stored_at) VALUES (?,?,?,?,?,?)"
 AIRLINE_LIST = ["东方航空", "南方航空", "春秋航空", "中国国际航空", "梅塞施密特", "三菱重工", "伏尔提", "霍克・西德利"]
 # AIRLINE_LIST = ["东方航空", "南方航空", "春秋航空", "中国国际航空"]
 
@@ -19,14 +48,118 @@ class ShelfConfig:
     layers: int = 6
 
 
+# 航司货架尺寸随航司记录保存，旧数据库缺少这些列时按默认尺寸补齐
+AIRLINE_GEOMETRY_COLUMNS = (("shelf_rows", ShelfConfig.rows), ("shelf_columns", ShelfConfig.columns),
+                            ("shelf_layers", ShelfConfig.layers))
+
+
+def format_position(x, y, z, yard_column):
+    """货位字符串"行-货场列-层"，货架第0列以外的货位在末尾追加货架列号"行-货场列-层-列"
+
+    单列货架的位置字符串与原格式相同，已有数据无需迁移。
+    """
+    return f"{x}-{yard_column}-{z}" if y == 0 else f"{x}-{yard_column}-{z}-{y}"
+
+
+def parse_position(pos_str):
+    """解析货位字符串，返回货架内坐标(x, y, z)"""
+    x, _, z, *rest = map(int, pos_str.split('-'))
+    return x, (rest[0] if rest else 0), z
+
+
+def position_column(pos_str):
+    """货位字符串中的货场列，即货箱实际所在货架的航司行号"""
+    return int(pos_str.split('-')[1])
+
+
+# 按货场列筛选cargo表：位置字符串第一个"-"之后以"列号-"开头
+POSITION_COLUMN_SQL = "substr(position, instr(position, '-') + 1) LIKE ?"
+
+
+class RowAllocator:
+    """航司行号（货场列）分配：删除航司空出的行号进入空闲表，新航司优先复用最小的空闲行号"""
+
+    def __init__(self, used=()):
+        used = set(used)
+        self.next_row = max(used, default=-1) + 1
+        self.free = [row for row in range(self.next_row) if row not in used]  # 有序列表即最小堆
+
+    def allocate(self):
+        if self.free:
+            return heapq.heappop(self.free)
+        self.next_row += 1
+        return self.next_row - 1
+
+    def release(self, row):
+        heapq.heappush(self.free, row)
+        # 末尾连续的空闲行号直接收回，空闲表只保留中间的空洞
+        while self.free and max(self.free) == self.next_row - 1:
+            self.free.remove(self.next_row - 1)
+            heapq.heapify(self.free)
+            self.next_row -= 1
+
+    def lowest_free(self):
+        return self.free[0] if self.free else None
+
+
+class YardLayout:
+    """货场通道拓扑：每个航司货架占一列，AGV沿通道移动并经调度中心(hub)往返
+
+    构造时预先计算全部列两两之间的代价矩阵，求解器和AGV调度直接按下标取值；
+    被封闭的列(blocked_columns)不可经过，相关代价为inf。
+    """
+
+    def __init__(self, columns, hub_column=3, dock_columns=(), blocked_columns=(), unit_cost=10):
+        self.columns = columns
+        self.hub_column = hub_column
+        self.dock_columns = tuple(dock_columns)
+        self.blocked_columns = frozenset(blocked_columns)
+        self.unit_cost = unit_cost
+        if hub_column in self.blocked_columns:
+            raise ValueError("调度中心所在列不能封闭")
+        # 调度中心和装卸口可以位于货架列之外
+        self.size = max([columns, hub_column + 1] + [dock + 1 for dock in self.dock_columns])
+        self.distance = self._build_distance()
+        # travel_cost[a, t]：AGV从a列经调度中心到t列的代价
+        self.travel_cost = self.distance[:, [hub_column]] + self.distance[[hub_column], :]
+
+    def _build_distance(self):
+        """直线通道上的两两距离，路径经过封闭列时为inf"""
+        cols = np.arange(self.size)
+        distance = np.abs(cols[:, None] - cols[None, :]).astype(float) * self.unit_cost
+        blocked = np.zeros(self.size, dtype=int)
+        blocked[[c for c in self.blocked_columns if 0 <= c < self.size]] = 1
+        prefix = np.concatenate(([0], np.cumsum(blocked)))
+        low = np.minimum(cols[:, None], cols[None, :])
+        high = np.maximum(cols[:, None], cols[None, :])
+        distance[(prefix[high + 1] - prefix[low]) > 0] = np.inf
+        return distance
+
+    def key(self):
+        return (self.columns, self.hub_column, self.dock_columns, self.blocked_columns, self.unit_cost)
+
+    def is_blocked(self, column):
+        return column in self.blocked_columns
+
+    def nearest_dock(self, column):
+        """离指定列最近的装卸口，未配置装卸口时返回调度中心"""
+        if not self.dock_columns:
+            return self.hub_column
+        return min(self.dock_columns, key=lambda dock: self.distance[dock, column])
+
+
 class DatabaseManager:
+    def __init__(self, db_name=DATABASE_NAME):
+        self.db_name = db_name
+
     @contextmanager
     def db_connection(self):
-        conn = sqlite3.connect(DATABASE_NAME)
-        try:
-            yield conn
-        finally:
-            conn.close()
+        with instruments.timer("db.connection"):
+            conn = sqlite3.connect(self.db_name)
+            try:
+                yield conn
+            finally:
+                conn.close()
 
     def initialize_database(self):
         with self.db_connection() as conn:
@@ -40,23 +173,107 @@ class DatabaseManager:
                             airline TEXT,
                             timestamp TEXT,
                             weight INTEGER,
-                            position TEXT)''')
+                            position TEXT,
+                            stored_at INTEGER)''')
             cursor.execute('''CREATE TABLE IF NOT EXISTS airlines (
                             name TEXT PRIMARY KEY,
                             row_index INTEGER)''')
+            self.ensure_airline_geometry(cursor)
+            # 出库按航司+入库时间选箱
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_cargo_airline_time ON cargo (airline, timestamp)")
+            self.ensure_cargo_epoch(cursor)
+            # 同一货位只能有一个货箱，多个工位共用数据库时由唯一约束仲裁；
+            # 位置字符串含货场列，溢出存放到其他航司货架的货箱也受约束
+            # 航司行号同理，多个工位同时新增航司时不会分到同一列
+            for name, table, columns in (("idx_cargo_slot", "cargo", "airline, position"),
+                                         ("idx_cargo_position", "cargo", "position"),
+                                         ("idx_airlines_row", "airlines", "row_index")):
+                try:
+                    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+                except sqlite3.IntegrityError:
+                    pass  # 历史数据中已有重复位置或行号时不建唯一索引，重复行号由compact_rows重新分配
+            # 变更日志：触发器记录cargo表的每次增删改，seq即占用状态的版本号，各工位据此增量同步
+            cursor.execute('''CREATE TABLE IF NOT EXISTS cargo_changes (
+                            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                            op TEXT,
+                            id TEXT,
+                            airline TEXT,
+                            timestamp TEXT,
+                            weight INTEGER,
+                            old_position TEXT,
+                            new_position TEXT)''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS cargo_log_insert AFTER INSERT ON cargo BEGIN
+                            INSERT INTO cargo_changes (op, id, airline, timestamp, weight, old_position, new_position)
+                            VALUES ('I', NEW.id, NEW.airline, NEW.timestamp, NEW.weight, NULL, NEW.position);
+                            END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS cargo_log_delete AFTER DELETE ON cargo BEGIN
+                            INSERT INTO cargo_changes (op, id, airline, timestamp, weight, old_position, new_position)
+                            VALUES ('D', OLD.id, OLD.airline, OLD.timestamp, OLD.weight, OLD.position, NULL);
+                            END''')
+            cursor.execute('''CREATE TRIGGER IF NOT EXISTS cargo_log_update AFTER UPDATE OF position ON cargo BEGIN
+                            INSERT INTO cargo_changes (op, id, airline, timestamp, weight, old_position, new_position)
+                            VALUES ('U', NEW.id, NEW.airline, NEW.timestamp, NEW.weight, OLD.position, NEW.position);
+                            END''')
+            # 各工位已应用的变更日志序号，低于所有在线工位序号的变更可以清理
+            cursor.execute('''CREATE TABLE IF NOT EXISTS sync_stations (
+                            station TEXT PRIMARY KEY,
+                            change_seq INTEGER,
+                            updated_at INTEGER)''')
             conn.commit()
 
+    @staticmethod
+    def ensure_airline_geometry(cursor):
+        """为airlines表补上货架尺寸列"""
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(airlines)")}
+        for column, default in AIRLINE_GEOMETRY_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE airlines ADD COLUMN {column} INTEGER NOT NULL DEFAULT {default}")
+
+    @staticmethod
+    def ensure_cargo_epoch(cursor):
+        """为cargo表补上整数入库时间戳列stored_at及其索引，旧记录按timestamp（本地时间）回填"""
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(cargo)")}
+        if "stored_at" not in existing:
+            cursor.execute("ALTER TABLE cargo ADD COLUMN stored_at INTEGER")
+        cursor.execute("UPDATE cargo SET stored_at = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) "
+                       "WHERE stored_at IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_cargo_stored_at ON cargo (stored_at)")
+
 
 class Shelf:
-    def __init__(self, config=ShelfConfig(), max_weight=MAX_WEIGHT):
+    def __init__(self, config=None, max_weight=MAX_WEIGHT):
+        config = config or ShelfConfig()
         self.config = config
         self.max_weight = max_weight
         self.storage = np.zeros((config.rows, config.columns, config.layers), dtype=int)
+        # 每层空位数索引，随modify_position增量维护
+        self.layer_free = np.full(config.layers, config.rows * config.columns, dtype=int)
+
+    def resize(self, rows=None, columns=None, layers=None):
+        """扩大货架：重新分配storage并拷贝原有状态，已有位置坐标不变，不支持缩小"""
+        old = self.config
+        new = replace(old, rows=rows or old.rows, columns=columns or old.columns, layers=layers or old.layers)
+        if new.rows < old.rows or new.columns < old.columns or new.layers < old.layers:
+            raise ValueError("货架只能扩大，不能缩小")
+        if new == old:
+            return self
+        storage = np.zeros((new.rows, new.columns, new.layers), dtype=self.storage.dtype)
+        storage[:old.rows, :old.columns, :old.layers] = self.storage
+        # 原有各层增加的空位数相同，新增的层全部为空
+        added = new.rows * new.columns - old.rows * old.columns
+        self.layer_free = np.concatenate((self.layer_free + added,
+                                          np.full(new.layers - old.layers, new.rows * new.columns, dtype=int)))
+        self.storage = storage
+        self.config = new
+        return self
+
+    def rebuild_index(self):
+        """直接改写storage数组后调用，重新统计每层空位数"""
+        self.layer_free = (self.storage == SLOT_EMPTY).sum(axis=(0, 1))
+
     def is_layer_full(self, z):
         """修正层满判断逻辑（原代码只检查了第一列）"""
-        return all(self.storage[x, y, z] != 0 
-                 for x in range(self.config.rows)
-                 for y in range(self.config.columns))  # 增加y轴遍历
+        return self.layer_free[z] == 0
     def validate_position(self, x, y, z):
         if not (0 <= x < self.config.rows and
                 0 <= y < self.config.columns and
@@ -69,28 +286,146 @@ class Shelf:
 
     def modify_position(self, x, y, z, value):
         self.validate_position(x, y, z)
+        was_empty = self.storage[x, y, z] == SLOT_EMPTY
         self.storage[x, y, z] = value
+        if was_empty != (value == SLOT_EMPTY):
+            self.layer_free[z] += -1 if was_empty else 1
+
+    def clear_positions(self, positions):
+        """批量清空 [(x, y, z), ...]，一次数组赋值后重建空位索引"""
+        positions = np.asarray(positions, dtype=int).reshape(-1, 3)
+        self.storage[positions[:, 0], positions[:, 1], positions[:, 2]] = SLOT_EMPTY
+        self.rebuild_index()
+
+    def clear_occupied(self):
+        """清空全部已占用位置，保留进行中入库请求的预留"""
+        self.storage[self.storage == SLOT_OCCUPIED] = SLOT_EMPTY
+        self.rebuild_index()
 
     def find_available_position(self):
         """修正列坐标遍历逻辑"""
-        for z in range(self.config.layers):
-            if not self.is_layer_full(z):
-                # 修改点：遍历所有列（原代码固定为0列）
-                for y in range(self.config.columns):
-                    for x in range(self.config.rows):
-                        if self.get_position_status(x, y, z) == 0:
-                            return (x, y, z)
-        return None
+        return self.lowest_free_slot()
+
+    def weight_band(self, weight):
+        """按重量占比映射理想层：越重越靠下"""
+        return weight_band(weight, self.config.layers, self.max_weight)
+
+    def free_layers(self, min_layer=0, max_layer=None):
+        """[min_layer, max_layer]范围内仍有空位的层，从低到高"""
+        top = self.config.layers - 1 if max_layer is None else min(max_layer, self.config.layers - 1)
+        return min_layer + np.flatnonzero(self.layer_free[min_layer:top + 1])
+
+    def _first_free_in_layer(self, z):
+        # 先按列再按行取第一个空位，与原逐格遍历的顺序一致
+        y, x = np.argwhere(self.storage[:, :, z].T == SLOT_EMPTY)[0]
+        return (int(x), int(y), int(z))
+
+    def lowest_free_slot(self, min_layer=0, max_layer=None):
+        layers = self.free_layers(min_layer, max_layer)
+        return self._first_free_in_layer(layers[0]) if len(layers) else None
+
+    def topmost_free_slot(self, min_layer=0, max_layer=None):
+        layers = self.free_layers(min_layer, max_layer)
+        return self._first_free_in_layer(layers[-1]) if len(layers) else None
+
+    def find_slot_for_weight(self, weight):
+        """重量感知选位：重货取最低空位，轻货取最高空位，其余取离理想层最近的空位"""
+        ratio = weight / self.max_weight
+        if ratio >= HEAVY_RATIO:
+            return self.lowest_free_slot()
+        if ratio < LIGHT_RATIO:
+            return self.topmost_free_slot()
+        layers = self.free_layers()
+        if not len(layers):
+            return None
+        return self._first_free_in_layer(layers[np.argmin(np.abs(layers - self.weight_band(weight)))])
 
 
 class CargoManager:
-    def __init__(self):
-        self.db = DatabaseManager()
+    RESERVE_RETRIES = 3
+    # SQLite单条语句的参数个数上限为999
+    SQL_CHUNK = 900
+
+    def __init__(self, db_name=DATABASE_NAME, journal_path=None):
+        self.db = DatabaseManager(db_name)
         self.airline_shelves = {}
         self.airline_row_mapping = {}
         self.max_weight = MAX_WEIGHT
         self.airline_list = AIRLINE_LIST.copy()
+        # 新建航司货架的默认尺寸，各航司的实际尺寸保存在airlines表中
+        self.default_shelf_config = ShelfConfig()
+        # 本航司货架已满时是否溢出存放到其他航司的货架（货箱仍归属本航司，空闲时由重排任务归位）
+        self.allow_overflow = True
+        # 行号分配与后台行号压缩，_row_lock保证压缩期间不会分配到正在迁入的行号
+        self.row_allocator = RowAllocator()
+        self._row_lock = threading.RLock()
+        self._compactor = None
+        self.placement_worker = None
+        self._slot_lock = threading.Lock()
+        # 货场拓扑配置，列数由航司行号决定，变化时才重新计算代价矩阵
+        self.hub_column = 3
+        self.dock_columns = ()
+        self.blocked_columns = set()
+        self.travel_unit_cost = 10
+        self._yard_layout = None
+        # 最近一次入库的时间，后台重排据此判断货场是否空闲
+        self.last_activity = time.monotonic()
+        self.outbound = OutboundSelector()
+        # 多工位同步：已应用的变更日志序号，以及本工位提交但尚未越过的序号区间
+        self.change_seq = None
+        self._own_ranges = []
+        self._sync_lock = threading.Lock()
+        self._poll_conn = None
+        self._data_version = None
+        self.station_id = uuid.uuid4().hex
+        self._last_heartbeat = 0.0
+        # 变更事件在提交数据库后发布，GUI中由MainFrame把schedule设为wx.CallAfter
+        self.events = EventBus()
+        self.events.subscribe(self._count_events)
+        # 操作日志在发布线程中同步写入，不等待GUI的合并分发
+        self.journal = Journal(journal_path, change_seq=lambda: self.change_seq) if journal_path else None
+        if self.journal:
+            self.events.subscribe(self.journal.append, immediate=True)
+        # 货场统计缓存到下一次库存变更
+        self.analytics = YardAnalytics(self)
+        # 在库时长监控，随库存事件增量维护
+        self.dwell = DwellMonitor()
+        self.events.subscribe(self.dwell.on_events, immediate=True)
+        # 货箱ID的前缀/子串/模糊查找索引
+        self.id_index = CargoIdIndex()
+        self.events.subscribe(self.id_index.on_events, immediate=True)
         self.load_initial_data()
+        # 启动即登记，其他工位清理变更日志时不会越过本工位的序号
+        self._report_applied()
+
+    def _count_events(self, batch):
+        for event in batch:
+            instruments.count(f"events.{event.kind}")
+
+    def get_yard_layout(self):
+        columns = max(self.airline_row_mapping.values(), default=-1) + 1
+        key = (columns, self.hub_column, tuple(self.dock_columns), frozenset(self.blocked_columns),
+               self.travel_unit_cost)
+        if self._yard_layout is None or self._yard_layout.key() != key:
+            with instruments.timer("yard.layout_rebuild"):
+                self._yard_layout = YardLayout(*key)
+        return self._yard_layout
+
+    def set_yard_topology(self, hub_column=None, dock_columns=None, blocked_columns=None):
+        """修改调度中心/装卸口/封闭通道，下次取拓扑时重新计算代价矩阵"""
+        if hub_column is not None:
+            self.hub_column = hub_column
+        if dock_columns is not None:
+            self.dock_columns = tuple(dock_columns)
+        if blocked_columns is not None:
+            self.blocked_columns = set(blocked_columns)
+        return self.get_yard_layout()
+
+    def start_placement_worker(self, deliver=None, workers=1):
+        """启动后台入库线程，GUI中deliver传入wx.CallAfter"""
+        if self.placement_worker is None:
+            self.placement_worker = PlacementWorker(self, deliver=deliver, workers=workers)
+        return self.placement_worker
 
     def init_database_tables(self):
         """确保数据库表结构存在"""
@@ -98,14 +433,19 @@ class CargoManager:
             conn.execute('''CREATE TABLE IF NOT EXISTS airlines (
                             name TEXT PRIMARY KEY, 
                             row_index INTEGER)''')
+            DatabaseManager.ensure_airline_geometry(conn.cursor())
             conn.execute('''CREATE TABLE IF NOT EXISTS cargo (
                             id TEXT PRIMARY KEY,
                             airline TEXT,
                             timestamp TEXT,
                             weight INTEGER,
-                            position TEXT)''')
+                            position TEXT,
+                            stored_at INTEGER)''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cargo_airline_time ON cargo (airline, timestamp)")
+            DatabaseManager.ensure_cargo_epoch(conn.cursor())
             conn.commit()
 
+    @instruments.timed("cargo.load_initial_data")
     def load_initial_data(self):
         with self.db.db_connection() as conn:
             # 如果airlines表为空，插入初始数据
@@ -113,40 +453,1043 @@ class CargoManager:
             cursor.execute("SELECT COUNT(*) FROM airlines")
             if cursor.fetchone()[0] == 0:
                 for airline in self.airline_list:
-                    row_idx = len(self.airline_row_mapping)
-                    self.airline_row_mapping[airline] = row_idx
-                    self.airline_shelves[airline] = Shelf()
-                    conn.execute("INSERT INTO airlines VALUES (?,?)", (airline, row_idx))
+                    self._insert_airline(conn, airline, len(self.airline_row_mapping))
                 conn.commit()
             else:
-                # 已有数据时加载
-                cursor.execute("SELECT name, row_index FROM airlines")
-                for airline, row_idx in cursor.fetchall():
+                # 已有数据时加载，货架按保存的尺寸建立
+                cursor.execute("SELECT name, row_index, shelf_rows, shelf_columns, shelf_layers FROM airlines")
+                for airline, row_idx, *geometry in cursor.fetchall():
                     self.airline_row_mapping[airline] = row_idx
-                    shelf = Shelf()
-                    self.airline_shelves[airline] = shelf
-                    
-                    # 新增：加载已有货物位置到货架
-                    cursor.execute("SELECT position FROM cargo WHERE airline=?", (airline,))
-                    for (pos_str,) in cursor.fetchall():
-                        x, _, z = map(int, pos_str.split('-'))
-                        shelf.modify_position(x, 0, z, 1)  # 标记已占用的位置
+                    self.airline_shelves[airline] = Shelf(ShelfConfig(*geometry))
+            self.row_allocator = RowAllocator(self.airline_row_mapping.values())
+
+            # 货箱快照与变更日志序号在同一读事务中取得
+            cursor.execute("BEGIN")
+            self.change_seq = self._current_change_seq(conn)
+            # 优先从操作日志恢复货箱位置，日志不可用或与数据库不一致时扫描cargo表
+            boxes = self._journal_boxes(cursor)
+            if boxes is None:
+                boxes = {}
+                cursor.execute(f"SELECT {CARGO_COLUMNS} FROM cargo")
+                for cargo_id, airline, timestamp, weight, pos_str in cursor.fetchall():
+                    x, y, z = parse_position(pos_str)
+                    host = self._shelf_airline(airline, pos_str)
+                    boxes[cargo_id] = [airline, timestamp, weight, x, z, y, host if host != airline else None]
+                if self.journal:
+                    self.journal.reset(self.airline_row_mapping, boxes, self.change_seq)
+            conn.commit()
 
-    def get_airline_shelf(self, airline):
+        # 新增：加载已有货物位置到货架，并建立出库选箱索引
+        rows = []
+        for cargo_id, (airline, timestamp, _, x, z, *rest) in boxes.items():
+            # 旧检查点中的货箱没有列号和寄存货架
+            y = rest[0] if rest else 0
+            host = rest[1] if len(rest) > 1 else None
+            shelf = self.airline_shelves.get(host or airline)
+            if shelf is not None:
+                shelf.modify_position(x, y, z, SLOT_OCCUPIED)
+            rows.append((airline, cargo_id, timestamp, x, y, z, host))
+        self.outbound.load(rows)
+        self.dwell.load((cargo_id, airline, stored_epoch(timestamp)) for airline, cargo_id, timestamp, *_ in rows)
+        self.id_index.load((cargo_id, airline) for airline, cargo_id, *_ in rows)
+
+    @staticmethod
+    def _current_change_seq(conn):
+        """变更日志的最新序号，数据库未建变更日志时返回None"""
+        try:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='cargo_changes'").fetchone()
+        except sqlite3.OperationalError:
+            return None  # 数据库中还没有任何AUTOINCREMENT表
+        if row is None:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='cargo_changes'").fetchone()
+            return 0 if exists else None
+        return row[0]
+
+    @contextmanager
+    def _cargo_transaction(self):
+        """写cargo表的事务：BEGIN IMMEDIATE先取得写锁，提交时记下本工位产生的变更日志序号区间"""
+        with self.db.db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            start = self._current_change_seq(conn)
+            yield conn
+            self._commit_own(conn, start)
+
+    def _commit_own(self, conn, start):
+        end = self._current_change_seq(conn)
+        # 提交与记录区间之间不能插入同步，否则会把本工位的变更当作其他工位的再应用一次
+        with self._sync_lock:
+            conn.commit()
+            if start is not None and self.change_seq is not None and end != start:
+                bisect.insort(self._own_ranges, (start, end))
+                self._advance_own_ranges()
+
+    def _advance_own_ranges(self):
+        # 与已应用序号相接的本工位区间直接越过，单工位运行时区间列表始终为空
+        while self._own_ranges and self._own_ranges[0][0] <= self.change_seq:
+            self.change_seq = max(self.change_seq, self._own_ranges.pop(0)[1])
+
+    def poll_changes(self):
+        """同步其他工位的提交：PRAGMA data_version未变化时直接返回，否则增量应用变更日志
+
+        只改动发生变化的货位，返回应用的变更条数；同时定期登记本工位的序号并清理变更日志。
+        """
+        if self.change_seq is None:
+            return 0
+        self._report_applied()
+        published = []
+        with self._sync_lock:
+            if self._poll_conn is None:
+                self._poll_conn = sqlite3.connect(self.db.db_name, check_same_thread=False)
+            version = self._poll_conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return 0
+            self._data_version = version
+            latest = self._current_change_seq(self._poll_conn)
+            rows = self._poll_conn.execute(
+                "SELECT seq, op, id, airline, timestamp, weight, old_position, new_position FROM cargo_changes "
+                "WHERE seq > ? ORDER BY seq", (self.change_seq,)).fetchall()
+            # 序号连续递增，缺口说明本工位离线期间需要的变更已被清理
+            behind = latest > self.change_seq and (not rows or rows[0][0] > self.change_seq + 1)
+            for seq, *change in ([] if behind else rows):
+                if not any(start < seq <= end for start, end in self._own_ranges):
+                    event = self._apply_change(*change)
+                    if event:
+                        published.append(event)
+                self.change_seq = seq
+            self._own_ranges = [r for r in self._own_ranges if r[1] > self.change_seq]
+        if behind:
+            return self._resync()
+        published.extend(self._sync_rows())
+        instruments.count("sync.applied", len(published))
+        self.events.publish(*published)
+        return len(published)
+
+    def _report_applied(self):
+        """每隔STATION_HEARTBEAT秒登记本工位已应用的序号，并清理所有在线工位都已应用的变更日志"""
+        now = time.time()
+        if self.change_seq is None or now - self._last_heartbeat < STATION_HEARTBEAT:
+            return
+        self._last_heartbeat = now
+        try:
+            with self.db.db_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT OR REPLACE INTO sync_stations (station, change_seq, updated_at) VALUES (?,?,?)",
+                             (self.station_id, self.change_seq, int(now)))
+                conn.execute("DELETE FROM sync_stations WHERE updated_at < ?", (int(now - CHANGE_RETENTION),))
+                floor = conn.execute("SELECT MIN(change_seq) FROM sync_stations").fetchone()[0]
+                pruned = conn.execute("DELETE FROM cargo_changes WHERE seq <= ?", (floor,)).rowcount
+                conn.commit()
+        except sqlite3.OperationalError:
+            return  # 数据库忙或旧库没有sync_stations表，下次再试
+        instruments.count("sync.pruned", pruned)
+
+    def _resync(self):
+        """本工位落后于已清理的变更日志时，丢弃内存状态并按数据库重新加载
+
+        只在工位离线超过CHANGE_RETENTION后发生；进行中的预留随货架一起丢弃，提交时由唯一约束仲裁。
+        """
+        instruments.count("sync.resync")
+        with self._row_lock:
+            # 即时订阅者（日志、在库时长、ID索引）随CLEARED清空，再由load_initial_data重新加载
+            self.events.publish(Event(events.CLEARED, data={"remote": True}))
+            with self._slot_lock:
+                self.outbound.clear()
+                self.airline_row_mapping.clear()
+                self.airline_shelves.clear()
+            self._own_ranges = []
+            self.load_initial_data()
+        self._last_heartbeat = 0.0
+        return sum(self.outbound.count(airline) for airline in self.airline_shelves)
+
+    def _sync_rows(self):
+        """其他工位新增或删除了航司、压缩了行号、扩大了货架时，同步本地的航司、行号与尺寸并重建货架占用
+
+        在_row_lock下读取，本工位的压缩事务提交前不会读到旧行号；不能在持有_sync_lock时调用。
+        返回需要发布的航司新增、删除与货架扩大事件。
+        """
+        published = []
+        with self._row_lock, self.db.db_connection() as conn:
+            saved = conn.execute("SELECT name, row_index, shelf_rows, shelf_columns, shelf_layers FROM airlines")
+            rows, geometry = {}, {}
+            for name, row_idx, *size in saved.fetchall():
+                rows[name], geometry[name] = row_idx, tuple(size)
+            added = [name for name in rows if name not in self.airline_row_mapping]
+            for airline in added:
+                # 其他工位新增的航司
+                self.airline_row_mapping[airline] = rows[airline]
+                self.airline_shelves[airline] = Shelf(ShelfConfig(*geometry[airline]))
+                if airline not in self.airline_list:
+                    self.airline_list.append(airline)
+                published.append(Event(events.AIRLINE_ADDED, airline=airline,
+                                        data={"row_index": rows[airline], "remote": True}))
+            for airline, shelf in list(self.airline_shelves.items()):
+                # 变更中有货箱落在扩大的区域时_apply_change已先行扩大，这里不再重复发布
+                if airline in geometry and self._refresh_geometry(airline, shelf, geometry[airline]):
+                    config = shelf.config
+                    published.append(Event(events.SHELF_RESIZED, airline=airline,
+                                            data={"rows": config.rows, "columns": config.columns,
+                                                  "layers": config.layers, "remote": True}))
+            changed = bool(added)
+            for airline in list(self.airline_row_mapping):
+                if airline not in rows:
+                    # 其他工位删除的航司
+                    row_idx = self.airline_row_mapping.pop(airline)
+                    self.airline_shelves.pop(airline, None)
+                    if airline in self.airline_list:
+                        self.airline_list.remove(airline)
+                    self.outbound.clear(airline)
+                    published.append(Event(events.AIRLINE_REMOVED, airline=airline,
+                                           data={"row_index": row_idx, "remote": True}))
+                    changed = True
+                elif self.airline_row_mapping[airline] != rows[airline]:
+                    self.airline_row_mapping[airline] = rows[airline]
+                    changed = True
+            if changed:
+                self.row_allocator = RowAllocator(self.airline_row_mapping.values())
+                self._reload_slots(conn)
+        return published
+
+    def _reload_slots(self, conn):
+        """行号变化后按cargo表重建各货架的占用状态，并更新出库索引中的寄存货架
+
+        增量应用变更日志时按旧行号解析寄存货架，行号变化后统一按新行号重算。
+        """
+        with self._slot_lock:
+            for shelf in self.airline_shelves.values():
+                shelf.clear_occupied()
+            for cargo_id, airline, timestamp, pos_str in conn.execute(
+                    "SELECT id, airline, timestamp, position FROM cargo"):
+                if airline not in self.airline_shelves:
+                    continue
+                host = self._shelf_airline(airline, pos_str)
+                shelf = self.airline_shelves.get(host)
+                x, y, z = parse_position(pos_str)
+                if shelf is not None and shelf.get_position_status(x, y, z) == SLOT_EMPTY:
+                    shelf.modify_position(x, y, z, SLOT_OCCUPIED)
+                self.outbound.move(airline, cargo_id, x, y, z, host if host != airline else None)
+
+    def _apply_change(self, op, cargo_id, airline, timestamp, weight, old_pos, new_pos):
         if airline not in self.airline_shelves:
-            row_idx = len(self.airline_row_mapping)
-            self.airline_row_mapping[airline] = row_idx
-            self.airline_shelves[airline] = Shelf()
+            return None
+        # 溢出归位时新旧位置在不同货架上
+        old_host = self._shelf_airline(airline, old_pos) if old_pos else None
+        new_host = self._shelf_airline(airline, new_pos) if new_pos else None
+        old = parse_position(old_pos) if old_pos else None
+        new = parse_position(new_pos) if new_pos else None
+        new_shelf = self.airline_shelves.get(new_host)
+        if new and new_shelf and (new[0] >= new_shelf.config.rows or new[1] >= new_shelf.config.columns
+                                  or new[2] >= new_shelf.config.layers):
+            self._refresh_geometry(new_host, new_shelf)
+        with self._slot_lock:
+            # 本工位正在预留的货位不覆盖，冲突由提交时的唯一约束处理
+            old_shelf = self.airline_shelves.get(old_host)
+            if old and old_shelf and old_shelf.get_position_status(*old) == SLOT_OCCUPIED:
+                old_shelf.modify_position(*old, SLOT_EMPTY)
+            if new and new_shelf and new_shelf.get_position_status(*new) != SLOT_RESERVED:
+                new_shelf.modify_position(*new, SLOT_OCCUPIED)
+        data = {"remote": True}
+        host = new_host if new_host != airline else None
+        if op == 'I':
+            self.outbound.add(airline, cargo_id, timestamp, *new, host)
+            return Event(events.STORED, airline=airline, cargo_id=cargo_id, position=new,
+                         data=dict(data, timestamp=timestamp, weight=weight, host=host))
+        if op == 'D':
+            self.outbound.discard(airline, cargo_id)
+            return Event(events.RETRIEVED, airline=airline, cargo_id=cargo_id, position=old, data=data)
+        self.outbound.move(airline, cargo_id, *new, host)
+        return Event(events.MOVED, airline=airline, cargo_id=cargo_id, position=new,
+                     data=dict(data, source=old, host=host))
+
+    def _shelf_airline(self, airline, pos_str):
+        """货箱实际所在货架的航司：溢出存放的货箱按位置中的货场列找到寄存货架"""
+        column = position_column(pos_str)
+        if self.airline_row_mapping.get(airline) == column:
+            return airline
+        return next((other for other, row in self.airline_row_mapping.items() if row == column), airline)
+
+    def _journal_boxes(self, cursor):
+        """日志推导的货箱与cargo表一致时返回日志中的货箱，否则返回None
+
+        先比对日志记录的变更日志序号：其他工位的移库不改变数量和入库时间，只能由序号发现；
+        数据库未建变更日志时只比对数量和最新入库时间。
+        """
+        if self.journal is None:
+            return None
+        if self.change_seq is not None and self.journal.state.change_seq != self.change_seq:
+            return None
+        cursor.execute("SELECT COUNT(*), MAX(timestamp) FROM cargo")
+        count, latest = cursor.fetchone()
+        boxes = self.journal.state.boxes
+        if len(boxes) != count or max((box[1] for box in boxes.values()), default=None) != latest:
+            return None
+        return {cargo_id: list(box) for cargo_id, box in boxes.items()}
+
+    def _insert_airline(self, conn, airline, row_idx, config=None):
+        """写入航司记录并建立对应尺寸的空货架"""
+        config = config or self.default_shelf_config
+        conn.execute("INSERT INTO airlines (name, row_index, shelf_rows, shelf_columns, shelf_layers) "
+                     "VALUES (?,?,?,?,?)", (airline, row_idx, config.rows, config.columns, config.layers))
+        self.airline_row_mapping[airline] = row_idx
+        self.airline_shelves[airline] = Shelf(config)
+
+    def _create_airline(self, airline, config=None):
+        """在写事务中为航司分配数据库中最小的未用行号并写入，返回行号
+
+        多个工位共用数据库时各自的RowAllocator可能过时，行号以事务内读到的airlines表为准；
+        其他工位已添加该航司时不写入，同步其记录后返回None。
+        """
+        with self._row_lock:
             with self.db.db_connection() as conn:
-                conn.execute("INSERT INTO airlines VALUES (?,?)", (airline, row_idx))
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT 1 FROM airlines WHERE name=?", (airline,)).fetchone():
+                    conn.rollback()
+                    row_idx = None
+                else:
+                    row_idx = RowAllocator(row for row, in conn.execute("SELECT row_index FROM airlines")).allocate()
+                    try:
+                        self._insert_airline(conn, airline, row_idx, config)
+                        conn.commit()
+                    except sqlite3.Error:
+                        self.airline_row_mapping.pop(airline, None)
+                        self.airline_shelves.pop(airline, None)
+                        raise
+                    self.row_allocator = RowAllocator(self.airline_row_mapping.values())
+            if row_idx is None:
+                self.events.publish(*self._sync_rows())
+        return row_idx
+
+    def get_airline_shelf(self, airline):
+        if airline not in self.airline_shelves:
+            row_idx = self._create_airline(airline)
+            if row_idx is not None:
+                self.events.publish(Event(events.AIRLINE_ADDED, airline=airline, data={"row_index": row_idx}))
         return self.airline_shelves[airline]
 
+    def add_airline(self, airline, config=None):
+        """新增航司及其货架，config为货架尺寸（默认default_shelf_config），已存在时抛出ValueError"""
+        if airline in self.airline_list:
+            raise ValueError("航空公司已存在！")
+        row_idx = self._create_airline(airline, config)
+        if row_idx is None:
+            raise ValueError("航空公司已存在！")
+        self.airline_list.append(airline)
+        self.events.publish(Event(events.AIRLINE_ADDED, airline=airline, data={"row_index": row_idx}))
+
+    def resize_shelf(self, airline, rows=None, columns=None, layers=None):
+        """在线扩大航司货架并保存新尺寸，只重新分配内存中的数组，不重读cargo表"""
+        shelf = self.airline_shelves.get(airline)
+        if shelf is None:
+            raise ValueError(f"未知的航空公司: {airline}")
+        # 与入库预留互斥，避免在拷贝数组期间标记的货位丢失
+        with self._slot_lock:
+            shelf.resize(rows, columns, layers)
+            config = shelf.config
+        with self.db.db_connection() as conn:
+            conn.execute("UPDATE airlines SET shelf_rows=?, shelf_columns=?, shelf_layers=? WHERE name=?",
+                         (config.rows, config.columns, config.layers, airline))
+            conn.commit()
+        self.events.publish(Event(events.SHELF_RESIZED, airline=airline,
+                                  data={"rows": config.rows, "columns": config.columns, "layers": config.layers}))
+        return config
+
+    def _refresh_geometry(self, airline, shelf, saved=None):
+        """其他工位扩大了货架时，按airlines表中的尺寸（saved，缺省时查询）同步本地货架，尺寸变化时返回True"""
+        if saved is None:
+            saved = self._poll_conn.execute("SELECT shelf_rows, shelf_columns, shelf_layers FROM airlines WHERE name=?",
+                                            (airline,)).fetchone()
+        if not saved:
+            return False
+        with self._slot_lock:
+            current = (shelf.config.rows, shelf.config.columns, shelf.config.layers)
+            target = tuple(max(size, saved_size) for size, saved_size in zip(current, saved))
+            if target == current:
+                return False
+            shelf.resize(*target)
+        return True
+
+    def remove_airline(self, airline):
+        """删除航司及其货架，该航司在库的货箱（包括溢出存放在其他货架上的）一并出库
+
+        数据库中不存在、或货架上还有其他航司溢出存放的货箱时抛出ValueError。
+        空出的行号进入空闲表，由compact_rows把末尾的航司迁入，返回出库的货箱数。
+        """
+        with self._row_lock:
+            with self._cargo_transaction() as conn:
+                row = conn.execute("SELECT row_index FROM airlines WHERE name=?", (airline,)).fetchone()
+                if not row:
+                    raise ValueError("航空公司不存在！")
+                hosted = conn.execute(f"SELECT COUNT(*) FROM cargo WHERE airline != ? AND {POSITION_COLUMN_SQL}",
+                                      (airline, f"{row[0]}-%")).fetchone()[0]
+                if hosted:
+                    raise ValueError(f"该航司货架上还有{hosted}个其他航司溢出存放的货箱，请先出库或等待归位")
+                boxes = conn.execute(f"SELECT {CARGO_COLUMNS} FROM cargo WHERE airline=?", (airline,)).fetchall()
+                conn.execute("DELETE FROM cargo WHERE airline=?", (airline,))
+                conn.execute("DELETE FROM airlines WHERE name=?", (airline,))
+            # 先按出库处理，释放溢出货箱占用的其他货架货位
+            self._after_retrieve(boxes)
+            # 多个航司共用同一行号（历史数据）时，该行号仍被占用
+            if list(self.airline_row_mapping.values()).count(row[0]) == 1:
+                self.row_allocator.release(row[0])
+            # 强制更新内存数据（无论是否存在都尝试删除）
+            if airline in self.airline_list:
+                self.airline_list.remove(airline)
+            self.airline_row_mapping.pop(airline, None)
+            self.airline_shelves.pop(airline, None)
+        self.outbound.clear(airline)
+        self.events.publish(Event(events.AIRLINE_REMOVED, airline=airline,
+                                  data={"row_index": row[0], "count": len(boxes)}))
+        return len(boxes)
+
+    def compact_rows(self):
+        """压缩航司行号：把行号最大的航司依次迁到最小的空闲行号，重复的行号也重新分配
+
+        每迁移一个航司在一个事务中改写其全部货箱的位置字符串，返回[(航司, 原行号, 新行号), ...]。
+        """
+        relocated = []
+        # 先同步其他工位新增的航司，空闲行号以数据库为准；仍有冲突时由行号唯一索引拒绝
+        self.events.publish(*self._sync_rows())
+        with instruments.timer("yard.compact_rows"):
+            while True:
+                with self._row_lock:
+                    move = self._next_relocation()
+                    if move is None:
+                        break
+                    self._relocate_airline(*move)
+                relocated.append(move)
+        return relocated
+
+    def _next_relocation(self):
+        by_row = {}
+        for airline, row in sorted(self.airline_row_mapping.items(), key=lambda item: item[1]):
+            if row in by_row:
+                return airline, row, self.row_allocator.allocate()
+            by_row[row] = airline
+        target = self.row_allocator.lowest_free()
+        if target is None or not by_row or max(by_row) < target:
+            return None
+        heapq.heappop(self.row_allocator.free)
+        row = max(by_row)
+        return by_row[row], row, target
+
+    def _relocate_airline(self, airline, old_row, new_row):
+        """在_row_lock下调用：把航司迁到新行号，货箱位置、AGV与内存映射一起更新"""
+        try:
+            # 迁移该货架上的全部货箱（含其他航司溢出存放的）；行号被多个航司共用时只迁移本航司的
+            query = f"SELECT id, position FROM cargo WHERE {POSITION_COLUMN_SQL}"
+            params = (f"{old_row}-%",)
+            if list(self.airline_row_mapping.values()).count(old_row) > 1:
+                query, params = query + " AND airline=?", params + (airline,)
+            with self._cargo_transaction() as conn:
+                rows = conn.execute(query, params).fetchall()
+                conn.executemany("UPDATE cargo SET position=? WHERE id=?",
+                                 [(format_position(*parse_position(pos_str), new_row), cargo_id)
+                                  for cargo_id, pos_str in rows])
+                conn.execute("UPDATE airlines SET row_index=? WHERE name=?", (new_row, airline))
+                # 映射在提交前更新：其他写事务要等本事务提交后才能开始，读到的一定是新行号
+                self.airline_row_mapping[airline] = new_row
+                agv_events = self._park_agvs(conn, old_row, new_row)
+        except Exception:
+            self.airline_row_mapping[airline] = old_row
+            self.row_allocator.release(new_row)
+            raise
+        if old_row not in self.airline_row_mapping.values():
+            self.row_allocator.release(old_row)
+        instruments.count("yard.relocated_boxes", len(rows))
+        self.events.publish(Event(events.AIRLINE_RELOCATED, airline=airline,
+                                  data={"row_index": new_row, "old_row_index": old_row, "count": len(rows)}),
+                            *agv_events)
+
+    def _park_agvs(self, conn, old_row, new_row):
+        """停在原列的AGV随货架迁移，停在货场范围外的AGV移到最近的空闲列"""
+        columns = max(self.airline_row_mapping.values(), default=-1) + 1
+        agv_rows = conn.execute("SELECT rowid, position FROM agv ORDER BY rowid").fetchall()
+        taken = {position for _, position in agv_rows}
+        published = []
+        for rowid, position in agv_rows:
+            target = position
+            if position == old_row and new_row not in taken:
+                target = new_row
+            elif position >= columns:
+                target = next((c for c in range(columns - 1, -1, -1) if c not in taken), position)
+            if target != position:
+                taken.discard(position)
+                taken.add(target)
+                conn.execute("UPDATE agv SET position=? WHERE rowid=?", (target, rowid))
+                published.append(Event(events.AGV_MOVED, position=(position, target), data={"agv": rowid}))
+        return published
+
+    @instruments.timed("inventory.rehome_overflow")
+    def rehome_overflow(self, max_moves=None):
+        """把溢出存放的货箱按入库先后移回本航司货架（按重量选位），返回归位的货箱ID列表
+
+        本航司货架仍满时跳过该货箱；由后台重排任务在货场空闲时调用。
+        """
+        moved = []
+        for airline, cargo_id in self.outbound.overflow():
+            if max_moves is not None and len(moved) >= max_moves:
+                break
+            shelf = self.airline_shelves.get(airline)
+            if shelf is None or not shelf.layer_free.any():
+                continue
+            with self.db.db_connection() as conn:
+                row = conn.execute("SELECT weight FROM cargo WHERE id=?", (cargo_id,)).fetchone()
+            position = shelf.find_slot_for_weight(row[0]) if row else None
+            if position is None:
+                continue
+            try:
+                self.move_cargo(cargo_id, position, host=airline)
+            except ValueError:
+                continue  # 状态已变化，下一轮重试
+            moved.append(cargo_id)
+        return moved
+
+    def start_row_compaction(self):
+        """在后台线程中压缩行号，已有压缩任务在运行时不重复启动"""
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self.compact_rows, name="row-compaction", daemon=True)
+            self._compactor.start()
+        return self._compactor
+
+    def move_agv(self, current_pos, new_pos):
+        """手动移动AGV，越界、通道封闭或与其他AGV碰撞时抛出ValueError"""
+        layout = self.get_yard_layout()
+        max_column = layout.columns - 1
+        if new_pos < 0 or new_pos > max_column:
+            raise ValueError(f"无法移动，有效位置范围0-{max_column}")
+        if layout.is_blocked(new_pos):
+            raise ValueError("移动失败：该通道已封闭！")
+        with self.db.db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT position FROM agv WHERE position=?", (new_pos,))
+            if cursor.fetchone():
+                raise ValueError("移动失败：即将与其他AGV发生碰撞！")
+            cursor.execute("UPDATE agv SET position=? WHERE position=?", (new_pos, current_pos))
+            conn.commit()
+        self.events.publish(Event(events.AGV_MOVED, position=(current_pos, new_pos)))
+
+    def reserve_slot(self, shelf, position):
+        """原子地把空位标记为预留，位置已被占用或预留时返回False"""
+        with self._slot_lock:
+            if shelf.get_position_status(*position) != SLOT_EMPTY:
+                return False
+            shelf.modify_position(*position, SLOT_RESERVED)
+            return True
+
+    def release_slot(self, shelf, position):
+        with self._slot_lock:
+            if shelf.get_position_status(*position) == SLOT_RESERVED:
+                shelf.modify_position(*position, SLOT_EMPTY)
+
+    @instruments.timed("inventory.smart_store")
+    def smart_store(self, cargo_id, airline, weight):
+        """智能入库核心逻辑：遗传算法选位、预留货位、提交数据库，返回入库记录"""
+        record, error = self.smart_store_batch([(cargo_id, airline, weight)])[0]
+        if error:
+            raise error
+        return record
+
+    def existing_ids(self, cargo_ids):
+        """返回cargo_ids中已在库的货箱ID集合"""
+        cargo_ids = list(cargo_ids)
+        existing = set()
+        with self.db.db_connection() as conn:
+            for start in range(0, len(cargo_ids), self.SQL_CHUNK):
+                chunk = cargo_ids[start:start + self.SQL_CHUNK]
+                rows = conn.execute(f"SELECT id FROM cargo WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                existing.update(row[0] for row in rows)
+        return existing
+
+    def _plan_store(self, airline, weight, agv_positions):
+        """为一个货箱求解AGV与货位并预留，返回(货架所属航司, 货架, 目标列, 求解结果)
+
+        本航司货架已满且允许溢出时，改为存放到离本航司最近的有空位的货架。
+        """
+        self.get_airline_shelf(airline)
+        # 求解期间其他请求可能选中同一位置，预留失败时基于最新状态重新求解
+        for _ in range(self.RESERVE_RETRIES):
+            host = self._placement_host(airline)
+            shelf = self.airline_shelves[host]
+            target_column = self.airline_row_mapping[host]
+            result = GeneticAlgorithmSolver(
+                agv_positions=agv_positions,
+                target_column=target_column,
+                cargo_weight=int(weight),
+                shelf=shelf,
+                travel_cost=self.get_yard_layout().travel_cost,
+                column_cost=self.travel_unit_cost
+            ).solve()
+            if self.reserve_slot(shelf, result.position):
+                return host, shelf, target_column, result
+        raise ValueError("货位预留冲突，请重试")
+
+    def _placement_host(self, airline):
+        """入库货架：本航司货架有空位时为本航司，否则按货场通道距离取最近的有空位的货架"""
+        if self.airline_shelves[airline].layer_free.any():
+            return airline
+        if not self.allow_overflow:
+            raise ValueError("货架所有层已满")
+        distance = self.get_yard_layout().distance[self.airline_row_mapping[airline]]
+        hosts = [(distance[row], row, other) for other, row in self.airline_row_mapping.items()
+                 if other != airline and np.isfinite(distance[row])
+                 and self.airline_shelves[other].layer_free.any()]
+        if not hosts:
+            raise ValueError("货架所有层已满，且没有可溢出存放的货架")
+        instruments.count("inventory.overflow")
+        return min(hosts)[2]
+
+    @instruments.timed("inventory.smart_store_batch")
+    def smart_store_batch(self, items):
+        """组提交：items为[(货箱ID, 航司, 重量), ...]，逐个选位并预留后在同一事务中提交
+
+        返回与items一一对应的[(入库记录, None) 或 (None, 异常), ...]；
+        提交失败时释放全部预留，所有请求都返回该异常。其他工位抢先占用同一货位
+        或使用了相同ID时（唯一约束冲突），先同步其变更再整批重新选位。
+        """
+        for _ in range(self.RESERVE_RETRIES):
+            try:
+                return self._store_attempt(items)
+            except sqlite3.IntegrityError:
+                instruments.count("sync.store_conflicts")
+                self.poll_changes()
+        error = ValueError("货位被其他工位占用，请重试")
+        return [(None, error)] * len(items)
+
+    def _store_attempt(self, items):
+        results = [None] * len(items)
+        existing = self.existing_ids([item[0] for item in items])
+        plans = []
+        # 选位期间持有行号锁：后台压缩不会在此期间迁移航司、缩小货场，AGV位置与代价矩阵一致
+        with self._row_lock:
+            with self.db.db_connection() as conn:
+                # 获取AGV位置
+                agv_rows = conn.execute("SELECT rowid, position FROM agv ORDER BY rowid").fetchall()
+            agv_positions = [position for _, position in agv_rows]
+
+            for i, (cargo_id, airline, weight) in enumerate(items):
+                try:
+                    if cargo_id in existing:
+                        raise ValueError("货箱ID已存在")
+                    if not agv_rows:
+                        raise ValueError("没有可调度的AGV")
+                    host, shelf, target_column, result = self._plan_store(airline, weight, agv_positions)
+                except Exception as e:
+                    results[i] = (None, e)
+                    continue
+                existing.add(cargo_id)
+                agv_from = agv_positions[result.agv_id]
+                # 同批后续货箱按AGV调度后的位置求解
+                agv_positions[result.agv_id] = target_column
+                plans.append((i, cargo_id, airline, int(weight), shelf, target_column, result, agv_from, host))
+        if not plans:
+            return results
+
+        time_label = time.strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            with self._cargo_transaction() as conn:
+                # 行号在写事务内重新读取：后台压缩迁移了该航司时按新行号写入
+                plans = [plan[:5] + (self.airline_row_mapping[plan[8]],) + plan[6:] for plan in plans]
+                # AGV调度与货箱记录在同一事务中提交
+                for _, cargo_id, airline, weight, _, target_column, result, _, _ in plans:
+                    position = result.position
+                    conn.execute("UPDATE agv SET position=? WHERE rowid=?",
+                                 (int(target_column), int(agv_rows[result.agv_id][0])))
+                    conn.execute(CARGO_INSERT_SQL, (cargo_id, airline, time_label, weight,
+                                                    format_position(*position, target_column), stored_epoch(time_label)))
+        except Exception as e:
+            for plan in plans:
+                i, shelf, result = plan[0], plan[4], plan[6]
+                self.release_slot(shelf, result.position)
+                results[i] = (None, e)
+            if isinstance(e, sqlite3.IntegrityError):
+                raise
+            return results
+
+        published = []
+        for i, cargo_id, airline, weight, shelf, target_column, result, agv_from, host in plans:
+            position = result.position
+            host = host if host != airline else None
+            shelf.modify_position(*position, SLOT_OCCUPIED)
+            self.outbound.add(airline, cargo_id, time_label, *position, host)
+            published += [
+                Event(events.STORED, airline=airline, cargo_id=cargo_id, position=tuple(position),
+                      data={"weight": weight, "timestamp": time_label, "host": host}),
+                Event(events.AGV_MOVED, position=(int(agv_from), int(target_column)),
+                      data={"agv": agv_rows[result.agv_id][0]}),
+            ]
+            results[i] = ({
+                "id": cargo_id,
+                "airline": airline,
+                "agv_id": result.agv_id,
+                "timestamp": time_label,
+                "weight": weight,
+                "position": format_position(*position, target_column),
+                "host": host,
+            }, None)
+        self.last_activity = time.monotonic()
+        self.events.publish(*published)
+        return results
+
+    def shelf_boxes(self, airline):
+        """返回货架上的货箱 [(货箱ID, 重量, (x, y, z)), ...]，包括其他航司溢出存放在该货架上的货箱"""
+        with self.db.db_connection() as conn:
+            rows = conn.execute(f"SELECT id, weight, position FROM cargo WHERE {POSITION_COLUMN_SQL}",
+                                (f"{self.airline_row_mapping[airline]}-%",)).fetchall()
+        return [(cargo_id, int(weight), parse_position(pos_str)) for cargo_id, weight, pos_str in rows]
+
+    @instruments.timed("cargo.move")
+    def move_cargo(self, cargo_id, position, host=None):
+        """把货箱移到空位，由离该列最近的AGV执行；目标位置不可用时抛出ValueError
+
+        host为目标货架所属航司，默认为货箱当前所在的货架；溢出货箱归位时传入货箱所属航司。
+        """
+        with self.db.db_connection() as conn:
+            row = conn.execute("SELECT airline, position FROM cargo WHERE id=?", (cargo_id,)).fetchone()
+        if row is None:
+            raise ValueError("货箱不存在")
+        airline, old_str = row
+        source_shelf = self.get_airline_shelf(self._shelf_airline(airline, old_str))
+        host = host or self._shelf_airline(airline, old_str)
+        if host not in self.airline_shelves:
+            raise ValueError(f"未知的航空公司: {host}")
+        shelf = self.airline_shelves[host]
+        column = self.airline_row_mapping[host]
+        source = parse_position(old_str)
+        if not self.reserve_slot(shelf, position):
+            raise ValueError("目标货位已被占用")
+
+        new_str = format_position(*position, column)
+        try:
+            with self._cargo_transaction() as conn:
+                # 以原位置为条件更新，货箱期间被出库或移动时不生效
+                cursor = conn.execute("UPDATE cargo SET position=? WHERE id=? AND position=?",
+                                      (new_str, cargo_id, old_str))
+                if cursor.rowcount != 1:
+                    raise ValueError("货箱位置已变化")
+                agv_event = self._dispatch_nearest_agv(conn, column)
+        except sqlite3.IntegrityError:
+            self.release_slot(shelf, position)
+            raise ValueError("目标货位已被其他工位占用")
+        except Exception:
+            self.release_slot(shelf, position)
+            raise
+        with self._slot_lock:
+            shelf.modify_position(*position, SLOT_OCCUPIED)
+            source_shelf.modify_position(*source, SLOT_EMPTY)
+        host = host if host != airline else None
+        self.outbound.move(airline, cargo_id, *position, host)
+        self.events.publish(Event(events.MOVED, airline=airline, cargo_id=cargo_id, position=tuple(position),
+                                  data={"source": source, "host": host}),
+                            *filter(None, [agv_event]))
+        return new_str
+
+    def _dispatch_nearest_agv(self, conn, column):
+        """在conn的事务中把离该列最近的AGV调度过去，返回待提交后发布的agv_moved事件"""
+        agv_rows = conn.execute("SELECT rowid, position FROM agv ORDER BY rowid").fetchall()
+        if not agv_rows:
+            return None
+        distance = self.get_yard_layout().distance
+        rowid, old = min(agv_rows, key=lambda agv: distance[int(agv[1]), column])
+        conn.execute("UPDATE agv SET position=? WHERE rowid=?", (int(column), int(rowid)))
+        return Event(events.AGV_MOVED, position=(int(old), int(column)), data={"agv": rowid})
+
+    def _free_slots(self, airline, positions):
+        shelf = self.get_airline_shelf(airline)
+        with self._slot_lock:
+            shelf.clear_positions(positions)
+
+    def _after_retrieve(self, rows, agv_events=()):
+        """出库提交后按货架批量清空货位、更新出库索引并发布事件"""
+        by_airline = {}
+        published = []
+        for cargo_id, airline, _, _, pos_str in rows:
+            position = parse_position(pos_str)
+            by_airline.setdefault(self._shelf_airline(airline, pos_str), []).append(position)
+            self.outbound.discard(airline, cargo_id)
+            published.append(Event(events.RETRIEVED, airline=airline, cargo_id=cargo_id, position=position))
+        for airline, positions in by_airline.items():
+            if airline in self.airline_shelves:
+                self._free_slots(airline, positions)
+        self.events.publish(*published, *filter(None, agv_events))
+
+    def _delete_rows(self, conn, rows):
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), self.SQL_CHUNK):
+            chunk = ids[start:start + self.SQL_CHUNK]
+            conn.execute(f"DELETE FROM cargo WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        # AGV调度到货箱实际所在的货架列
+        return [self._dispatch_nearest_agv(conn, column)
+                for column in dict.fromkeys(position_column(row[4]) for row in rows)]
+
+    @instruments.timed("outbound.retrieve_many")
+    def retrieve_many(self, cargo_ids):
+        """按ID列表批量出库，在同一事务中删除，返回被删除的货箱记录（不存在的ID忽略）"""
+        cargo_ids = list(dict.fromkeys(cargo_ids))
+        if not cargo_ids:
+            return []
+        with self._cargo_transaction() as conn:
+            rows = []
+            for start in range(0, len(cargo_ids), self.SQL_CHUNK):
+                chunk = cargo_ids[start:start + self.SQL_CHUNK]
+                rows += conn.execute(f"SELECT {CARGO_COLUMNS} FROM cargo WHERE id IN ({','.join('?' * len(chunk))})",
+                                     chunk).fetchall()
+            agv_events = self._delete_rows(conn, rows)
+        self._after_retrieve(rows, agv_events)
+        return rows
+
+    @instruments.timed("outbound.retrieve_where")
+    def retrieve_where(self, predicate):
+        """出库predicate(记录)为真的全部货箱，记录为 (id, airline, timestamp, weight, position)"""
+        with self._cargo_transaction() as conn:
+            rows = [row for row in conn.execute(f"SELECT {CARGO_COLUMNS} FROM cargo") if predicate(row)]
+            agv_events = self._delete_rows(conn, rows)
+        self._after_retrieve(rows, agv_events)
+        return rows
+
+    @instruments.timed("outbound.retrieve_all")
+    def retrieve_all(self):
+        """一键全部出库，返回出库的货箱数"""
+        with self._cargo_transaction() as conn:
+            count = conn.execute("DELETE FROM cargo").rowcount
+        with self._slot_lock:
+            for shelf in self.airline_shelves.values():
+                shelf.clear_occupied()
+        self.outbound.clear()
+        self.events.publish(Event(events.CLEARED, data={"count": count}))
+        return count
+
+    def retrieve_cargo(self, cargo_id):
+        """按ID出库，返回被删除的货箱记录，货箱不存在时返回None"""
+        rows = self.retrieve_many([cargo_id])
+        return rows[0] if rows else None
+
+    def _outbound_host_costs(self, airline):
+        """就近出库用：最近的AGV经调度中心到该航司各寄存货架列的代价，{寄存货架(本航司为None): 代价}"""
+        with self.db.db_connection() as conn:
+            agv_columns = [int(position) for position, in conn.execute("SELECT position FROM agv")]
+        layout = self.get_yard_layout()
+        agv_columns = [column for column in agv_columns if 0 <= column < layout.size]
+        if not agv_columns:
+            return {}
+        return {(None if host == airline else host): float(layout.travel_cost[agv_columns, column].min())
+                for host, column in self.airline_row_mapping.items() if column < layout.size}
+
+    @instruments.timed("outbound.release")
+    def release_airline(self, airline, count=1, policy="fifo"):
+        """按策略（fifo/top/nearest）为航司出库至多count个货箱，在同一事务中提交
+
+        count为None时出库该航司全部货箱。返回出库的 [(货箱ID, 入库时间, 位置), ...]，
+        航司没有货箱时返回空列表。
+        """
+        if count is None:
+            count = self.outbound.count(airline)
+        host_costs = self._outbound_host_costs(airline) if policy == "nearest" else None
+        taken = self.outbound.take(airline, policy, count, host_costs)
+        if not taken:
+            return []
+        try:
+            # 溢出存放的货箱按寄存货架的列生成位置
+            released = [(cargo_id, timestamp, format_position(x, y, z, self.airline_row_mapping[host or airline]))
+                        for cargo_id, timestamp, x, y, z, host in taken]
+            with self._cargo_transaction() as conn:
+                cursor = conn.executemany("DELETE FROM cargo WHERE id=? AND position=?",
+                                          [(cargo_id, pos_str) for cargo_id, _, pos_str in released])
+                if cursor.rowcount != len(released):
+                    raise ValueError("货箱状态已变化，请重试")
+                agv_events = [self._dispatch_nearest_agv(conn, column)
+                              for column in dict.fromkeys(position_column(pos_str) for _, _, pos_str in released)]
+        except Exception:
+            self.outbound.restore(airline, taken)
+            raise
+        self._after_retrieve([(cargo_id, airline, timestamp, None, pos_str)
+                              for cargo_id, timestamp, pos_str in released], agv_events)
+        return released
+
+    @instruments.timed("dwell.overdue")
+    def overdue_cargo(self, hours, limit=None):
+        """在库超过hours小时的货箱，按入库时间从早到晚返回 [(cargo_id, airline, 入库时间戳), ...]"""
+        return self.dwell.overdue(hours * 3600, limit=limit)
+
+    @instruments.timed("query.search_ids")
+    def search_ids(self, text, limit=50):
+        """按部分ID查找货箱：完全匹配、前缀、子串、编辑距离为1，返回 [(cargo_id, 匹配方式), ...]"""
+        return self.id_index.search(text, limit)
+
+    def cargo_query(self, property, inputs):
+        """把查询方式（货箱的ID/航空公司/位置/在库时长）转为cargo表的WHERE子句和参数，均可走索引"""
+        if property == "货箱的ID":
+            return "id = ?", [inputs[property]]
+        if property == "航空公司":
+            return "airline = ?", [inputs[property]]
+        if property == "位置":
+            # 列数为货架内的列号，未填写时不限；枚举各货架上该行该层的全部货位字符串，按位置唯一索引查找
+            x, z = int(inputs["行数"]), int(inputs["层数"])
+            positions = [format_position(x, y, z, self.airline_row_mapping[airline])
+                         for airline, shelf in list(self.airline_shelves.items())
+                         if airline in self.airline_row_mapping
+                         for y in ([int(inputs["列数"])] if inputs.get("列数") else range(shelf.config.columns))]
+            return "position IN (SELECT value FROM json_each(?))", [json.dumps(positions)]
+        if property == "在库时长":
+            return "stored_at <= ?", [time.time() - float(inputs["小时数"]) * 3600]
+        raise ValueError(f"未知的查询方式: {property}")
+
+    @instruments.timed("cargo.search")
+    def search_cargo(self, property, inputs):
+        """按查询方式（货箱的ID/航空公司/位置/在库时长）筛选货箱记录，在库时长按入库时间从早到晚排序"""
+        where, params = self.cargo_query(property, inputs)
+        order = " ORDER BY stored_at" if property == "在库时长" else ""
+        with self.db.db_connection() as conn:
+            return conn.execute(f"SELECT {CARGO_COLUMNS} FROM cargo WHERE {where}{order}", params).fetchall()
+
+    @instruments.timed("cargo.bulk_inbound")
+    def bulk_random_inbound(self, count=20, rng=None):
+        """随机生成货箱并批量入库，返回(成功数, 失败数)"""
+        import random
+        import uuid
+        from datetime import datetime
+
+        rng = rng or random.Random()
+        success = 0
+        failed = 0
+
+        # 预加载有空位的航空公司
+        airline_shelves = [(airline, self.get_airline_shelf(airline))
+                           for airline in self.airline_list]
+        valid_airlines = [airline for airline, shelf in airline_shelves if shelf.layer_free.any()]
+        if not valid_airlines:
+            raise ValueError("所有货架已满，无法入库")
+
+        # 按可用位置数作为随机选择的权重
+        shelf_weights = [int(self.get_airline_shelf(airline).layer_free.sum()) for airline in valid_airlines]
+
+        # 批量数据库操作（解决database locked问题）
+        with self.db.db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE TRANSACTION")  # 立即获取锁
+            start = self._current_change_seq(conn)
+            batch_data = []
+            try:
+                for _ in range(count):
+                    if not any(shelf_weights):
+                        failed += 1
+                        continue
+                    # 带权重的随机选择
+                    airline = rng.choices(valid_airlines, weights=shelf_weights, k=1)[0]
+                    shelf = self.get_airline_shelf(airline)
+
+                    # 与后台入库线程的预留互斥，避免选中同一空位
+                    with self._slot_lock:
+                        pos = shelf.find_available_position()
+                        if pos:
+                            shelf.modify_position(*pos, SLOT_OCCUPIED)
+
+                    if not pos:
+                        failed += 1
+                        shelf_weights[valid_airlines.index(airline)] = 0
+                        valid_airlines = [a for a, w in zip(valid_airlines, shelf_weights) if w > 0]
+                        shelf_weights = [w for w in shelf_weights if w > 0]
+                        continue
+
+                    # 生成数据
+                    cargo_id = f"RND-{uuid.UUID(int=rng.getrandbits(128)).hex[:6]}"
+                    weight = rng.randint(1, self.max_weight)
+                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    position_str = format_position(*pos, self.airline_row_mapping[airline])
+                    batch_data.append((cargo_id, airline, timestamp, weight, position_str))
+                    success += 1
+                    shelf_weights[valid_airlines.index(airline)] -= 1
+
+                # 批量插入数据库
+                cursor.executemany(CARGO_INSERT_SQL, [row + (stored_epoch(row[2]),) for row in batch_data])
+                self._commit_own(conn, start)
+
+            except sqlite3.IntegrityError:
+                # 其他工位占用了同一货位：撤销本批标记并同步其变更
+                conn.rollback()
+                with self._slot_lock:
+                    for _, airline, _, _, position_str in batch_data:
+                        self.airline_shelves[airline].modify_position(*parse_position(position_str), SLOT_EMPTY)
+                self.poll_changes()
+                raise ValueError("货位被其他工位占用，请重试")
+            except sqlite3.OperationalError as oe:
+                if "database is locked" in str(oe):
+                    # 有限重试机制
+                    for retry in range(3):
+                        try:
+                            time.sleep(0.1 * (retry+1))
+                            self._commit_own(conn, start)
+                            break
+                        except sqlite3.Error:
+                            continue
+                    else:
+                        conn.rollback()
+                        raise
+                else:
+                    raise
+        published = []
+        for cargo_id, airline, timestamp, weight, position_str in batch_data:
+            position = parse_position(position_str)
+            self.outbound.add(airline, cargo_id, timestamp, *position)
+            published.append(Event(events.STORED, airline=airline, cargo_id=cargo_id, position=position,
+                                   data={"weight": weight, "timestamp": timestamp}))
+        self.events.publish(*published)
+        self.last_activity = time.monotonic()
+        return success, failed
+
+
+class PlacementWorker:
+    """后台入库线程：按请求队列顺序执行智能入库，避免在GUI线程中求解和提交数据库
+
+    结果通过deliver(callback, record, error)投递，GUI中传入wx.CallAfter回到主线程；
+    submit同时返回Future，便于无界面的调用方等待结果。
+    """
+
+    def __init__(self, cargo_mgr, deliver=None, workers=1):
+        self.cargo_mgr = cargo_mgr
+        self.deliver = deliver or (lambda callback, *args: callback(*args))
+        self.requests = queue.Queue()
+        self.threads = [threading.Thread(target=self._run, name=f"placement-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, cargo_id, airline, weight, callback=None):
+        future = Future()
+        self.requests.put((time.perf_counter(), cargo_id, airline, weight, callback, future))
+        return future
+
+    def pending(self):
+        return self.requests.qsize()
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            queued_at, cargo_id, airline, weight, callback, future = request
+            instruments.observe("placement.queue_wait", time.perf_counter() - queued_at)
+            record, error = None, None
+            try:
+                record = self.cargo_mgr.smart_store(cargo_id, airline, weight)
+                future.set_result(record)
+            except Exception as e:
+                error = e
+                future.set_exception(e)
+            if callback:
+                self.deliver(callback, record, error)
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.requests.put(None)
+        for thread in self.threads:
+            thread.join()
+
 
 class BaseFrame(wx.Frame):
-    def __init__(self, parent, title, size=(300, 300)):
+    def __init__(self, parent, title, size=(300, 300), cargo_mgr=None):
         super().__init__(parent, title=title, size=size)
         self.SetBackgroundColour(wx.WHITE)
-        self.cargo_mgr = parent.cargo_mgr if parent else CargoManager()
+        # 子窗口共用父窗口的管理器，顶层窗口由调用方传入
+        self.cargo_mgr = cargo_mgr or (parent.cargo_mgr if parent else CargoManager())
 
     def show_message(self, message, title, style=wx.OK | wx.ICON_INFORMATION):
         dialog = wx.MessageDialog(self, message, title, style)
@@ -156,21 +1499,57 @@ class BaseFrame(wx.Frame):
 
 class MainFrame(BaseFrame):
     def __init__(self):
-        super().__init__(None, "AEK管理系统", (600, 300))
+        super().__init__(None, "AEK管理系统", (600, 300), CargoManager(journal_path=JOURNAL_NAME))
         self._init_ui()
-        self.cargo_mgr = CargoManager()
+        # 变更事件合并到下一轮事件循环在主线程分发
+        self.cargo_mgr.events.schedule = wx.CallAfter
+        self.cargo_mgr.start_placement_worker(deliver=wx.CallAfter)
+        # 空闲时后台按重量重排货箱，移位通过事件通知库存视图
+        self.reslotting = ReslottingScheduler(self.cargo_mgr).start()
+        self.api_server = None
+        # 定时检查其他工位对同一数据库的提交，只刷新发生变化的货位
+        self.sync_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_sync_timer, self.sync_timer)
+        self.sync_timer.Start(1000)
+        # 每分钟检查一次长期滞留的货箱
+        self.dwell_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_dwell_timer, self.dwell_timer)
+        self.dwell_timer.Start(60000)
+        self.on_dwell_timer(None)
+
+    def on_sync_timer(self, event):
+        self.cargo_mgr.poll_changes()
+
+    def on_dwell_timer(self, event):
+        """主界面提示在库超过DWELL_ALERT_HOURS小时的货箱，最多统计100个"""
+        overdue = self.cargo_mgr.overdue_cargo(DWELL_ALERT_HOURS, limit=100)
+        if overdue:
+            count = f"{len(overdue)}+" if len(overdue) == 100 else str(len(overdue))
+            self.dwell_label.SetLabel(f"在库超过{DWELL_ALERT_HOURS}小时的货箱: {count}个，最早: {overdue[0][0]}")
+        else:
+            self.dwell_label.SetLabel("")
+
+    def start_api_server(self):
+        """按需启动供扫码枪、AGV控制器接入的本地API服务"""
+        if self.api_server is None:
+            self.api_server = ApiServer(self.cargo_mgr).start_in_thread()
+        return self.api_server
 
     def _init_ui(self):
         main_sizer = wx.BoxSizer(wx.VERTICAL)
         main_sizer.Add(wx.StaticText(self, label="欢迎使用AEK管理系统", style=wx.ALIGN_CENTER), 0,
                        wx.TOP | wx.ALIGN_CENTER, 20)
+        self.dwell_label = wx.StaticText(self, label="")
+        self.dwell_label.SetForegroundColour(wx.RED)
+        main_sizer.Add(self.dwell_label, 0, wx.TOP | wx.ALIGN_CENTER, 10)
 
         buttons = [
             ("入库", self.on_inventory_in),
             ("库存", self.on_inventory_view),
             ("查询", self.on_query),
             ("出库", self.on_inventory_out),
-            ("参数设置", self.on_settings)
+            ("参数设置", self.on_settings),
+            ("诊断", self.on_diagnostics)
         ]
 
         button_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -193,152 +1572,234 @@ class MainFrame(BaseFrame):
     def on_inventory_out(self, event): InventoryOutFrame(self).Show()
 
     def on_settings(self, event): SettingsFrame(self).Show()
+
+    def on_diagnostics(self, event): DiagnosticsFrame(self).Show()
+@dataclass
+class SolveResult:
+    agv_id: int
+    position: tuple
+    fitness: float
+    generations: int   # 实际运行的代数
+    stop_reason: str   # exhaustive / stalled / collapsed / max_generations
+
+
 class GeneticAlgorithmSolver:
-    def __init__(self, agv_positions, target_column, cargo_weight, shelf, max_layer=5):
+    MAX_POP_SIZE = 50
+    MAX_GENERATIONS = 100
+
+    def __init__(self, agv_positions, target_column, cargo_weight, shelf, max_layer=5, verbose=False,
+                 pop_size=None, generations=None, stall_generations=10, rng=None, travel_cost=None,
+                 column_cost=0):
         self.agv_positions = agv_positions
         self.target_column = target_column
         self.cargo_weight = cargo_weight
         self.shelf = shelf
         self.max_layer = shelf.config.layers - 1
-        
-        # 遗传算法参数
-        self.pop_size = 50
-        self.elite_size = 10
+        self.verbose = verbose  # 为True时输出候选位置、种群分布等诊断信息
+        # 每个求解器使用独立的随机数生成器，传入种子即可复现结果
+        self.rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+        if travel_cost is None:
+            travel_cost = YardLayout(max(list(agv_positions) + [target_column]) + 1).travel_cost
+        # 每台AGV到目标列的行驶代价，适应度计算时按AGV编号直接取值
+        self.agv_costs = travel_cost[np.asarray(agv_positions, dtype=int), target_column]
+        self._options = dict(max_layer=max_layer, pop_size=pop_size, generations=generations,
+                             stall_generations=stall_generations, travel_cost=travel_cost, column_cost=column_cost)
+
+        # 候选位置只扫描一次货架；个体编码为[AGV编号, 候选位置下标]，
+        # 交叉和变异只在候选集合内取值，任何一代都不会出现已占用的位置
+        self.candidates = self._find_valid_positions()
+        self.candidate_layers = np.array([z for _, _, z in self.candidates], dtype=np.int32)
+        self.layer_candidates = {int(z): np.flatnonzero(self.candidate_layers == z)
+                                 for z in np.unique(self.candidate_layers)}
+
+        # 重量感知的层惩罚只取决于候选位置所在层，预先按候选位置算好
+        self.weight_ratio = cargo_weight / shelf.max_weight
+        if self.weight_ratio >= WEIGHT_BANDS[0]:
+            ideal_layer = 0
+        elif self.weight_ratio < LIGHT_RATIO:
+            ideal_layer = shelf.config.layers - 1
+        else:
+            ideal_layer = self.candidate_layers  # 中等重量不设层惩罚
+        self.candidate_penalty = (np.abs(self.candidate_layers - ideal_layer)
+                                  * (1000 if self.weight_ratio >= HEAVY_RATIO else 500))
+        # AGV从通道侧的第0列进入货架，每深入一列增加column_cost的搬运代价
+        candidate_columns = np.array([y for _, y, _ in self.candidates], dtype=np.int32)
+        self.candidate_penalty = self.candidate_penalty + candidate_columns * column_cost
+
+        # 遗传算法参数：按搜索空间（候选位置数×AGV数）缩放，空间很小时直接穷举
+        self.search_space = len(self.candidates) * len(self.agv_positions)
+        self.pop_size = pop_size or int(np.clip(self.search_space // 2, 4, self.MAX_POP_SIZE))
+        self.elite_size = max(2, self.pop_size // 5)
         self.mutation_rate = 0.2
-        self.generations = 100
+        self.generations = generations or int(np.clip(self.search_space, 10, self.MAX_GENERATIONS))
+        self.stall_generations = stall_generations  # 最优适应度连续多少代不提升即停止
+
+    def _trace(self, message, *values):
+        if self.verbose:
+            print(message, *values)
 
     def _init_population(self):
         """修复种群初始化偏差"""
-        population = []
-        valid_positions = self._find_valid_positions()
-        if not valid_positions:
+        if not self.candidates:
             raise ValueError("当前货架在重量允许的层数范围内已无可用位置")
-            
-        layer_distribution = {z: [pos for pos in valid_positions if pos[2] == z] 
-                            for z in set(p[2] for p in valid_positions)}
-        
-        # 新增空分布检查
-        if not layer_distribution:
-            raise ValueError("所有符合条件的层都已满载")
-        
-        for _ in range(self.pop_size):
-            agv_id = np.random.randint(0, len(self.agv_positions))
-            # 按层数加权选择（高层优先）
-            weights = [z + 1 for z in layer_distribution.keys()]  # 高层获得更大权重
-            selected_layer = np.random.choice(list(layer_distribution.keys()), p=np.array(weights)/sum(weights))
-            x, _, z = layer_distribution[selected_layer][np.random.randint(0, len(layer_distribution[selected_layer]))]
-            population.append([agv_id, x, z])
-        return np.array(population, dtype=np.int32)
+
+        # 先按层数加权选层（高层优先），再在层内均匀选位置
+        layers = np.array(list(self.layer_candidates.keys()))
+        layer_weights = (layers + 1) / (layers + 1).sum()
+        layer_sizes = np.array([len(self.layer_candidates[z]) for z in layers])
+        probs = np.repeat(layer_weights / layer_sizes, layer_sizes)
+
+        population = np.empty((self.pop_size, 2), dtype=np.int32)
+        population[:, 0] = self.rng.integers(0, len(self.agv_positions), self.pop_size)
+        population[:, 1] = self.rng.choice(len(self.candidates), self.pop_size, p=probs)
+        return population
 
     def _find_valid_positions(self):
-        """解除层数过滤限制"""
-        valid = []
-        full_layers = [z for z in range(self.shelf.config.layers) 
-                      if self.shelf.is_layer_full(z)]
-        
-        for z in range(self.shelf.config.layers):
-            if z in full_layers:
-                continue
-            # 移除层数过滤条件（原z > max_allowed_layer判断）
-            for x in range(self.shelf.config.rows):
-                for y in range(self.shelf.config.columns):
-                    if self.shelf.get_position_status(x, y, z) == 0:
-                        valid.append((x, y, z))
-        return valid
+        """一次性找出所有空位，按(层, 行, 列)排序"""
+        free = np.argwhere(self.shelf.storage.transpose(2, 0, 1) == 0)
+        return [(int(x), int(y), int(z)) for z, x, y in free]
 
     def _get_max_allowed_layer(self):
         """优化重货层数降级策略"""
-        weight_ratio = self.cargo_weight / self.shelf.max_weight
-        base_layer = 0 if weight_ratio >= 0.8 else 1 if weight_ratio >= 0.6 else 2 if weight_ratio >= 0.4 else self.shelf.config.layers - 1
-        
-        # 修改点：解除重货向上搜索限制
-        search_range = range(0, self.shelf.config.layers)  # 始终从底层开始搜索
-        
-        for z in search_range:
-            # 保留基础层限制但允许向上扩展
-            if weight_ratio >= 0.4 and z > (base_layer + 1):  # 允许扩展到次高层
-                continue
-            if not self.shelf.is_layer_full(z):
-                return z
-        
-        # 基础层满时强制扩展到允许的最高层
-        for z in range(base_layer + 1, self.shelf.config.layers):
-            if not self.shelf.is_layer_full(z):
-                return z
-        return base_layer  # 触发错误
+        if self.weight_ratio >= HEAVY_RATIO:
+            base_layer = self.shelf.weight_band(self.cargo_weight)
+            # 重货从底层开始，最多扩展到基础层的上一层；都满时再向更高层扩展
+            slot = self.shelf.lowest_free_slot(0, base_layer + 1) or self.shelf.lowest_free_slot(base_layer + 2)
+        else:
+            base_layer = self.max_layer
+            slot = self.shelf.lowest_free_slot()
+        return slot[2] if slot else base_layer  # 触发错误
+
     def _fitness(self, individual):
-        agv_id, x, z = individual
-        original_col = self.agv_positions[agv_id]
-        
-        time_cost = (abs(3 - original_col) + abs(self.target_column - 3)) * 10
-        
-        # 动态计算理想层数（新增重量感知系数）
-        weight_ratio = self.cargo_weight / self.shelf.max_weight
-        ideal_layer = 0 if weight_ratio >= 0.8 else \
-                     self.shelf.config.layers - 1 if weight_ratio < 0.2 else z
-        layer_penalty = abs(z - ideal_layer) * (1000 if weight_ratio >=0.4 else 500)
-        
-        return -(time_cost + layer_penalty)
+        agv_id, idx = individual
+        return -(self.agv_costs[agv_id] + self.candidate_penalty[idx])
+
     def _get_target_layer(self):
         """计算重量对应的理想层数"""
-        weight_ratio = self.cargo_weight / self.shelf.max_weight
-        # 分层映射规则（可根据需求调整）
-        if weight_ratio >= 0.8:   return 0
-        elif weight_ratio >= 0.6: return 1
-        elif weight_ratio >= 0.4: return 2
-        elif weight_ratio >= 0.2: return 3
-        else:                    return 4
+        return self.shelf.weight_band(self.cargo_weight)
     def _rank(self, population):
         """增加多样性保护机制"""
         graded = [(self._fitness(ind), ind) for ind in population]
         sorted_pop = sorted(graded, key=lambda x: x[0], reverse=True)
         
         # 前10%直接保留
-        elite = [x[1] for x in sorted_pop[:int(self.pop_size*0.1)]]
+        elite_count = max(1, int(self.pop_size*0.1))
+        elite = [x[1] for x in sorted_pop[:elite_count]]
         
         # 剩余90%进行多样性采样
-        remaining = sorted_pop[int(self.pop_size*0.1):]
-        z_values = [ind[2] for _, ind in remaining]
-        diversity_scores = [1/(z+1) + np.random.random()*0.1 for z in z_values]  # 鼓励高层
+        remaining = sorted_pop[elite_count:]
+        z_values = [self.candidate_layers[ind[1]] for _, ind in remaining]
+        diversity_scores = [1/(z+1) + self.rng.random()*0.1 for z in z_values]  # 鼓励高层
         selected = [remaining[i][1] for i in np.argsort(diversity_scores)[::-1][:self.pop_size - len(elite)]]
         
         return elite + selected
 
     def _mutate(self, individual):
-        """增强高层变异倾向"""
-        agv_id, x, z = individual
+        """增强高层变异倾向，只在候选位置中取值"""
+        agv_id, idx = individual
+        z = self.candidate_layers[idx]
         # 新增高层变异补偿机制
-        if z < 3 and np.random.random() < 0.6:  # 低层强制上移
-            z += np.random.randint(1, 4)
-        elif z >= 3 and np.random.random() < 0.4:
-            z += np.random.randint(-2, 3)
-        z = np.clip(z, 0, self.max_layer)
-        return [agv_id, x, z]
+        if z < 3 and self.rng.random() < 0.6:  # 低层强制上移
+            z += self.rng.integers(1, 4)
+        elif z >= 3 and self.rng.random() < 0.4:
+            z += self.rng.integers(-2, 3)
+        z = int(np.clip(z, 0, self.max_layer))
+        # 目标层仍有空位时改选该层的任一空位，否则保留原位置
+        layer = self.layer_candidates.get(z)
+        if layer is not None:
+            idx = layer[self.rng.integers(0, len(layer))]
+        if self.rng.random() < self.mutation_rate:
+            agv_id = self.rng.integers(0, len(self.agv_positions))
+        return [agv_id, idx]
 
     def _crossover(self, parent1, parent2):
-        """强化层数交叉逻辑"""
-        if np.random.random() < 0.5:
+        """强化层数交叉逻辑：位置基因整体继承，子代必然可行"""
+        z1 = self.candidate_layers[parent1[1]]
+        z2 = self.candidate_layers[parent2[1]]
+        if self.rng.random() < 0.5:
             # 强制交叉层数基因
-            return [parent1[0], parent2[1], parent2[2]] if parent2[2] > parent1[2] else [parent2[0], parent1[1], parent1[2]]
+            return [parent1[0], parent2[1]] if z2 > z1 else [parent2[0], parent1[1]]
         else:
             # 随机保留较高层的基因
-            return [parent2[0], parent1[1], max(parent1[2], parent2[2])]
+            return [parent2[0], parent1[1] if z1 >= z2 else parent2[1]]
+
+    def _solve_exhaustive(self):
+        """搜索空间不超过种群规模时逐一评估全部组合"""
+        combos = [[agv_id, idx] for idx in range(len(self.candidates))
+                  for agv_id in range(len(self.agv_positions))]
+        return max(combos, key=self._fitness)
 
+    @instruments.timed("solver.solve")
     def solve(self):
-        print("当前有效位置:", self._find_valid_positions())
-        print("初始种群层分布:", np.unique(self._init_population()[:,2], return_counts=True))  # 新增初始化分布监控
-        """执行遗传算法"""
+        """执行遗传算法，返回SolveResult"""
+        self._trace("当前有效位置:", self.candidates)
+        if not self.candidates:
+            raise ValueError("当前货架在重量允许的层数范围内已无可用位置")
+
+        generation = 0
+        if self.search_space <= self.pop_size:
+            best, stop_reason = self._solve_exhaustive(), "exhaustive"
+        else:
+            best, generation, stop_reason = self._evolve()
+
+        position = self.candidates[best[1]]
+        fitness = float(self._fitness(best))
+        self._trace("最优个体:", best, "位置:", position, "适应度:", fitness,
+                    "代数:", generation, "停止原因:", stop_reason)
+        instruments.count("solver.runs")
+        instruments.count("solver.candidates", len(self.candidates))
+        instruments.count("solver.generations", generation)
+        instruments.count(f"solver.stop.{stop_reason}")
+        return SolveResult(int(best[0]), position, fitness, generation, stop_reason)
+
+    def solve_multi_start(self, starts=4, seed=None, max_workers=None):
+        """并行运行starts个相互独立的遗传算法实例，返回适应度最高的结果
+
+        每个实例使用由seed派生的独立随机数生成器，给定seed时结果可复现；
+        max_workers=0时在当前进程内依次运行。
+        """
+        seeds = np.random.SeedSequence(seed).spawn(starts)
+        args = [(self.agv_positions, self.target_column, self.cargo_weight, self.shelf, self._options, child)
+                for child in seeds]
+        with instruments.timer("solver.multi_start"):
+            if max_workers == 0 or starts == 1:
+                results = [_solve_instance(arg) for arg in args]
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(_solve_instance, args))
+        # max按顺序取第一个最大值，与各进程完成的先后无关
+        return max(results, key=lambda result: result.fitness)
+
+    def _evolve(self):
         pop = self._init_population()
-        
-        for _ in range(self.generations):
+        self._trace("初始种群层分布:", np.unique(self.candidate_layers[pop[:, 1]], return_counts=True))
+
+        best_fitness = -np.inf
+        stall = 0
+        stop_reason = "max_generations"
+        generation = 0
+        while generation < self.generations:
             ranked = self._rank(pop)
+            # 收敛检测：最优适应度停滞或种群坍缩为同一个体时提前结束
+            top_fitness = self._fitness(ranked[0])
+            if top_fitness > best_fitness:
+                best_fitness, stall = top_fitness, 0
+            else:
+                stall += 1
+            if stall >= self.stall_generations:
+                stop_reason = "stalled"
+                break
+            if len(np.unique(pop, axis=0)) == 1:
+                stop_reason = "collapsed"
+                break
+            generation += 1
             elite = ranked[:self.elite_size]
             
             # 生成新一代
             children = []
             while len(children) < self.pop_size - self.elite_size:
                 # 修改点：将numpy数组索引转换为标量
-                selected = np.random.choice(len(ranked[:self.elite_size]), 2, replace=False)
+                selected = self.rng.choice(len(ranked[:self.elite_size]), 2, replace=False)
                 p1 = ranked[:self.elite_size][selected[0]]
                 p2 = ranked[:self.elite_size][selected[1]]
                 
@@ -347,9 +1808,16 @@ class GeneticAlgorithmSolver:
                 children.append(child)
             
             pop = np.vstack((elite, children))
-        
-        best = self._rank(pop)[0]
-        return best[0], (best[1], 0, best[2])
+
+        return self._rank(pop)[0], generation, stop_reason
+def _solve_instance(args):
+    """多起点求解的单个实例（需位于模块顶层以便进程池序列化）"""
+    agv_positions, target_column, cargo_weight, shelf, options, seed = args
+    solver = GeneticAlgorithmSolver(agv_positions, target_column, cargo_weight, shelf,
+                                    rng=np.random.default_rng(seed), **options)
+    return solver.solve()
+
+
 class InputFrame(BaseFrame):
     def __init__(self, parent):
         super().__init__(parent, "货箱入库", (300, 500))
@@ -378,106 +1846,9 @@ class InputFrame(BaseFrame):
         self.SetSizer(sizer)
     # 新增批量入库处理方法
     def on_bulk_inventory(self, event):
-        import random
-        import uuid
-        from datetime import datetime
-        from itertools import cycle
-        
         try:
-            count = 20  # 默认生成20条记录
-            success = 0
-            failed = 0
-            
-            # 优化1：预加载有空位的航空公司（不修改Shelf类的方法）
-            valid_airlines = []
-            airline_shelves = [(airline, self.cargo_mgr.get_airline_shelf(airline)) 
-                             for airline in self.cargo_mgr.airline_list]
-            
-            # 使用原生方法检查货架状态
-            valid_airlines = [
-                airline for airline, shelf in airline_shelves
-                if any(shelf.get_position_status(x, 0, z) == 0 
-                     for x in range(shelf.config.rows)
-                     for z in range(shelf.config.layers))
-            ]
-            
-            if not valid_airlines:
-                self.show_message("所有货架已满，无法入库", "错误", wx.ICON_ERROR)
-                return
-            
-            # 优化2：智能货架选择算法
-            shelf_weights = []
-            for airline in valid_airlines:
-                shelf = self.cargo_mgr.get_airline_shelf(airline)
-                # 计算可用位置数（保持使用原生方法）
-                available = sum(1 for x in range(shelf.config.rows) 
-                              for z in range(shelf.config.layers) 
-                              if shelf.get_position_status(x, 0, z) == 0)
-                shelf_weights.append(available)
-            
-            # 优化3：批量数据库操作（解决database locked问题）
-            with self.cargo_mgr.db.db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("BEGIN IMMEDIATE TRANSACTION")  # 立即获取锁
-                try:
-                    batch_data = []
-                    for _ in range(count):
-                        # 带权重的随机选择
-                        airline = random.choices(valid_airlines, weights=shelf_weights, k=1)[0]
-                        shelf = self.cargo_mgr.get_airline_shelf(airline)
-                        
-                        # 查找可用位置（保持使用原生方法）
-                        pos = next(((x, 0, z) for z in range(shelf.config.layers)
-                                  for x in range(shelf.config.rows)
-                                  if shelf.get_position_status(x, 0, z) == 0), None)
-                        
-                        if not pos:
-                            failed += 1
-                            shelf_weights[valid_airlines.index(airline)] = 0
-                            valid_airlines = [a for a, w in zip(valid_airlines, shelf_weights) if w > 0]
-                            shelf_weights = [w for w in shelf_weights if w > 0]
-                            continue
-                            
-                        # 生成数据
-                        cargo_id = f"RND-{uuid.uuid4().hex[:6]}"
-                        weight = random.randint(1, self.cargo_mgr.max_weight)
-                        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        position_str = f"{pos[0]}-{self.cargo_mgr.airline_row_mapping[airline]}-{pos[2]}"
-                        
-                        # 收集批量数据
-                        batch_data.append((cargo_id, airline, timestamp, weight, position_str))
-                        
-                        # 直接修改货架状态（保持使用原生方法）
-                        shelf.modify_position(*pos, 1)
-                        success += 1
-                        shelf_weights[valid_airlines.index(airline)] -= 1
-                        
-                    # 批量插入数据库
-                    cursor.executemany(
-                        "INSERT INTO cargo VALUES (?,?,?,?,?)",
-                        batch_data
-                    )
-                    conn.commit()
-                    
-                except sqlite3.OperationalError as oe:
-                    if "database is locked" in str(oe):
-                        # 优化4：有限重试机制
-                        for retry in range(3):
-                            try:
-                                time.sleep(0.1 * (retry+1))
-                                conn.commit()
-                                break
-                            except:
-                                continue
-                        else:
-                            conn.rollback()
-                            raise
-                finally:
-                    self.show_message(f"成功入库 {success} 条，失败 {failed} 条", "批量入库完成")
-                    # 新增刷新逻辑
-                    self.GetParent().draw_panel.Refresh(eraseBackground=True)
-                    self.GetParent().draw_panel.Update()
-                    
+            success, failed = self.cargo_mgr.bulk_random_inbound(count=20)  # 默认生成20条记录
+            self.show_message(f"成功入库 {success} 条，失败 {failed} 条", "批量入库完成")
         except Exception as e:
             self.show_message(f"批量入库失败: {str(e)}", "错误", wx.ICON_ERROR)
     def on_confirm(self, event):
@@ -487,14 +1858,13 @@ class InputFrame(BaseFrame):
             return
 
         if selection == "自动识别":
-            self.show_message("功能尚未实现", "提示")
-
-
-            
-
-
-
-
+            # 扫码枪通过本地API服务直接入库，界面随事件刷新
+            try:
+                server = wx.GetApp().GetTopWindow().start_api_server()
+            except OSError as e:
+                self.show_message(f"API服务启动失败: {str(e)}", "错误", wx.ICON_ERROR)
+                return
+            self.show_message(f"自动识别已开启，扫码设备请连接 {server.host}:{server.port}", "提示")
         else:
             ManualInputFrame(self).Show()
 
@@ -521,9 +1891,9 @@ class ManualInputFrame(BaseFrame):
             setattr(self, field[1], ctrl)
             sizer.Add(ctrl, 0, wx.EXPAND | wx.ALL, 5)
 
-        confirm_btn = wx.Button(self, label="确定入库")
-        confirm_btn.Bind(wx.EVT_BUTTON, self.on_confirm)
-        sizer.Add(confirm_btn, 0, wx.ALL, 5)
+        self.confirm_btn = wx.Button(self, label="确定入库")
+        self.confirm_btn.Bind(wx.EVT_BUTTON, self.on_confirm)
+        sizer.Add(self.confirm_btn, 0, wx.ALL, 5)
         self.SetSizer(sizer)
 
     def on_confirm(self, event):
@@ -580,66 +1950,32 @@ class ManualInputFrame(BaseFrame):
         #     except Exception as e:
         #         self.show_message(str(e), "错误", wx.ICON_ERROR)
     def _smart_inventory(self, inputs):
-            """智能入库核心逻辑"""
-            with self.cargo_mgr.db.db_connection() as conn:
-                cursor = conn.cursor()
-                try:
-                    # 获取AGV位置
-                    cursor.execute("SELECT position FROM agv")
-                    agv_positions = [row[0] for row in cursor.fetchall()]
-                    
-                    # 获取目标货架
-                    shelf = self.cargo_mgr.get_airline_shelf(inputs["airline"])
-                    # 替换原有位置查找逻辑
-                    pos = shelf.find_available_position()
-                    if not pos:
-                        raise ValueError("货架所有层已满")
+        """智能入库：交给后台线程执行遗传算法和数据库提交，完成后回到GUI线程提示结果"""
+        self.confirm_btn.Disable()
+        self.cargo_mgr.placement_worker.submit(
+            inputs["id"], inputs["airline"], int(inputs["weight"]), callback=self._on_inventory_done)
 
-                    target_column = self.cargo_mgr.airline_row_mapping[inputs["airline"]]
-                    
-                    # 运行遗传算法
-                    solver = GeneticAlgorithmSolver(
-                        agv_positions=agv_positions,
-                        target_column=target_column,
-                        cargo_weight=int(inputs["weight"]),
-                        shelf=shelf
-                    )
-                    agv_id, position = solver.solve()
-                    
-                    # 更新货架和AGV位置
-                    shelf.modify_position(*position, 1)
-                    # 修复点1：添加参数类型转换
-                    cursor.execute("UPDATE agv SET position=? WHERE rowid=?", 
-                                (int(target_column), int(agv_id)))  # 显式转换为整数
-                    conn.commit()  # 立即提交AGV位置更新
-                    
-                    # 记录入库信息
-                    position_str = f"{position[0]}-{target_column}-{position[2]}"
-                    time_label = time.strftime('%Y-%m-%d %H:%M:%S')
-                    cursor.execute("INSERT INTO cargo VALUES (?,?,?,?,?)", (
-                        inputs["id"], inputs["airline"], time_label,
-                        inputs["weight"], position_str
-                    ))
-                    
-                    conn.commit()
-                    # 修改点：使用已存在的show_message方法替代
-                    self.show_message(
-                        f"入库成功！\n货箱ID：{inputs['id']}\n"
-                        f"航空公司：{inputs['airline']}\n"
-                        f"调度AGV编号：{agv_id}\n"  # 新增AGV编号显示
-                        f"入库时间：{time_label}\n"
-                        f"重量：{inputs['weight']}kg\n"
-                        f"位置：{position_str}",
-                        "提示"
-                    )
-                    
-                    # 刷新界面
-                    self.Close()
-                    self.GetParent().GetParent().draw_panel.Refresh(eraseBackground=True)
-                    self.GetParent().GetParent().draw_panel.Update()
-                    
-                except Exception as e:
-                    self.show_message(str(e), "错误", wx.ICON_ERROR)
+    def _on_inventory_done(self, record, error):
+        if not self:  # 等待期间窗口已被关闭
+            return
+        if error:
+            self.confirm_btn.Enable()
+            self.show_message(str(error), "错误", wx.ICON_ERROR)
+            return
+        try:
+            self.show_message(
+                f"入库成功！\n货箱ID：{record['id']}\n"
+                f"航空公司：{record['airline']}\n"
+                f"调度AGV编号：{record['agv_id']}\n"  # 新增AGV编号显示
+                f"入库时间：{record['timestamp']}\n"
+                f"重量：{record['weight']}kg\n"
+                f"位置：{record['position']}",
+                "提示"
+            )
+
+            self.Close()
+        except Exception as e:
+            self.show_message(str(e), "错误", wx.ICON_ERROR)
 # class InventoryViewFrame(BaseFrame):
 #     def __init__(self, parent):
 #         super().__init__(parent, title="库存数据", size=(400, 300))
@@ -684,16 +2020,32 @@ class InventoryViewFrame(BaseFrame):
         self.label_gap = 40       # 标签与货架间距从30改为40
 
         self._init_ui()
+        # 库存变更时重绘，窗口销毁时取消订阅
+        self._unsubscribe = self.cargo_mgr.events.subscribe(self._on_inventory_events)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self._on_destroy)
+
+    def _on_inventory_events(self, batch):
+        if self:
+            self.draw_panel.Refresh(eraseBackground=True)
+            self.refresh_stats()
+
+    def _on_destroy(self, event):
+        if event.GetEventObject() is self:
+            self._unsubscribe()
+        event.Skip()
 
     def _init_ui(self):
         panel = wx.Panel(self)
         main_sizer = wx.BoxSizer(wx.VERTICAL)
 
-        # 库存可视化面板
+        # 库存可视化面板，右侧为统计面板
+        view_sizer = wx.BoxSizer(wx.HORIZONTAL)
         self.draw_panel = wx.Panel(panel)
         self.draw_panel.Bind(wx.EVT_PAINT, self.on_paint)
         self.draw_panel.Bind(wx.EVT_MOTION, self.on_mouse_motion)
-        main_sizer.Add(self.draw_panel, 1, wx.EXPAND | wx.ALL, 10)
+        view_sizer.Add(self.draw_panel, 1, wx.EXPAND | wx.ALL, 10)
+        view_sizer.Add(self._init_stats_panel(panel), 0, wx.EXPAND | wx.TOP | wx.BOTTOM | wx.RIGHT, 10)
+        main_sizer.Add(view_sizer, 1, wx.EXPAND)
         
         # 层数控制区域
         control_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -718,6 +2070,52 @@ class InventoryViewFrame(BaseFrame):
         
         main_sizer.Add(control_sizer, 0, wx.ALIGN_CENTER | wx.BOTTOM, 10)
         panel.SetSizer(main_sizer)
+        self.refresh_stats()
+
+    def _init_stats_panel(self, parent):
+        """统计面板：各航司空位与占用率、各层占用率与平均重量、在库时长分布"""
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        self.total_label = wx.StaticText(parent)
+        sizer.Add(self.total_label, 0, wx.BOTTOM, 5)
+        self.airline_stats = wx.ListCtrl(parent, style=wx.LC_REPORT, size=(320, 220))
+        for idx, (label, width) in enumerate([("航司", 110), ("在库", 50), ("空位", 50), ("占用率", 70)]):
+            self.airline_stats.InsertColumn(idx, label, width=width)
+        sizer.Add(self.airline_stats, 1, wx.EXPAND | wx.BOTTOM, 5)
+        self.layer_stats = wx.ListCtrl(parent, style=wx.LC_REPORT, size=(320, 160))
+        for idx, (label, width) in enumerate([("层", 50), ("占用率", 80), ("平均重量(kg)", 100)]):
+            self.layer_stats.InsertColumn(idx, label, width=width)
+        sizer.Add(self.layer_stats, 1, wx.EXPAND | wx.BOTTOM, 5)
+        self.dwell_stats = wx.ListCtrl(parent, style=wx.LC_REPORT, size=(320, 160))
+        for idx, (label, width) in enumerate([("在库时长", 120), ("货箱数", 80)]):
+            self.dwell_stats.InsertColumn(idx, label, width=width)
+        sizer.Add(self.dwell_stats, 1, wx.EXPAND)
+        return sizer
+
+    @instruments.timed("ui.refresh_stats")
+    def refresh_stats(self):
+        """按缓存的统计刷新面板，没有库存变更时不重新计算"""
+        analytics = self.cargo_mgr.analytics
+        stats = analytics.stats()
+        self.total_label.SetLabel(f"全场占用率 {stats.total_fill:.1%}  "
+                                  f"在库 {int(stats.boxes.sum())} / {int(stats.capacity.sum())}")
+        self.airline_stats.DeleteAllItems()
+        for i, airline in enumerate(stats.airlines):
+            values = [airline, stats.boxes[i], stats.free[i], f"{stats.utilization[i]:.1%}"]
+            self._append_row(self.airline_stats, values)
+        self.layer_stats.DeleteAllItems()
+        for z in range(len(stats.layer_fill)):
+            self._append_row(self.layer_stats, [z, f"{stats.layer_fill[z]:.1%}", f"{stats.layer_weight[z]:.1f}"])
+        self.dwell_stats.DeleteAllItems()
+        for start, end, count in analytics.dwell_histogram():
+            label = f"{start:g}-{end:g}小时" if end is not None else f"{start:g}小时以上"
+            self._append_row(self.dwell_stats, [label, count])
+
+    @staticmethod
+    def _append_row(list_ctrl, values):
+        idx = list_ctrl.InsertItem(list_ctrl.GetItemCount(), str(values[0]))
+        for col, value in enumerate(values[1:], start=1):
+            list_ctrl.SetItem(idx, col, str(value))
+
     def on_inventory(self, event):
         """打开入库界面，与主界面功能一致"""
         InputFrame(self).Show()
@@ -728,14 +2126,29 @@ class InventoryViewFrame(BaseFrame):
         """处理层数变化事件"""
         try:
             new_layer = int(self.layer_input.GetValue())
-            if 0 <= new_layer < ShelfConfig().layers:
+            if 0 <= new_layer < self._max_layers():
                 self.current_layer = new_layer
                 self.draw_panel.Refresh()  # 触发重绘
+                self.refresh_stats()  # 在库时长随时间变化，切换层时一并刷新
             else:
                 raise ValueError
         except ValueError:
-            self.show_message("请输入0-5之间的有效层数", "错误", wx.ICON_ERROR)
+            self.show_message(f"请输入0-{self._max_layers() - 1}之间的有效层数", "错误", wx.ICON_ERROR)
+
+    # 各航司货架尺寸可以不同，按最大的尺寸排版，保证网格对齐
+    def _max_layers(self):
+        return max((shelf.config.layers for shelf in self.cargo_mgr.airline_shelves.values()), default=1)
+
+    def _shelf_width(self):
+        columns = max((shelf.config.columns for shelf in self.cargo_mgr.airline_shelves.values()), default=1)
+        return (self.cell_size + 5) * columns
 
+    def _row_pitch(self):
+        height = max((self._calculate_shelf_height(shelf) for shelf in self.cargo_mgr.airline_shelves.values()),
+                     default=0)
+        return height + self.vertical_gap
+
+    @instruments.timed("ui.paint")
     def on_paint(self, event):
         dc = wx.PaintDC(self.draw_panel)
         dc.Clear()
@@ -749,7 +2162,8 @@ class InventoryViewFrame(BaseFrame):
         
         start_x = self.padding
         start_y = self.padding
-        shelf_width = (self.cell_size + 5) * ShelfConfig().columns
+        shelf_width = self._shelf_width()
+        row_pitch = self._row_pitch()
         
         # 增加航空公司标签垂直间距
         self.label_gap = 50  # 从40调整为50
@@ -760,7 +2174,7 @@ class InventoryViewFrame(BaseFrame):
             col = index % self.columns_per_row
             
             x_pos = start_x + col * (shelf_width + self.horizontal_gap)
-            y_pos = start_y + row * (self._calculate_shelf_height(shelf) + self.vertical_gap)
+            y_pos = start_y + row * row_pitch
             
             # 计算文本宽度并居中显示
             text_width, _ = dc.GetTextExtent(f"{airline}")
@@ -774,6 +2188,8 @@ class InventoryViewFrame(BaseFrame):
     
     def _draw_shelf(self, dc, shelf, start_x, start_y):
         """绘制单个货架"""
+        if self.current_layer >= shelf.config.layers:
+            return  # 该货架没有当前层
         for row in range(shelf.config.rows):
             for col in range(shelf.config.columns):
                 status = shelf.get_position_status(row, col, self.current_layer)
@@ -791,7 +2207,8 @@ class InventoryViewFrame(BaseFrame):
 
     def _draw_agv_locations(self, dc, positions, start_x, start_y):
         """绘制AGV位置指示箭头"""
-        shelf_width = (self.cell_size + 5) * ShelfConfig().columns
+        shelf_width = self._shelf_width()
+        row_pitch = self._row_pitch()
         font = wx.Font(12, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD)
         dc.SetFont(font)
         
@@ -801,7 +2218,7 @@ class InventoryViewFrame(BaseFrame):
             col = index % self.columns_per_row
             
             x_pos = start_x + col * (shelf_width + self.horizontal_gap)
-            y_pos = start_y + row * (self._calculate_shelf_height(shelf) + self.vertical_gap) + self.label_gap
+            y_pos = start_y + row * row_pitch + self.label_gap
             
             # 在货架底部下方绘制AGV指示
             base_y = y_pos + self._calculate_shelf_height(shelf) + 10
@@ -821,14 +2238,15 @@ class InventoryViewFrame(BaseFrame):
         self.agv_buttons.clear()
 
     # 创建新按钮
-        shelf_width = (self.cell_size + 5) * ShelfConfig().columns
+        shelf_width = self._shelf_width()
+        row_pitch = self._row_pitch()
         airlines = list(self.cargo_mgr.airline_shelves.items())
         
         for index, (airline, shelf) in enumerate(airlines):
             row = index // self.columns_per_row
             col = index % self.columns_per_row
             x_pos = start_x + col * (shelf_width + self.horizontal_gap)
-            y_pos = start_y + row * (self._calculate_shelf_height(shelf) + self.vertical_gap) + self.label_gap
+            y_pos = start_y + row * row_pitch + self.label_gap
             base_y = y_pos + self._calculate_shelf_height(shelf) + 10
 
             for pos in positions:
@@ -860,28 +2278,10 @@ class InventoryViewFrame(BaseFrame):
         self.move_agv(pos, direction)
     def move_agv(self, current_pos, direction):
         new_pos = current_pos + direction
-        
-        # 修改边界检查逻辑
-        max_column = len(self.cargo_mgr.airline_shelves) - 1  # 获取实际航空公司数量
-        if new_pos < 0 or new_pos > max_column:
-            self.show_message(f"无法移动，有效位置范围0-{max_column}", "警告", wx.ICON_WARNING)
-            return
-            
-        # 检查碰撞
-        with self.cargo_mgr.db.db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT position FROM agv WHERE position=?", (new_pos,))
-            if cursor.fetchone():
-                self.show_message("移动失败：即将与其他AGV发生碰撞！", "警告", wx.ICON_WARNING)
-                return
-        # 更新数据库
         try:
-            with self.cargo_mgr.db.db_connection() as conn:
-                conn.execute("UPDATE agv SET position=? WHERE position=?", (new_pos, current_pos))
-                conn.commit()
-            # 修复5：强制完整刷新界面
-            self.draw_panel.Refresh(eraseBackground=True)
-            self.draw_panel.Update()
+            self.cargo_mgr.move_agv(current_pos, new_pos)
+        except ValueError as e:
+            self.show_message(str(e), "警告", wx.ICON_WARNING)
         except sqlite3.Error as e:
             self.show_message(f"数据库更新失败: {str(e)}", "错误", wx.ICON_ERROR)
     def on_mouse_motion(self, event):
@@ -891,7 +2291,8 @@ class InventoryViewFrame(BaseFrame):
         
         start_x = self.padding
         start_y = self.padding
-        shelf_width = (self.cell_size + 5) * ShelfConfig().columns
+        shelf_width = self._shelf_width()
+        row_pitch = self._row_pitch()
         airlines = list(self.cargo_mgr.airline_shelves.items())
 
         for index, (airline, shelf) in enumerate(airlines):
@@ -900,7 +2301,7 @@ class InventoryViewFrame(BaseFrame):
             
             # 计算货架起始坐标（与on_paint方法一致）
             shelf_x = start_x + col * (shelf_width + self.horizontal_gap)
-            shelf_y = start_y + row * (self._calculate_shelf_height(shelf) + self.vertical_gap) + self.label_gap
+            shelf_y = start_y + row * row_pitch + self.label_gap
             
             # 检查鼠标是否在当前货架区域内
             max_x = shelf_x + shelf_width
@@ -916,14 +2317,16 @@ class InventoryViewFrame(BaseFrame):
                 cell_row = rel_y // (self.cell_size + 5)
                 
                 if (0 <= cell_row < shelf.config.rows and 
-                    0 <= cell_col < shelf.config.columns):
+                    0 <= cell_col < shelf.config.columns and
+                    self.current_layer < shelf.config.layers):
                     row_index = self.cargo_mgr.airline_row_mapping[airline]
-                    position_str = f"{cell_row}-{row_index}-{self.current_layer}"
+                    position_str = format_position(cell_row, cell_col, self.current_layer, row_index)
                     
-                    with self.cargo_mgr.db.db_connection() as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT * FROM cargo WHERE position=?", (position_str,))
-                        cargo = cursor.fetchone()
+                    with instruments.timer("ui.tooltip_lookup"):
+                        with self.cargo_mgr.db.db_connection() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute(f"SELECT {CARGO_COLUMNS} FROM cargo WHERE position=?", (position_str,))
+                            cargo = cursor.fetchone()
                     
                     tip = self._format_tooltip(cargo, position_str) if cargo else "未被占用"
                     self.draw_panel.SetToolTip(tip)
@@ -934,12 +2337,13 @@ class InventoryViewFrame(BaseFrame):
 
     def _format_tooltip(self, cargo, position):
         """格式化工具提示内容"""
+        x, y, z = parse_position(position)
         return (
             f"货箱ID: {cargo[0]}\n"
             f"航空公司: {cargo[1]}\n"
             f"入库时间: {cargo[2]}\n"
             f"重量: {cargo[3]}kg\n"
-            f"位置: 行{position[0]} 列{position[2]} 层{position[4]}"
+            f"位置: 行{x} 列{y} 层{z}"
         )
 
 class QuerySelectionFrame(BaseFrame):
@@ -951,7 +2355,7 @@ class QuerySelectionFrame(BaseFrame):
         sizer = wx.BoxSizer(wx.VERTICAL)
         sizer.Add(wx.StaticText(self, label="选择查询方式"), 0, wx.ALL, 5)
 
-        self.recognition_choice = wx.Choice(self, choices=["货箱的ID", "航空公司","位置"])
+        self.recognition_choice = wx.Choice(self, choices=["货箱的ID", "航空公司","位置", "在库时长"])
         sizer.Add(self.recognition_choice, 0, wx.EXPAND | wx.ALL, 5)
 
         confirm_btn = wx.Button(self, label="确定")
@@ -974,6 +2378,8 @@ class QueryByProperty(BaseFrame):
             self._init_ui_id()
         elif property=="航空公司" :
             self._init_ui_airline()
+        elif property == "在库时长":
+            self._init_ui_dwell()
         else:
             self._init_ui_site()
 
@@ -989,11 +2395,26 @@ class QueryByProperty(BaseFrame):
             setattr(self, field[1], ctrl)
             sizer.Add(ctrl, 0, wx.EXPAND | wx.ALL, 5)
 
+        # 边输边查：输入部分ID即列出前缀、子串和相差一个字符的货箱，双击查看详情
+        self.id.Bind(wx.EVT_TEXT, self.on_id_text)
+        self.id_matches = wx.ListBox(self)
+        self.id_matches.Bind(wx.EVT_LISTBOX_DCLICK, self.on_id_match)
+        sizer.Add(self.id_matches, 1, wx.EXPAND | wx.ALL, 5)
+
         confirm_btn = wx.Button(self, label="查询")
         confirm_btn.Bind(wx.EVT_BUTTON, self.on_confirm_id)
         sizer.Add(confirm_btn, 0, wx.ALL, 5)
         self.SetSizer(sizer)
 
+    def on_id_text(self, event):
+        self._id_matches = self.cargo_mgr.search_ids(self.id.GetValue())
+        self.id_matches.Set([f"{cargo_id}  ({kind})" for cargo_id, kind in self._id_matches])
+
+    def on_id_match(self, event):
+        selection = self.id_matches.GetSelection()
+        if selection != wx.NOT_FOUND:
+            result_4_search(self, {"货箱的ID": self._id_matches[selection][0]}, "货箱的ID").Show()
+
     def on_confirm_id(self, event):
         inputs = {
             "货箱的ID": self.id.GetValue().strip(),
@@ -1032,6 +2453,25 @@ class QueryByProperty(BaseFrame):
             return
         result_4_search(self, inputs, "航空公司").Show()
 
+    def _init_ui_dwell(self):
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(wx.StaticText(self, label="在库超过(小时)"), 0, wx.ALL, 5)
+        self.hours = wx.TextCtrl(self, value=str(DWELL_ALERT_HOURS))
+        sizer.Add(self.hours, 0, wx.EXPAND | wx.ALL, 5)
+
+        confirm_btn = wx.Button(self, label="查询")
+        confirm_btn.Bind(wx.EVT_BUTTON, self.on_confirm_dwell)
+        sizer.Add(confirm_btn, 0, wx.ALL, 5)
+        self.SetSizer(sizer)
+
+    def on_confirm_dwell(self, event):
+        try:
+            hours = float(self.hours.GetValue().strip())
+        except ValueError:
+            self.show_message("请输入有效的小时数", "错误", wx.ICON_ERROR)
+            return
+        result_4_search(self, {"小时数": hours}, "在库时长").Show()
+
     def _init_ui_site(self):
         sizer = wx.BoxSizer(wx.VERTICAL)
         fields = [
@@ -1064,56 +2504,171 @@ class QueryByProperty(BaseFrame):
             return
         result_4_search(self, inputs, "位置").Show()
 
+class CargoResultTable(wx.grid.GridTableBase):
+    """查询结果的虚拟表格：只按页从数据库取当前显示的行，排序转为ORDER BY由数据库完成"""
+    COLUMNS = ["货箱ID", "航司", "入库时间", "重量(kg)", "位置"]
+    # 各列排序使用的字段，入库时间按有索引的整数时间戳排序
+    ORDER_BY = ["id", "airline", "stored_at", "weight", "position"]
+    PAGE_SIZE = 200
+    MAX_PAGES = 16
+
+    def __init__(self, cargo_mgr, where, params):
+        super().__init__()
+        self.cargo_mgr = cargo_mgr
+        self.where = where
+        self.params = list(params)
+        self.sort_column = None
+        self.ascending = True
+        self._pages = {}
+        with cargo_mgr.db.db_connection() as conn:
+            self.row_count = conn.execute(f"SELECT COUNT(*) FROM cargo WHERE {where}", self.params).fetchone()[0]
+
+    def GetNumberRows(self):
+        return self.row_count
+
+    def GetNumberCols(self):
+        return len(self.COLUMNS)
+
+    def GetColLabelValue(self, col):
+        return self.COLUMNS[col]
+
+    def IsEmptyCell(self, row, col):
+        return False
+
+    def GetValue(self, row, col):
+        rows = self._page(row // self.PAGE_SIZE)
+        offset = row % self.PAGE_SIZE
+        # 打开窗口后货箱被出库时，末页可能不足
+        return str(rows[offset][col]) if offset < len(rows) else ""
+
+    def SetValue(self, row, col, value):
+        pass  # 只读
+
+    def sort(self, col, ascending):
+        self.sort_column, self.ascending = col, ascending
+        self._pages.clear()
+
+    @instruments.timed("ui.result_page")
+    def _page(self, page):
+        rows = self._pages.get(page)
+        if rows is None:
+            order = "id"
+            if self.sort_column is not None:
+                order = f"{self.ORDER_BY[self.sort_column]} {'ASC' if self.ascending else 'DESC'}, id"
+            with self.cargo_mgr.db.db_connection() as conn:
+                rows = conn.execute(f"SELECT {CARGO_COLUMNS} FROM cargo WHERE {self.where} ORDER BY {order} "
+                                    "LIMIT ? OFFSET ?", self.params + [self.PAGE_SIZE, page * self.PAGE_SIZE]).fetchall()
+            if len(self._pages) >= self.MAX_PAGES:
+                self._pages.pop(next(iter(self._pages)))  # 丢弃最早取的一页
+            self._pages[page] = rows
+        return rows
+
+
 class result_4_search(BaseFrame):
     def __init__(self, parent,inputs,property):
-            super().__init__(parent, title="查询结果", size=(400, 300))
-            self.text_ctrl = wx.TextCtrl(self, style=wx.TE_MULTILINE | wx.TE_READONLY)
+            super().__init__(parent, title="查询结果", size=(700, 400))
             sizer = wx.BoxSizer(wx.VERTICAL)
-            sizer.Add(self.text_ctrl, 1, wx.EXPAND)
+            self.count_label = wx.StaticText(self)
+            sizer.Add(self.count_label, 0, wx.ALL, 5)
+            self.grid = wx.grid.Grid(self)
+            sizer.Add(self.grid, 1, wx.EXPAND)
             self.SetSizer(sizer)
             self.load_csv_id_result(inputs,property)
 
     def load_csv_id_result(self,inputs,property):
-        with self.cargo_mgr.db.db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM cargo")
-            rows = cursor.fetchall()
-            content_lines = []
-            for row in rows:
-                if property=="货箱的ID":
-                    if row[0] == inputs[property]:
-                        formatted_row = [
-                            f"货箱ID: {row[0]}",
-                            f"航司: {row[1]}",
-                            f"入库时间: {row[2]}",
-                            f"重量: {row[3]}",
-                            f"位置(行,列,层): {row[4]}"
-                        ]
-                        content_lines.append(", ".join(formatted_row))
-                elif property=="航空公司":
-                        if row[1] == inputs[property]:
-                            formatted_row = [
-                                f"货箱ID: {row[0]}",
-                                f"航司: {row[1]}",
-                                f"入库时间: {row[2]}",
-                                f"重量: {row[3]}",
-                                f"位置(行,列,层): {row[4]}"
-                            ]
-                            content_lines.append(", ".join(formatted_row))
-                elif property=="位置":
-                    x=int(row[4][0])
-                    z=int(row[4][4])
-                    if x==int(inputs["行数"])and z==int(inputs["层数"]):
-                        formatted_row = [
-                            f"货箱ID: {row[0]}",
-                            f"航司: {row[1]}",
-                            f"入库时间: {row[2]}",
-                            f"重量: {row[3]}",
-                            f"位置(行,列,层): {row[4]}"
-                        ]
-                        content_lines.append(", ".join(formatted_row))
-            content = "\n".join(content_lines)
-            self.text_ctrl.SetValue(content)
+        """按查询条件建立虚拟表格，滚动时按页取数，点击列标题排序"""
+        where, params = self.cargo_mgr.cargo_query(property, inputs)
+        self.table = CargoResultTable(self.cargo_mgr, where, params)
+        self.grid.SetTable(self.table, takeOwnership=True)
+        self.grid.EnableEditing(False)
+        self.grid.SetRowLabelSize(60)
+        self.grid.SetColSize(0, 130)
+        self.grid.SetColSize(2, 150)
+        self.grid.Bind(wx.grid.EVT_GRID_COL_SORT, self.on_sort)
+        if property == "在库时长":
+            self._sort(2, True)  # 从最早入库的开始
+        self.count_label.SetLabel(f"共{self.table.row_count}条")
+
+    def on_sort(self, event):
+        col = event.GetCol()
+        ascending = not (self.table.sort_column == col and self.table.ascending)
+        self._sort(col, ascending)
+
+    def _sort(self, col, ascending):
+        self.table.sort(col, ascending)
+        self.grid.SetSortingColumn(col, ascending)
+        self.grid.ForceRefresh()
+
+class DiagnosticsFrame(BaseFrame):
+    """显示各操作的延迟直方图统计（p50/p95/p99）"""
+    COLUMNS = ["操作", "次数", "p50(ms)", "p95(ms)", "p99(ms)", "最大(ms)"]
+
+    def __init__(self, parent):
+        super().__init__(parent, title="性能诊断", size=(700, 400))
+        self._init_ui()
+        self.refresh()
+
+    def _init_ui(self):
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        self.enable_box = wx.CheckBox(self, label="启用埋点")
+        self.enable_box.SetValue(instruments.enabled)
+        self.enable_box.Bind(wx.EVT_CHECKBOX, self.on_toggle)
+        sizer.Add(self.enable_box, 0, wx.ALL, 5)
+
+        self.list_ctrl = wx.ListCtrl(self, style=wx.LC_REPORT)
+        for idx, label in enumerate(self.COLUMNS):
+            self.list_ctrl.InsertColumn(idx, label, width=200 if idx == 0 else 90)
+        sizer.Add(self.list_ctrl, 1, wx.EXPAND | wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        for label, handler in [("刷新", self.on_refresh), ("清空", self.on_reset), ("导出", self.on_dump)]:
+            btn = wx.Button(self, label=label)
+            btn.Bind(wx.EVT_BUTTON, handler)
+            button_sizer.Add(btn, 0, wx.ALL, 5)
+        sizer.Add(button_sizer, 0, wx.ALIGN_CENTER)
+        self.SetSizer(sizer)
+
+    def refresh(self):
+        self.list_ctrl.DeleteAllItems()
+        snapshot = instruments.snapshot()
+        for name, stats in snapshot["latency"].items():
+            idx = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), name)
+            values = [stats["count"]] + [f"{stats[k] * 1000:.3f}" for k in ("p50", "p95", "p99", "max")]
+            for col, value in enumerate(values, start=1):
+                self.list_ctrl.SetItem(idx, col, str(value))
+        for name, value in snapshot["counters"].items():
+            idx = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), name)
+            self.list_ctrl.SetItem(idx, 1, str(value))
+        # 近一小时吞吐量直接取自操作日志
+        if self.cargo_mgr.journal:
+            totals = {}
+            for counts in self.cargo_mgr.journal.throughput(since=time.time() - 3600).values():
+                for kind, value in counts.items():
+                    totals[kind] = totals.get(kind, 0) + value
+            for kind, value in sorted(totals.items()):
+                idx = self.list_ctrl.InsertItem(self.list_ctrl.GetItemCount(), f"journal.{kind}(近1小时)")
+                self.list_ctrl.SetItem(idx, 1, str(value))
+
+    def on_toggle(self, event):
+        if self.enable_box.GetValue():
+            instruments.enable()
+        else:
+            instruments.disable()
+
+    def on_refresh(self, event):
+        self.refresh()
+
+    def on_reset(self, event):
+        instruments.reset()
+        self.refresh()
+
+    def on_dump(self, event):
+        with wx.FileDialog(self, "导出诊断数据", defaultFile="latency.json", wildcard="JSON (*.json)|*.json",
+                           style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as dialog:
+            if dialog.ShowModal() == wx.ID_CANCEL:
+                return
+            path = instruments.dump(dialog.GetPath())
+        self.show_message(f"已导出到 {path}", "提示")
 
 class SettingsFrame(BaseFrame):
     def __init__(self, parent):
@@ -1247,49 +2802,23 @@ class operate_on_airline_list(BaseFrame):
             
         airline_name = inputs["航司名称"]
         
-        with self.cargo_mgr.db.db_connection() as conn:
-            cursor = conn.cursor()
-            try:
-                if self.operate == "新增航空公司":
-                    if airline_name in self.cargo_mgr.airline_list:
-                        self.show_message("航空公司已存在！", "提示")
-                        return
-                        
-                    # 插入数据库
-                    row_idx = len(self.cargo_mgr.airline_row_mapping)
-                    cursor.execute("INSERT INTO airlines VALUES (?,?)", 
-                                 (airline_name, row_idx))
-                    # 更新内存数据
-                    self.cargo_mgr.airline_list.append(airline_name)
-                    self.cargo_mgr.airline_row_mapping[airline_name] = row_idx
-                    self.cargo_mgr.airline_shelves[airline_name] = Shelf()
-                    
-                else:  # 删除操作
-                    # 直接查询数据库判断航空公司是否存在
-                    cursor.execute("SELECT row_index FROM airlines WHERE name=?", (airline_name,))
-                    if not cursor.fetchone():
-                        self.show_message("航空公司不存在！", "提示")
-                        return
-                    
-                    # 执行数据库删除
-                    cursor.execute("DELETE FROM airlines WHERE name=?", (airline_name,))
-                    
-                    # 强制更新内存数据（无论是否存在都尝试删除）
-                    try:
-                        self.cargo_mgr.airline_list.remove(airline_name)
-                    except ValueError:
-                        pass
-                    if airline_name in self.cargo_mgr.airline_row_mapping:
-                        del self.cargo_mgr.airline_row_mapping[airline_name]
-                    if airline_name in self.cargo_mgr.airline_shelves:
-                        del self.cargo_mgr.airline_shelves[airline_name]
-                    
-                conn.commit()
-                self.show_message("修改成功", "提示")
-                self.Close()
-                
-            except sqlite3.IntegrityError as e:
-                self.show_message(f"数据库操作失败: {str(e)}", "错误", wx.ICON_ERROR)
+        try:
+            if self.operate == "新增航空公司":
+                self.cargo_mgr.add_airline(airline_name)
+            else:  # 删除操作
+                count = self.cargo_mgr.outbound.count(airline_name)
+                if count and wx.MessageBox(f"{airline_name}仍有{count}个货箱在库，删除后将一并出库，是否继续？",
+                                           "确认删除", wx.YES_NO | wx.ICON_QUESTION) != wx.YES:
+                    return
+                self.cargo_mgr.remove_airline(airline_name)
+                # 后台把末尾的航司迁入空出的行号，保持货场紧凑
+                self.cargo_mgr.start_row_compaction()
+            self.show_message("修改成功", "提示")
+            self.Close()
+        except ValueError as e:
+            self.show_message(str(e), "提示")
+        except sqlite3.IntegrityError as e:
+            self.show_message(f"数据库操作失败: {str(e)}", "错误", wx.ICON_ERROR)
 
 class InventoryOutFrame(BaseFrame):
     def __init__(self, parent):
@@ -1323,25 +2852,9 @@ class InventoryOutFrame(BaseFrame):
     # 新增事件处理方法
     def on_full_out(self, event):
         try:
-            with self.cargo_mgr.db.db_connection() as conn:
-                # 清空所有货物记录
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM cargo")
-                
-                # 替换原有的reset_all_positions调用
-                for shelf in self.cargo_mgr.airline_shelves.values():
-                    # 遍历所有层、行、列重置状态
-                    for layer in range(shelf.config.layers):
-                        for row in range(shelf.config.rows):
-                            for col in range(shelf.config.columns):
-                                shelf.modify_position(row, col, layer, 0)
-                
-                conn.commit()
+            self.cargo_mgr.retrieve_all()
             self.show_message("全部货箱已成功出库", "操作成功")
             self.Close()
-            # 新增刷新逻辑
-            self.GetParent().draw_panel.Refresh(eraseBackground=True)
-            self.GetParent().draw_panel.Update()
         except Exception as e:
             self.show_message(f"出库失败: {str(e)}", "错误", wx.ICON_ERROR)
 
@@ -1352,7 +2865,7 @@ class Out_on_id(BaseFrame):
     def _init_ui(self):
         sizer = wx.BoxSizer(wx.VERTICAL)
         fields = [
-            ("请输入货箱的ID", "box_id")
+            ("请输入货箱的ID（多个ID用逗号或空格分隔）", "box_id")
         ]
         for field in fields:
             sizer.Add(wx.StaticText(self, label=field[0]), 0, wx.ALL, 5)
@@ -1373,26 +2886,17 @@ class Out_on_id(BaseFrame):
         if missing:
             self.show_message(f"请填写: {', '.join(missing)}", "错误", wx.ICON_ERROR)
             return
-        with self.cargo_mgr.db.db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM cargo WHERE id = ?", (inputs["货箱的ID"],))  # 查询 id 为 1 的行
-            row = cursor.fetchone()
-            if row:
-                # 删除特定行
-                cursor.execute("DELETE FROM cargo WHERE id = ?", (inputs["货箱的ID"],))  # 删除 id 为 2 的行
-                conn.commit()
-                #
-                shelf = self.cargo_mgr.get_airline_shelf(row[1])
-                x=int(row[4][0])
-                z=int(row[4][4])
-                shelf.modify_position(x,0,z,0)
-                self.show_message("出库成功", "提示")
-                self.Close()
-                # 新增刷新逻辑
-                self.GetParent().GetParent().draw_panel.Refresh(eraseBackground=True)
-                self.GetParent().GetParent().draw_panel.Update()
-            else:
-                self.show_message("ID对应的货箱不存在！", "提示")
+        cargo_ids = inputs["货箱的ID"].replace("，", ",").replace(",", " ").split()
+        rows = self.cargo_mgr.retrieve_many(cargo_ids)
+        if rows:
+            missing = set(cargo_ids) - {row[0] for row in rows}
+            message = f"出库成功，共{len(rows)}个货箱"
+            if missing:
+                message += f"\n以下ID不存在: {', '.join(sorted(missing))}"
+            self.show_message(message, "提示")
+            self.Close()
+        else:
+            self.show_message("ID对应的货箱不存在！", "提示")
 
 class Out_on_airline(BaseFrame):
     def __init__(self, parent):
@@ -1409,6 +2913,16 @@ class Out_on_airline(BaseFrame):
             setattr(self, field[1], ctrl)
             sizer.Add(ctrl, 0, wx.EXPAND | wx.ALL, 5)
 
+        sizer.Add(wx.StaticText(self, label="出库策略"), 0, wx.ALL, 5)
+        self.policy = wx.Choice(self, choices=[POLICY_LABELS[p] for p in POLICIES])
+        self.policy.SetSelection(0)
+        sizer.Add(self.policy, 0, wx.EXPAND | wx.ALL, 5)
+        sizer.Add(wx.StaticText(self, label="出库数量"), 0, wx.ALL, 5)
+        self.count = wx.SpinCtrl(self, min=1, max=1000, initial=1)
+        sizer.Add(self.count, 0, wx.EXPAND | wx.ALL, 5)
+        self.release_all = wx.CheckBox(self, label="该航司全部出库")
+        sizer.Add(self.release_all, 0, wx.ALL, 5)
+
         confirm_btn = wx.Button(self, label="确认")
         confirm_btn.Bind(wx.EVT_BUTTON, self.on_confirm)
         sizer.Add(confirm_btn, 0, wx.ALL, 5)
@@ -1423,25 +2937,20 @@ class Out_on_airline(BaseFrame):
         if missing:
             self.show_message(f"请选择: {', '.join(missing)}", "错误", wx.ICON_ERROR)
             return
-        with self.cargo_mgr.db.db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM cargo WHERE airline = ?", (inputs["航空公司"],))  # 查询 id 为 1 的行
-            row = cursor.fetchone()
-            if row:
-                x = int(row[4][0])
-                z = int(row[4][4])
-                shelf = self.cargo_mgr.get_airline_shelf(row[1])
-                shelf.modify_position(x, 0, z, 0)
-                id_value=row[0]
-                cursor.execute("DELETE FROM cargo WHERE id = ?", (id_value,))  # 删除 id 为 2 的行
-                conn.commit()
-                self.show_message("出库成功", "提示")
-                self.Close()
-                # 新增刷新逻辑
-                self.GetParent().GetParent().draw_panel.Refresh(eraseBackground=True)
-                self.GetParent().GetParent().draw_panel.Update()
-            else :
-                self.show_message("航空公司对应的货箱不存在！", "提示")
+        try:
+            released = self.cargo_mgr.release_airline(
+                inputs["航空公司"],
+                count=None if self.release_all.GetValue() else self.count.GetValue(),
+                policy=POLICIES[self.policy.GetSelection()])
+        except ValueError as e:
+            self.show_message(f"出库失败: {str(e)}", "错误", wx.ICON_ERROR)
+            return
+        if released:
+            ids = ", ".join(cargo_id for cargo_id, _, _ in released)
+            self.show_message(f"出库成功，共{len(released)}个货箱: {ids}", "提示")
+            self.Close()
+        else :
+            self.show_message("航空公司对应的货箱不存在！", "提示")
 if __name__ == "__main__":
     DatabaseManager().initialize_database()
     app = wx.App()
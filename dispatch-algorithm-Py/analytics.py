@@ -0,0 +1,160 @@
+"""货场统计：各航司空位、分层占用率、分层平均重量与在库时长分布
+
+统计由两部分数据经NumPy一次性归约得到：
+    占用数组  各航司货架的storage按最大尺寸补齐后堆叠为 (航司, 行, 列, 层)，补齐部分为-1
+    列式快照  cargo表按列读出的航司、入库时间、重量、层号数组
+
+两者都缓存到下一次库存变更事件为止，界面每帧读取时不再扫描货架或查询数据库；
+在库时长依赖当前时间，每次调用时由缓存的入库时间数组现算。
+
+    analytics = YardAnalytics(cargo_mgr)
+    stats = analytics.stats()
+    stats.free, stats.layer_fill, analytics.dwell_histogram()
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+import events
+from instrumentation import instruments
+
+# 与Airport中的货位状态一致
+SLOT_EMPTY, SLOT_OCCUPIED, SLOT_RESERVED = 0, 1, 2
+PADDING = -1  # 堆叠时补齐的不存在货位
+# 在库时长分布的默认分桶（小时）
+DWELL_BINS = (0, 1, 4, 12, 24, 72, 168)
+INVALIDATING_EVENTS = (events.STORED, events.RETRIEVED, events.MOVED, events.CLEARED, events.AIRLINE_ADDED,
+                       events.AIRLINE_REMOVED, events.SHELF_RESIZED, events.AIRLINE_RELOCATED)
+
+
+@dataclass(frozen=True)
+class YardStats:
+    airlines: tuple           # 与下列按航司的数组一一对应
+    capacity: np.ndarray      # 各航司货架的货位数
+    occupied: np.ndarray      # 各航司货架上已占用的货位（含其他航司溢出存放的货箱）
+    reserved: np.ndarray      # 进行中入库请求预留的货位
+    free: np.ndarray          # 空位
+    boxes: np.ndarray         # 各航司在库货箱数（按归属航司，含溢出存放在其他货架上的）
+    layer_capacity: np.ndarray
+    layer_occupied: np.ndarray
+    layer_fill: np.ndarray    # 各层占用率，全场没有该层时为0
+    layer_weight: np.ndarray  # 各层货箱平均重量（kg），该层没有货箱时为0
+
+    @property
+    def utilization(self):
+        """各航司货架占用率"""
+        return self.occupied / np.maximum(self.capacity, 1)
+
+    @property
+    def total_fill(self):
+        return self.occupied.sum() / max(int(self.capacity.sum()), 1)
+
+
+class YardAnalytics:
+    def __init__(self, cargo_mgr):
+        self.cargo_mgr = cargo_mgr
+        self._lock = threading.Lock()
+        # 每个变更事件使版本号加一，缓存记录计算时的版本号，计算期间发生的变更不会被误认为已包含
+        self._version = 0
+        self._stats = (None, None)
+        self._columns = (None, None)
+        # 在发布线程中同步失效，无界面时统计也能立即反映最新状态
+        self._unsubscribe = cargo_mgr.events.subscribe(self.invalidate, INVALIDATING_EVENTS, immediate=True)
+
+    def close(self):
+        self._unsubscribe()
+
+    def invalidate(self, batch=None):
+        with self._lock:
+            self._version += 1
+
+    def stats(self):
+        """返回缓存的YardStats，有变更事件后首次调用时重新计算"""
+        version = self._version
+        cached_version, stats = self._stats
+        if cached_version == version:
+            return stats
+        with instruments.timer("analytics.stats"):
+            stats = self._compute(*self._stack_occupancy(), self.columns())
+        with self._lock:
+            self._stats = (version, stats)
+        return stats
+
+    def columns(self):
+        """cargo表的列式快照：{"airline", "timestamp", "weight", "layer"} -> ndarray"""
+        version = self._version
+        cached_version, columns = self._columns
+        if cached_version == version:
+            return columns
+        with instruments.timer("analytics.columns"):
+            with self.cargo_mgr.db.db_connection() as conn:
+                rows = conn.execute("SELECT airline, timestamp, weight, position FROM cargo").fetchall()
+            airline, timestamp, weight, position = zip(*rows) if rows else ((), (), (), ())
+            columns = {
+                "airline": np.array(airline, dtype=object),
+                "timestamp": np.array(timestamp, dtype="datetime64[s]"),
+                "weight": np.array(weight, dtype=float),
+                # 位置字符串"行-货场列-层[-列]"的第3段为层号
+                "layer": np.array([int(pos.split("-")[2]) for pos in position], dtype=int),
+            }
+        with self._lock:
+            self._columns = (version, columns)
+        return columns
+
+    def _stack_occupancy(self):
+        """把各航司货架的占用数组补齐到相同尺寸后堆叠，返回 (航司元组, 堆叠数组)"""
+        with self.cargo_mgr._slot_lock:
+            shelves = list(self.cargo_mgr.airline_shelves.items())
+            shapes = np.array([shelf.storage.shape for _, shelf in shelves], dtype=int).reshape(-1, 3)
+            stacked = np.full((len(shelves), *shapes.max(axis=0, initial=0)), PADDING, dtype=np.int8)
+            for i, (_, shelf) in enumerate(shelves):
+                rows, cols, layers = shelf.storage.shape
+                stacked[i, :rows, :cols, :layers] = shelf.storage
+        return tuple(airline for airline, _ in shelves), stacked
+
+    @staticmethod
+    def _compute(airlines, stacked, columns):
+        slot_axes = (1, 2, 3)
+        exists = stacked != PADDING
+        occupied = stacked == SLOT_OCCUPIED
+        layer_capacity = exists.sum(axis=(0, 1, 2))
+        layer_occupied = occupied.sum(axis=(0, 1, 2))
+        layers = len(layer_capacity)
+
+        # 按归属航司统计货箱数；快照中可能有本工位尚未加载的航司，不计入
+        names, owner = np.unique(columns["airline"], return_inverse=True)
+        per_airline = dict(zip(names, np.bincount(owner, minlength=len(names))))
+        boxes = np.array([per_airline.get(airline, 0) for airline in airlines], dtype=int)
+
+        layer = columns["layer"]
+        in_range = layer < layers
+        weight_sum = np.bincount(layer[in_range], weights=columns["weight"][in_range], minlength=layers)
+        weight_count = np.bincount(layer[in_range], minlength=layers)
+        return YardStats(
+            airlines=airlines,
+            capacity=exists.sum(axis=slot_axes),
+            occupied=occupied.sum(axis=slot_axes),
+            reserved=(stacked == SLOT_RESERVED).sum(axis=slot_axes),
+            free=(stacked == SLOT_EMPTY).sum(axis=slot_axes),
+            boxes=boxes,
+            layer_capacity=layer_capacity,
+            layer_occupied=layer_occupied,
+            layer_fill=layer_occupied / np.maximum(layer_capacity, 1),
+            layer_weight=weight_sum / np.maximum(weight_count, 1),
+        )
+
+    def dwell_hours(self, now=None):
+        """各在库货箱的在库时长（小时），now为time.time()形式的时间戳，默认当前时间"""
+        timestamps = self.columns()["timestamp"]
+        # 入库时间按本地时间记录，当前时间也按本地时间换算
+        now = np.datetime64(time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)), "s")
+        return (now - timestamps).astype(float) / 3600
+
+    def dwell_histogram(self, bins=DWELL_BINS, now=None):
+        """在库时长分布，返回 [(起始小时, 结束小时或None, 货箱数), ...]，最后一桶不设上限"""
+        edges = np.append(np.asarray(bins, dtype=float), np.inf)
+        counts, _ = np.histogram(np.maximum(self.dwell_hours(now), 0), bins=edges)
+        return [(float(edges[i]), None if np.isinf(edges[i + 1]) else float(edges[i + 1]), int(count))
+                for i, count in enumerate(counts)]
@@ -0,0 +1,123 @@
+"""本地API服务的客户端，以及用于联调的模拟扫码枪
+
+    python api_client.py --count 50              # 模拟扫码枪连续扫描50个货箱并入库
+    python api_client.py --count 50 --serve      # 同时在进程内启动一个临时数据库的服务端
+"""
+import argparse
+import json
+import random
+import socket
+import time
+
+from api_server import DEFAULT_HOST, DEFAULT_PORT
+
+
+class ApiError(Exception):
+    pass
+
+
+class ApiClient:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile("rwb")
+        self._next_id = 0
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pipeline(self, requests):
+        """一次发出全部请求再按顺序读取响应，返回 [(ok, result或错误信息), ...]"""
+        for request in requests:
+            self._next_id += 1
+            line = dict(request, id=self._next_id)
+            self.file.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+        responses = []
+        for _ in requests:
+            response = json.loads(self.file.readline())
+            responses.append((response["ok"], response["result"] if response["ok"] else response["error"]))
+        return responses
+
+    def call(self, op, **params):
+        ok, value = self.pipeline([dict(params, op=op)])[0]
+        if not ok:
+            raise ApiError(value)
+        return value
+
+    def store(self, cargo_id, airline, weight):
+        return self.call("store", cargo_id=cargo_id, airline=airline, weight=weight)
+
+    def retrieve(self, cargo_ids):
+        return self.call("retrieve", cargo_ids=list(cargo_ids))
+
+    def release(self, airline, count=1, policy="fifo"):
+        return self.call("release", airline=airline, count=count, policy=policy)
+
+    def query(self, property, inputs):
+        return self.call("query", property=property, inputs=inputs)
+
+    def airlines(self):
+        return self.call("airlines")
+
+    def move_agv(self, current, target):
+        return self.call("agv_move", current=current, target=target)
+
+
+def simulate_scanner(client, airlines, count, max_weight=500, seed=None):
+    """模拟扫码枪：生成count个货箱，流水线方式一次提交，返回(成功数, 失败数, 耗时)"""
+    rng = random.Random(seed)
+    requests = [{"op": "store", "cargo_id": f"SCAN-{rng.getrandbits(32):08x}",
+                 "airline": rng.choice(airlines), "weight": rng.randint(1, max_weight)}
+                for _ in range(count)]
+    start = time.perf_counter()
+    responses = client.pipeline(requests)
+    elapsed = time.perf_counter() - start
+    success = sum(1 for ok, _ in responses if ok)
+    return success, len(responses) - success, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟扫码枪接入AEK API服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--count", type=int, default=20, help="扫描的货箱数")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--serve", action="store_true", help="在进程内用临时数据库启动服务端")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.serve:
+        import os
+        import tempfile
+
+        from Airport import CargoManager, DatabaseManager
+        from api_server import ApiServer
+
+        path = os.path.join(tempfile.mkdtemp(), "scanner.db")
+        DatabaseManager(path).initialize_database()
+        cargo_mgr = CargoManager(path)
+        with cargo_mgr.db.db_connection() as conn:
+            conn.executemany("INSERT INTO agv (id, position) VALUES (?,?)", [(0, 0), (1, 5)])
+            conn.commit()
+        server = ApiServer(cargo_mgr, args.host, 0).start_in_thread()
+        args.port = server.port
+
+    try:
+        with ApiClient(args.host, args.port) as client:
+            airlines = client.airlines()
+            success, failed, elapsed = simulate_scanner(client, airlines, args.count, seed=args.seed)
+            print(f"入库成功 {success} 个，失败 {failed} 个，耗时 {elapsed:.3f}s")
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
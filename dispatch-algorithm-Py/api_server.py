@@ -0,0 +1,323 @@
+"""本地API服务：供扫码枪、AGV控制器直接接入货场核心
+
+协议为按行分隔的JSON（TCP），每行一个请求，服务端按请求顺序逐行返回：
+
+    -> {"id": 1, "op": "store", "cargo_id": "AEK-001", "airline": "东方航空", "weight": 120}
+    <- {"id": 1, "ok": true, "result": {"id": "AEK-001", "position": "0-0-0", ...}}
+
+支持的op：
+    store      入库          cargo_id, airline, weight
+    retrieve   按ID出库      cargo_ids（列表）
+    release    按航司出库    airline, count, policy
+    query      查询          property（货箱的ID/航空公司/位置）, inputs
+    agv_move   移动AGV       current, target
+    airlines   航司列表
+    ping
+
+客户端可以不等响应连续发送多个请求（流水线），同一连接上的请求按发送顺序生效：
+连续的同类入库或按ID出库请求可以进入同一批，其余请求等此前的请求全部完成后才执行。
+并发的入库、按ID出库请求在batch_window内合并为一次组提交；每个连接最多pipeline_depth个未返回的请求，
+全局最多max_pending_writes个排队的写请求，超过时暂停读取该连接，由TCP流控
+把压力传回客户端。
+
+    python api_server.py --port 8765
+"""
+import argparse
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import instruments
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 经WriteBatcher组提交的操作，同一连接上连续的同类请求可以并发进入同一批
+BATCHED_OPS = ("store", "retrieve")
+
+
+class WriteBatcher:
+    """把同类写请求攒成一批，交给单个写线程组提交"""
+
+    def __init__(self, handler, executor, batch_window, max_batch, max_pending):
+        self.handler = handler            # handler(items) -> [(结果, 异常), ...]
+        self.executor = executor
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(max_pending)
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))  # 队列满时在此等待，形成背压
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            instruments.count("api.batches")
+            instruments.count("api.batched_requests", len(batch))
+            try:
+                results = await loop.run_in_executor(self.executor, self.handler, [item for item, _ in batch])
+            except Exception as e:
+                results = [(None, e)] * len(batch)
+            for (_, future), (result, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def close(self):
+        self.task.cancel()
+
+
+class ApiServer:
+    def __init__(self, cargo_mgr, host=DEFAULT_HOST, port=DEFAULT_PORT, batch_window=0.005, max_batch=64,
+                 pipeline_depth=64, max_pending_writes=256):
+        self.cargo_mgr = cargo_mgr
+        self.host = host
+        self.port = port
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.pipeline_depth = pipeline_depth
+        self.max_pending_writes = max_pending_writes
+        # 写操作在单个线程中串行组提交，查询走独立线程池
+        self._write_executor = ThreadPoolExecutor(1, thread_name_prefix="api-write")
+        self._read_executor = ThreadPoolExecutor(4, thread_name_prefix="api-read")
+        self._server = None
+        self._loop = None
+        self._thread = None
+        self._connections = set()
+
+    # ---- 生命周期 ----
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._store_batcher = WriteBatcher(self._store_batch, self._write_executor, self.batch_window,
+                                           self.max_batch, self.max_pending_writes)
+        self._retrieve_batcher = WriteBatcher(self._retrieve_batch, self._write_executor, self.batch_window,
+                                              self.max_batch, self.max_pending_writes)
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # port=0时取系统分配的端口
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def aclose(self):
+        self._server.close()
+        # 仍连着的客户端不再等待，取消其连接处理
+        for connection in list(self._connections):
+            connection.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._store_batcher.close()
+        self._retrieve_batcher.close()
+
+    def start_in_thread(self):
+        """在后台线程中运行事件循环（GUI使用），返回时服务已开始监听"""
+        started = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="api-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result()
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+        self._write_executor.shutdown()
+        self._read_executor.shutdown()
+
+    # ---- 连接处理 ----
+    async def _handle_connection(self, reader, writer):
+        # 响应按请求顺序返回；队列有界，未返回的请求过多时暂停读取
+        responses = asyncio.Queue(self.pipeline_depth)
+        sender = asyncio.create_task(self._send_responses(responses, writer))
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        # 当前这组连续同类批量请求的操作、开始前须完成的请求、组内请求
+        group_op, barrier, group = None, [], []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                except (ValueError, AttributeError) as e:
+                    request, op = e, None
+                if op in BATCHED_OPS and op == group_op:
+                    group = [task for task in group if not task.done()]
+                else:
+                    # 新的一组要等上一组（以及上一组所等待的请求）全部完成
+                    group_op, barrier, group = op, group, []
+                task = asyncio.create_task(self._handle_request(request, barrier))
+                group.append(task)
+                if not await self._enqueue(responses, task, sender):
+                    task.cancel()
+                    break  # 连接已断开，不再读取客户端已发出的请求
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # 服务关闭（aclose取消连接处理）：不再返回未完成的请求，正常结束以免流回调报告取消
+            sender.cancel()
+        finally:
+            if not await self._enqueue(responses, None, sender):
+                sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            # 发送协程提前退出时，取消队列中尚未返回的请求
+            while not responses.empty():
+                task = responses.get_nowait()
+                if task is not None:
+                    task.cancel()
+            writer.close()
+            self._connections.discard(connection)
+
+    @staticmethod
+    async def _enqueue(responses, task, sender):
+        """把请求放入响应队列；队列满时等待，期间发送协程因连接断开退出则返回False"""
+        if sender.done():
+            return False
+        if not responses.full():
+            responses.put_nowait(task)
+            return True
+        put = asyncio.ensure_future(responses.put(task))
+        await asyncio.wait((put, sender), return_when=asyncio.FIRST_COMPLETED)
+        if put.done():
+            return True
+        put.cancel()
+        return False
+
+    async def _send_responses(self, responses, writer):
+        while True:
+            task = await responses.get()
+            if task is None:
+                break
+            response = await task
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                break
+
+    async def _handle_request(self, request, barrier=()):
+        """barrier中的请求完成后执行request；request为解析失败的异常时直接返回错误"""
+        request_id = None
+        try:
+            if isinstance(request, Exception):
+                raise request
+            request_id = request.get("id")
+            if barrier:
+                await asyncio.wait(barrier)
+            with instruments.timer(f"api.{request.get('op')}"):
+                result = await self.dispatch(request)
+            return {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            return {"id": request_id, "ok": False, "error": str(e)}
+
+    async def dispatch(self, request):
+        op = request.get("op")
+        loop = asyncio.get_running_loop()
+        mgr = self.cargo_mgr
+        if op == "store":
+            return await self._store_batcher.submit(self._store_item(request))
+        if op == "retrieve":
+            return await self._retrieve_batcher.submit([str(cargo_id) for cargo_id in request["cargo_ids"]])
+        if op == "release":
+            released = await loop.run_in_executor(
+                self._write_executor, mgr.release_airline,
+                request["airline"], request.get("count", 1), request.get("policy", "fifo"))
+            return [{"id": cargo_id, "timestamp": timestamp, "position": position}
+                    for cargo_id, timestamp, position in released]
+        if op == "query":
+            rows = await loop.run_in_executor(
+                self._read_executor, mgr.search_cargo, request["property"], request["inputs"])
+            return [list(row) for row in rows]
+        if op == "agv_move":
+            await loop.run_in_executor(
+                self._write_executor, mgr.move_agv, int(request["current"]), int(request["target"]))
+            return {"position": int(request["target"])}
+        if op == "airlines":
+            return list(mgr.airline_list)
+        if op == "ping":
+            return "pong"
+        raise ValueError(f"未知的操作: {op}")
+
+    def _store_item(self, request):
+        """校验入库请求：重量须在(0, max_weight]内，航司须已存在（get_airline_shelf会自动新建未知航司）"""
+        cargo_id, airline, weight = str(request["cargo_id"]), request["airline"], int(request["weight"])
+        if not 0 < weight <= self.cargo_mgr.max_weight:
+            raise ValueError(f"无效的重量值: {weight}")
+        if airline not in self.cargo_mgr.airline_row_mapping:
+            raise ValueError(f"未知的航司: {airline}")
+        return cargo_id, airline, weight
+
+    # ---- 组提交 ----
+    def _store_batch(self, items):
+        return self.cargo_mgr.smart_store_batch(items)
+
+    def _retrieve_batch(self, id_lists):
+        """把多个按ID出库请求合并为一次retrieve_many，再按请求拆分结果"""
+        rows = self.cargo_mgr.retrieve_many([cargo_id for ids in id_lists for cargo_id in ids])
+        by_id = {row[0]: list(row) for row in rows}
+        results = []
+        for ids in id_lists:
+            found = [by_id.pop(cargo_id) for cargo_id in ids if cargo_id in by_id]
+            results.append((found, None))
+        return results
+
+
+def main(argv=None):
+    from Airport import DATABASE_NAME, JOURNAL_NAME, CargoManager, DatabaseManager
+
+    parser = argparse.ArgumentParser(description="AEK货场本地API服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=DATABASE_NAME, help="数据库路径")
+    parser.add_argument("--journal", default=JOURNAL_NAME, help="操作日志路径，传空字符串关闭")
+    args = parser.parse_args(argv)
+
+    DatabaseManager(args.db).initialize_database()
+    cargo_mgr = CargoManager(args.db, journal_path=args.journal or None)
+    server = ApiServer(cargo_mgr, args.host, args.port)
+    print(f"AEK API服务已启动: {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
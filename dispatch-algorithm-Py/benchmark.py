@@ -0,0 +1,283 @@
+"""AEK货场性能基准测试
+
+无需图形界面即可运行（只导入wx，不创建wx.App），所有随机数均由种子控制：
+
+    python benchmark.py                          # 运行全部基准，结果以JSON打印
+    python benchmark.py -o result.json           # 将结果写入文件
+    python benchmark.py --baseline base.json     # 与基线对比，出现性能回退时退出码为1
+    python benchmark.py --only ga_solve --quick  # 只运行名称包含ga_solve的小规模基准
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Airport import (CARGO_INSERT_SQL, CargoManager, DatabaseManager, GeneticAlgorithmSolver, Shelf, ShelfConfig,
+                     format_position)
+from dwell import stored_epoch
+
+SHELF_SIZES = [(6, 1, 6), (12, 2, 10), (30, 4, 12)]
+QUICK_SHELF_SIZES = [(6, 1, 6)]
+FILL_LEVELS = [0.0, 0.5, 0.9]
+DB_SIZES = [100, 1000, 10000]
+QUICK_DB_SIZES = [100]
+BULK_COUNTS = [20, 100, 280]
+QUICK_BULK_COUNTS = [20]
+CSV_SIZES = [100, 1000]
+QUICK_CSV_SIZES = [100]
+AGV_POSITIONS = [0, 5]
+
+
+def measure(func, setup=None, repeat=5):
+    """重复执行func并返回耗时统计（秒），setup的耗时不计入结果"""
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings)
+    return {
+        "min": float(timings.min()),
+        "median": float(np.median(timings)),
+        "mean": float(timings.mean()),
+        "repeat": repeat,
+    }
+
+
+def make_shelf(size, fill, rng):
+    """按填充率随机占用货架位置"""
+    shelf = Shelf(ShelfConfig(*size))
+    total = shelf.storage.size
+    occupied = rng.choice(total, int(total * fill), replace=False)
+    shelf.storage.reshape(-1)[occupied] = 1
+    shelf.rebuild_index()
+    return shelf
+
+
+def make_database(path, size, rng):
+    """建立含size条货箱记录的测试数据库，货箱超出默认货架容量时按需增加货架列数"""
+    DatabaseManager(path).initialize_database()
+    mgr = CargoManager(path)
+    config = ShelfConfig()
+    per_column = config.rows * config.layers
+    filled = dict.fromkeys(mgr.airline_list, 0)
+    rows = []
+    for i in range(size):
+        airline = mgr.airline_list[int(rng.integers(len(mgr.airline_list)))]
+        # 各航司依次占用货位，保证同一货位只有一个货箱
+        slot = filled[airline]
+        filled[airline] += 1
+        rows.append((
+            f"BENCH-{i:06d}", airline,
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(1700000000 + i)),
+            int(rng.integers(1, mgr.max_weight + 1)),
+            format_position(slot % config.rows, slot // per_column, slot // config.rows % config.layers,
+                            mgr.airline_row_mapping[airline]),
+        ))
+    for airline, count in filled.items():
+        if count > per_column:
+            mgr.resize_shelf(airline, columns=-(-count // per_column))
+    with mgr.db.db_connection() as conn:
+        conn.executemany(CARGO_INSERT_SQL, [row + (stored_epoch(row[2]),) for row in rows])
+        conn.executemany("INSERT INTO agv (id, position) VALUES (?,?)", enumerate(AGV_POSITIONS))
+        conn.commit()
+    return mgr
+
+
+def bench_find_available_position(args, rng, results, workdir):
+    for size in args.shelf_sizes:
+        for fill in FILL_LEVELS:
+            shelf = make_shelf(size, fill, rng)
+            name = f"shelf_find_available_position[{'x'.join(map(str, size))},fill={fill}]"
+            results[name] = measure(shelf.find_available_position, repeat=args.repeat)
+            for weight in (30, 420):
+                results[f"shelf_find_slot_for_weight[{'x'.join(map(str, size))},fill={fill},weight={weight}]"] = \
+                    measure(lambda: shelf.find_slot_for_weight(weight), repeat=args.repeat)
+
+
+def bench_ga_solve(args, rng, results, workdir):
+    for size in args.shelf_sizes:
+        for fill in FILL_LEVELS:
+            shelf = make_shelf(size, fill, rng)
+            weight = int(rng.integers(1, shelf.max_weight + 1))
+
+            def solve():
+                GeneticAlgorithmSolver(
+                    agv_positions=AGV_POSITIONS, target_column=3,
+                    cargo_weight=weight, shelf=shelf, rng=args.seed).solve()
+
+            name = f"ga_solve[{'x'.join(map(str, size))},fill={fill}]"
+            results[name] = measure(solve, repeat=args.repeat)
+
+
+def bench_database(args, rng, results, workdir):
+    for size in args.db_sizes:
+        path = os.path.join(workdir, f"load_{size}.db")
+        make_database(path, size, rng)
+        results[f"load_initial_data[rows={size}]"] = measure(
+            lambda: CargoManager(path), repeat=args.repeat)
+        # 重新加载，使内存中的ID索引等包含刚写入的货箱
+        mgr = CargoManager(path)
+
+        queries = {
+            "货箱的ID": {"货箱的ID": f"BENCH-{size // 2:06d}"},
+            "航空公司": {"航空公司": mgr.airline_list[0]},
+            "位置": {"行数": "0", "列数": "0", "层数": "0"},
+        }
+        for property, inputs in queries.items():
+            results[f"result_4_search[{property},rows={size}]"] = measure(
+                lambda: mgr.search_cargo(property, inputs), repeat=args.repeat)
+
+
+def bench_bulk_inbound(args, rng, results, workdir):
+    for count in args.bulk_counts:
+        def setup():
+            path = os.path.join(workdir, f"bulk_{count}.db")
+            if os.path.exists(path):
+                os.remove(path)
+            return (make_database(path, 0, rng), random.Random(args.seed))
+
+        results[f"bulk_inbound[count={count}]"] = measure(
+            lambda mgr, py_rng: mgr.bulk_random_inbound(count, rng=py_rng),
+            setup=setup, repeat=args.repeat)
+
+
+def bench_bulk_retrieve(args, rng, results, workdir):
+    for count in args.bulk_counts:
+        def setup():
+            path = os.path.join(workdir, f"retrieve_{count}.db")
+            if os.path.exists(path):
+                os.remove(path)
+            mgr = make_database(path, 0, rng)
+            mgr.bulk_random_inbound(count, rng=random.Random(args.seed))
+            with mgr.db.db_connection() as conn:
+                ids = [row[0] for row in conn.execute("SELECT id FROM cargo")]
+            return (mgr, ids)
+
+        results[f"bulk_retrieve[count={count}]"] = measure(
+            lambda mgr, ids: mgr.retrieve_many(ids), setup=setup, repeat=args.repeat)
+
+
+def bench_aek_manager(args, rng, results, workdir):
+    import AEK_Manager
+
+    for size in args.csv_sizes:
+        path = os.path.join(workdir, f"aek_{size}.csv")
+        AEK_Manager.file_name = path
+
+        def setup():
+            with open(path, mode='w', encoding='utf-8', newline='') as f:
+                AEK_Manager.csv.writer(f).writerows(
+                    [f"AEK-{i:06d}", AEK_Manager.airline_companies[i % 9 + 1],
+                     '2025-03-11 19:00:45', f"{int(rng.integers(1, 500))}kg", [i % 6, 0, i % 6]]
+                    for i in range(size))
+            return ()
+
+        def append_box():
+            with contextlib.redirect_stdout(io.StringIO()):
+                AEK_Manager.aek_box('AEK-NEW', '东方航空', '95kg', '2025-03-11 19:00:45', [0, 0, 0])
+
+        results[f"aek_csv_append[rows={size}]"] = measure(append_box, setup=setup, repeat=args.repeat)
+        setup()
+        for property, key in (("ID", f"AEK-{size // 2:06d}"), ("airlines", "东方航空"), ("site", "[0, 0, 0]")):
+            results[f"aek_csv_query[{property},rows={size}]"] = measure(
+                lambda: AEK_Manager.query_box(property, key), repeat=args.repeat)
+        results[f"aek_csv_delete[rows={size}]"] = measure(
+            lambda: AEK_Manager.delete_row_from_csv(path, size // 2), setup=setup, repeat=args.repeat)
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    results = {}
+    suites = [
+        ("shelf", bench_find_available_position),
+        ("ga_solve", bench_ga_solve),
+        ("database", bench_database),
+        ("bulk_inbound", bench_bulk_inbound),
+        ("bulk_retrieve", bench_bulk_retrieve),
+        ("aek_csv", bench_aek_manager),
+    ]
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, suite in suites:
+            if args.only and args.only not in name:
+                continue
+            suite(args, rng, results, workdir)
+    return {
+        "meta": {
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "quick": args.quick,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "created": time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """按中位数与基线对比，返回回退的基准名称列表"""
+    regressions = []
+    print(f"{'benchmark':<60}{'baseline':>12}{'current':>12}{'ratio':>8}", file=sys.stderr)
+    for name, stats in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<60}{'-':>12}{stats['median']:>12.6f}{'new':>8}", file=sys.stderr)
+            continue
+        ratio = stats["median"] / base["median"] if base["median"] else float('inf')
+        flag = " !" if ratio > 1 + tolerance else ""
+        print(f"{name:<60}{base['median']:>12.6f}{stats['median']:>12.6f}{ratio:>8.2f}{flag}", file=sys.stderr)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="AEK货场性能基准测试")
+    parser.add_argument("-o", "--output", help="结果JSON的输出路径（默认打印到标准输出）")
+    parser.add_argument("--baseline", help="用于对比的基线结果JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的中位数变慢比例，默认0.2")
+    parser.add_argument("--seed", type=int, default=2025, help="随机数种子")
+    parser.add_argument("--repeat", type=int, default=5, help="每项基准的重复次数")
+    parser.add_argument("--only", help="只运行名称包含该字符串的基准组（shelf/ga_solve/database/bulk_inbound/bulk_retrieve/aek_csv）")
+    parser.add_argument("--quick", action="store_true", help="只运行最小规模，用于快速检查")
+    args = parser.parse_args(argv)
+    args.shelf_sizes = QUICK_SHELF_SIZES if args.quick else SHELF_SIZES
+    args.db_sizes = QUICK_DB_SIZES if args.quick else DB_SIZES
+    args.bulk_counts = QUICK_BULK_COUNTS if args.quick else BULK_COUNTS
+    args.csv_sizes = QUICK_CSV_SIZES if args.quick else CSV_SIZES
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"性能回退 {len(regressions)} 项: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""在库时长监控：找出长期滞留的货箱
+
+cargo.timestamp 为'%Y-%m-%d %H:%M:%S'格式的本地时间字符串，另存一列整数的入库时间戳
+cargo.stored_at 并建索引，按时间范围查询时走索引而不是逐行比较字符串。
+
+DwellMonitor 在内存中维护按入库时间排序的最小堆，找出在库超过阈值的k个货箱只需
+O(k log n)，不必每个班次扫描整张表；货箱出库后不立即从堆中删除，弹出时与当前记录
+比对、丢弃过期条目。出库选箱的先进先出策略也按同一个入库时间戳排序。
+"""
+import functools
+import heapq
+import threading
+import time
+
+import events
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@functools.lru_cache(maxsize=4096)
+def stored_epoch(timestamp):
+    """入库时间字符串（本地时间）转为整数时间戳；同一秒入库的货箱共用缓存结果"""
+    return int(time.mktime(time.strptime(timestamp, TIMESTAMP_FORMAT)))
+
+
+class DwellMonitor:
+    def __init__(self):
+        self.entries = {}  # cargo_id -> (stored_at, airline)
+        self.heap = []     # [(stored_at, cargo_id), ...]
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """批量建堆，rows为 (cargo_id, airline, stored_at)"""
+        with self._lock:
+            for cargo_id, airline, stored_at in rows:
+                self.entries[cargo_id] = (stored_at, airline)
+            self.heap = [(stored_at, cargo_id) for cargo_id, (stored_at, _) in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def add(self, cargo_id, airline, stored_at):
+        with self._lock:
+            self.entries[cargo_id] = (stored_at, airline)
+            heapq.heappush(self.heap, (stored_at, cargo_id))
+            # 过期条目超过一半时重建，堆的大小与在库货箱数同阶
+            if len(self.heap) > 2 * len(self.entries) + 64:
+                self.heap = [(stored_at, cargo_id) for cargo_id, (stored_at, _) in self.entries.items()]
+                heapq.heapify(self.heap)
+
+    def discard(self, cargo_id):
+        with self._lock:
+            self.entries.pop(cargo_id, None)
+
+    def clear(self, airline=None):
+        with self._lock:
+            if airline is None:
+                self.entries.clear()
+                self.heap.clear()
+            else:
+                self.entries = {cargo_id: entry for cargo_id, entry in self.entries.items() if entry[1] != airline}
+
+    def on_events(self, batch):
+        """订阅库存事件，随入库、出库增量维护"""
+        for event in batch:
+            if event.kind == events.STORED:
+                data = event.data or {}
+                stored_at = data.get("stored_at") or stored_epoch(data["timestamp"])
+                self.add(event.cargo_id, event.airline, stored_at)
+            elif event.kind == events.RETRIEVED:
+                self.discard(event.cargo_id)
+            elif event.kind == events.CLEARED:
+                self.clear()
+            elif event.kind == events.AIRLINE_REMOVED:
+                self.clear(event.airline)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def oldest(self):
+        """最早入库的在库货箱 (cargo_id, airline, stored_at)，没有货箱时返回None"""
+        with self._lock:
+            self._clean_top()
+            if not self.heap:
+                return None
+            stored_at, cargo_id = self.heap[0]
+            return cargo_id, self.entries[cargo_id][1], stored_at
+
+    def _clean_top(self):
+        while self.heap and self.entries.get(self.heap[0][1], (None,))[0] != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def overdue(self, threshold, now=None, limit=None):
+        """在库超过threshold秒的货箱，按入库时间从早到晚返回 [(cargo_id, airline, stored_at), ...]
+
+        只弹出超期的k个条目再放回，O(k log n)；limit限制返回的个数。
+        """
+        cutoff = (time.time() if now is None else now) - threshold
+        found = []
+        with self._lock:
+            popped = []
+            while self.heap and self.heap[0][0] <= cutoff and (limit is None or len(found) < limit):
+                stored_at, cargo_id = heapq.heappop(self.heap)
+                entry = self.entries.get(cargo_id)
+                if entry is None or entry[0] != stored_at:
+                    continue  # 已出库或已重新入库的过期条目
+                popped.append((stored_at, cargo_id))
+                found.append((cargo_id, entry[1], stored_at))
+            for item in popped:
+                heapq.heappush(self.heap, item)
+        return found
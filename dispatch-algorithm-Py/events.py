@@ -0,0 +1,85 @@
+"""库存变更事件总线
+
+CargoManager 在每次提交数据库后发布事件，界面、缓存、统计等订阅方据此增量更新，
+不再轮询数据库，也不再沿父窗口链手动刷新。
+
+事件先进入待分发队列，同一批（GUI中为同一轮事件循环）内的事件合并为一个列表
+交给订阅方，因此批量入库200个货箱也只触发一次重绘。无界面时 schedule 为 None，
+发布即同步分发。
+"""
+import threading
+from dataclasses import dataclass, field
+
+STORED = "stored"
+RETRIEVED = "retrieved"
+MOVED = "moved"
+CLEARED = "cleared"  # 一键全部出库
+AGV_MOVED = "agv_moved"
+AIRLINE_ADDED = "airline_added"
+AIRLINE_REMOVED = "airline_removed"
+SHELF_RESIZED = "shelf_resized"
+AIRLINE_RELOCATED = "airline_relocated"  # 行号压缩后航司迁到新的货场列
+
+
+@dataclass(frozen=True)
+class Event:
+    kind: str
+    airline: str = None
+    cargo_id: str = None
+    position: tuple = None   # (x, y, z)，agv_moved时为 (原位置, 新位置)
+    data: dict = field(default=None, compare=False)
+
+
+class EventBus:
+    def __init__(self, schedule=None):
+        # schedule(flush)：把一次分发安排到下一帧，GUI中传入wx.CallAfter
+        self.schedule = schedule
+        self._subscribers = []
+        self._immediate = []  # 在发布线程中同步调用的订阅方，如操作日志
+        self._pending = []
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback, kinds=None, immediate=False):
+        """订阅事件，callback(events)收到合并后的事件列表；返回用于取消订阅的函数
+
+        immediate为True时不等待合并，在发布线程中随每次publish同步调用。
+        """
+        entry = (callback, frozenset(kinds) if kinds else None)
+        target = self._immediate if immediate else self._subscribers
+        with self._lock:
+            target.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in target:
+                    target.remove(entry)
+        return unsubscribe
+
+    def publish(self, *events):
+        self._dispatch(list(self._immediate), events)
+        with self._lock:
+            self._pending.extend(events)
+            if self._scheduled or not self._pending:
+                return
+            self._scheduled = True
+        if self.schedule is None:
+            self.flush()
+        else:
+            self.schedule(self.flush)
+
+    def flush(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+            self._scheduled = False
+            subscribers = list(self._subscribers)
+        self._dispatch(subscribers, events)
+
+    @staticmethod
+    def _dispatch(subscribers, events):
+        if not events:
+            return
+        for callback, kinds in subscribers:
+            selected = events if kinds is None else [e for e in events if e.kind in kinds]
+            if selected:
+                callback(selected)
@@ -0,0 +1,179 @@
+"""货箱ID的内存索引：前缀、子串与编辑距离为1的模糊查找
+
+标签破损时操作员往往只有部分ID，生成的ID又形如"RND-xxxxxx"，全表扫描逐个比较太慢。
+CargoIdIndex 随入库、出库事件增量维护三个结构：
+    有序数组   按ID排序，前缀查找用二分定位区间
+    三元组倒排 ID中每个长度为3的子串 -> ID集合，子串查找取各三元组集合的交集再核对；
+               查询串很短或很常见时改为按有序数组顺序比较，凑够个数即停
+    删除邻域   ID删去任意一个字符后的串 -> ID集合，编辑距离为1（增、删、改一个字符）
+               的两个串必有一个相同的删除变体，查询串的变体逐个查表即可
+
+比较不区分大小写，返回原始ID。
+"""
+import bisect
+import threading
+
+import events
+
+GRAM = 3
+
+
+def _grams(key):
+    return {key[i:i + GRAM] for i in range(len(key) - GRAM + 1)}
+
+
+def _deletions(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def within_one_edit(a, b):
+    """a与b的编辑距离不超过1"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+
+class CargoIdIndex:
+    def __init__(self):
+        self.airlines = {}   # cargo_id -> 航司
+        self.sorted = []     # [(小写ID, cargo_id), ...]
+        self.grams = {}      # 三元组 -> {cargo_id}
+        self.variants = {}   # 删除变体 -> {cargo_id}
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """批量建立索引，rows为 (cargo_id, airline)"""
+        with self._lock:
+            for cargo_id, airline in rows:
+                self._add(cargo_id, airline, insort=False)
+            self.sorted.sort()
+
+    def add(self, cargo_id, airline):
+        with self._lock:
+            self._add(cargo_id, airline)
+
+    def _add(self, cargo_id, airline, insort=True):
+        if cargo_id in self.airlines:
+            self.airlines[cargo_id] = airline
+            return
+        self.airlines[cargo_id] = airline
+        key = cargo_id.casefold()
+        if insort:
+            bisect.insort(self.sorted, (key, cargo_id))
+        else:
+            self.sorted.append((key, cargo_id))
+        for gram in _grams(key):
+            self.grams.setdefault(gram, set()).add(cargo_id)
+        for variant in _deletions(key) | {key}:
+            self.variants.setdefault(variant, set()).add(cargo_id)
+
+    def discard(self, cargo_id):
+        with self._lock:
+            self._discard(cargo_id)
+
+    def _discard(self, cargo_id):
+        if self.airlines.pop(cargo_id, None) is None:
+            return
+        key = cargo_id.casefold()
+        i = bisect.bisect_left(self.sorted, (key, cargo_id))
+        if i < len(self.sorted) and self.sorted[i] == (key, cargo_id):
+            del self.sorted[i]
+        for table, entries in ((self.grams, _grams(key)), (self.variants, _deletions(key) | {key})):
+            for entry in entries:
+                ids = table.get(entry)
+                if ids is not None:
+                    ids.discard(cargo_id)
+                    if not ids:
+                        del table[entry]
+
+    def clear(self, airline=None):
+        with self._lock:
+            if airline is None:
+                self.airlines.clear()
+                self.sorted.clear()
+                self.grams.clear()
+                self.variants.clear()
+            else:
+                for cargo_id in [cid for cid, owner in self.airlines.items() if owner == airline]:
+                    self._discard(cargo_id)
+
+    def on_events(self, batch):
+        """订阅库存事件，随入库、出库增量维护"""
+        for event in batch:
+            if event.kind == events.STORED:
+                self.add(event.cargo_id, event.airline)
+            elif event.kind == events.RETRIEVED:
+                self.discard(event.cargo_id)
+            elif event.kind == events.CLEARED:
+                self.clear()
+            elif event.kind == events.AIRLINE_REMOVED:
+                self.clear(event.airline)
+
+    def __len__(self):
+        return len(self.airlines)
+
+    def __contains__(self, cargo_id):
+        return cargo_id in self.airlines
+
+    def prefix(self, text, limit=None):
+        """以text开头的ID，按ID排序"""
+        key = text.casefold()
+        found = []
+        with self._lock:
+            i = bisect.bisect_left(self.sorted, (key,))
+            while i < len(self.sorted) and self.sorted[i][0].startswith(key):
+                if limit is not None and len(found) >= limit:
+                    break
+                found.append(self.sorted[i][1])
+                i += 1
+        return found
+
+    def substring(self, text, limit=None):
+        """包含text的ID，按ID排序
+
+        text不足3个字符、或三元组交集很大（如"ND-"）时按有序数组逐个比较，凑够limit个即停。
+        """
+        key = text.casefold()
+        with self._lock:
+            postings = sorted((self.grams.get(gram, set()) for gram in _grams(key)), key=len)
+            # 最小的三元组集合都很大时交集也大，不如顺序比较
+            if not postings or len(postings[0]) * 4 > len(self.sorted):
+                found = []
+                for folded, cargo_id in self.sorted:
+                    if limit is not None and len(found) >= limit:
+                        break
+                    if key in folded:
+                        found.append(cargo_id)
+                return found
+            candidates = set.intersection(*postings)
+            return sorted(cargo_id for cargo_id in candidates if key in cargo_id.casefold())[:limit]
+
+    def fuzzy(self, text, limit=None):
+        """与text编辑距离不超过1的ID，按ID排序"""
+        key = text.casefold()
+        candidates = set()
+        with self._lock:
+            for variant in _deletions(key) | {key}:
+                candidates |= self.variants.get(variant, set())
+        return sorted(cargo_id for cargo_id in candidates if within_one_edit(key, cargo_id.casefold()))[:limit]
+
+    def search(self, text, limit=50):
+        """边输边查：依次返回完全匹配、前缀、子串、编辑距离为1的ID，[(cargo_id, 匹配方式), ...]"""
+        text = text.strip()
+        if not text:
+            return []
+        results = {}
+        for kind, lookup in (("前缀", self.prefix), ("包含", self.substring), ("近似", self.fuzzy)):
+            if len(results) >= limit:
+                break  # 排在前面的匹配方式已经凑够
+            for cargo_id in lookup(text, limit):
+                results.setdefault(cargo_id, "完全匹配" if cargo_id.casefold() == text.casefold() else kind)
+        ordered = sorted(results.items(), key=lambda item: item[1] != "完全匹配")
+        return ordered[:limit]
@@ -0,0 +1,165 @@
+"""热路径埋点：计时器、计数器与延迟直方图
+
+用法：
+    from instrumentation import instruments
+
+    with instruments.timer("solver.solve"):
+        ...
+
+    @instruments.timed("cargo.load_initial_data")
+    def load_initial_data(self): ...
+
+    instruments.count("solver.generations", 100)
+    instruments.dump("latency.json")
+
+默认关闭，关闭时timer返回共享的空上下文、timed只多一次属性判断，几乎没有额外开销。
+设置环境变量 AEK_INSTRUMENT=1 或调用 instruments.enable() 开启。
+"""
+import bisect
+import contextlib
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# 1µs ~ 100s 按对数分桶，每个数量级20个桶（相对误差约12%）
+BUCKETS_PER_DECADE = 20
+MIN_LATENCY = 1e-6
+MAX_LATENCY = 100.0
+BUCKET_BOUNDS = [MIN_LATENCY * 10 ** (i / BUCKETS_PER_DECADE)
+                 for i in range(int(math.log10(MAX_LATENCY / MIN_LATENCY) * BUCKETS_PER_DECADE) + 1)]
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class LatencyHistogram:
+    """固定内存的对数分桶延迟直方图"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """返回第p百分位所在桶的上界（不超过实际最大值）"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                bound = BUCKET_BOUNDS[idx] if idx < len(BUCKET_BOUNDS) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class _Timer:
+    __slots__ = ("owner", "name", "start")
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.owner.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def timer(self, name):
+        """计时上下文，退出时把耗时记入name对应的直方图"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """计时装饰器，是否计时在每次调用时判断"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = LatencyHistogram()
+            hist.record(seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """返回 {"latency": {操作: 统计}, "counters": {计数器: 值}}"""
+        with self._lock:
+            return {
+                "latency": {name: hist.summary() for name, hist in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def dump(self, path):
+        data = self.snapshot()
+        data["created"] = time.strftime('%Y-%m-%d %H:%M:%S')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+
+instruments = Instrumentation(enabled=os.environ.get("AEK_INSTRUMENT") == "1")
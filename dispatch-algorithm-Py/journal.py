@@ -0,0 +1,226 @@
+"""只追加的操作日志（journal）与检查点
+
+每条库存事件以一行JSON追加到日志文件，写入后不立即fsync，而是攒够sync_batch条或
+超过sync_interval秒时统一落盘，后台线程保证最后一批也会按时落盘。
+
+日志同时维护一份由事件推导出的库存状态（航司与货箱位置），每checkpoint_every条
+把该状态连同日志偏移写入检查点文件（先写临时文件再替换，保证检查点完整）。
+每条记录带上写入时已应用的变更日志序号（cargo_changes.seq），恢复时与数据库的最新
+序号比对：其他工位在本工位停机期间的移库不改变货箱数量，只能由序号发现。
+恢复时读取最近的检查点，从其偏移处重放剩余日志；崩溃时写了一半的末行会被截掉。
+检查点写入后日志即被截断，文件大小不超过checkpoint_every条记录；检查点替换后、
+截断前崩溃时，重放会跳过序号不大于检查点的记录。
+
+日志也是吞吐统计的数据源：入库/出库/移位次数在追加时按分钟累计，随检查点保存，
+保留throughput_retention秒；throughput() 只汇总内存中的计数，不读日志文件，也不查询在用的cargo表。
+"""
+import json
+import os
+import threading
+import time
+
+import events
+
+COUNTED_KINDS = (events.STORED, events.RETRIEVED, events.MOVED)
+COUNT_BUCKET = 60  # 吞吐计数的最小时间粒度（秒）
+
+
+class JournalState:
+    """由事件推导出的库存状态"""
+
+    def __init__(self, airlines=None, boxes=None, change_seq=None):
+        self.airlines = dict(airlines or {})   # 航司 -> 行号
+        self.boxes = dict(boxes or {})         # 货箱ID -> [航司, 入库时间, 重量, x, z, y, 寄存货架航司]
+        self.change_seq = change_seq           # 状态对应的变更日志序号，未知时为None
+
+    def apply(self, record):
+        if "change_seq" in record:
+            self.change_seq = record["change_seq"]
+        kind = record["kind"]
+        if kind == events.STORED:
+            data = record.get("data") or {}
+            x, y, z = record["position"]
+            self.boxes[record["cargo_id"]] = [record["airline"], data.get("timestamp"), data.get("weight"), x, z, y,
+                                              data.get("host")]
+        elif kind == events.RETRIEVED:
+            self.boxes.pop(record["cargo_id"], None)
+        elif kind == events.MOVED:
+            box = self.boxes.get(record["cargo_id"])
+            if box is not None:
+                x, y, z = record["position"]
+                box[3:] = [x, z, y, (record.get("data") or {}).get("host")]
+        elif kind == events.CLEARED:
+            self.boxes.clear()
+        elif kind in (events.AIRLINE_ADDED, events.AIRLINE_RELOCATED):
+            self.airlines[record["airline"]] = (record.get("data") or {}).get("row_index")
+        elif kind == events.AIRLINE_REMOVED:
+            self.airlines.pop(record["airline"], None)
+            # 删除航司时其货箱一并出库
+            self.boxes = {cargo_id: box for cargo_id, box in self.boxes.items() if box[0] != record["airline"]}
+
+    def to_dict(self):
+        return {"airlines": self.airlines, "boxes": self.boxes, "change_seq": self.change_seq}
+
+
+class Journal:
+    def __init__(self, path, sync_batch=64, sync_interval=0.2, checkpoint_every=1000, change_seq=None,
+                 throughput_retention=7 * 24 * 3600):
+        self.path = path
+        self.change_seq = change_seq  # 返回当前已应用的变更日志序号的函数，None时记录中不带序号
+        self.checkpoint_path = path + ".checkpoint"
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+        self.throughput_retention = throughput_retention
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.counts = {}  # (分钟起始时间戳, 事件类型, 航司) -> 次数
+        self._stale = False
+        self.state, self.seq, offset = self._recover()
+        self._since_checkpoint = 0
+        self._file = open(path, "ab")
+        self._file.truncate(offset)  # 丢弃崩溃时写了一半的末行
+        if self._stale:
+            self._checkpoint()  # 日志中残留检查点已包含的记录，重新截断
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+        self._syncer.start()
+
+    # ---- 恢复 ----
+    def _recover(self):
+        state, seq, offset = JournalState(), 0, 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            state = JournalState(checkpoint["airlines"], checkpoint["boxes"], checkpoint.get("change_seq"))
+            seq, offset = checkpoint["seq"], checkpoint["offset"]
+            self.counts = {(start, kind, airline): n for start, kind, airline, n in checkpoint.get("counts", ())}
+        if not os.path.exists(self.path):
+            return state, seq, 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if record["seq"] <= seq:
+                    self._stale = True  # 检查点已包含：替换检查点后、截断日志前崩溃
+                    continue
+                state.apply(record)
+                self._count(record)
+                seq = record["seq"]
+        return state, seq, offset
+
+    def _count(self, record):
+        if record["kind"] in COUNTED_KINDS:
+            key = (int(record["t"] // COUNT_BUCKET * COUNT_BUCKET), record["kind"], record["airline"])
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    # ---- 写入 ----
+    def append(self, batch):
+        """追加一批事件，可直接作为EventBus的即时订阅回调"""
+        now = time.time()
+        with self._lock:
+            # 事件在提交并推进已应用序号之后发布，此时的序号已包含本批变更
+            change_seq = self.change_seq() if self.change_seq else None
+            for event in batch:
+                self.seq += 1
+                record = {"seq": self.seq, "t": now, "kind": event.kind, "airline": event.airline,
+                          "cargo_id": event.cargo_id, "position": event.position, "data": event.data}
+                if self.change_seq:
+                    record["change_seq"] = change_seq
+                self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                # 经JSON往返，使状态与重放结果一致（元组变为列表）
+                self.state.apply(json.loads(json.dumps(record)))
+                self._count(record)
+            self._unsynced += len(batch)
+            self._since_checkpoint += len(batch)
+            if self._unsynced >= self.sync_batch or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+            if self._since_checkpoint >= self.checkpoint_every:
+                self._checkpoint()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.sync_interval):
+            with self._lock:
+                if self._unsynced:
+                    self._sync()
+
+    def _checkpoint(self):
+        self._sync()
+        now = time.time()
+        self.counts = {key: n for key, n in self.counts.items() if key[0] >= now - self.throughput_retention}
+        # 检查点包含日志中的全部记录，写入后截断日志，新检查点的偏移为0
+        checkpoint = dict(self.state.to_dict(), seq=self.seq, offset=0, time=now,
+                          counts=[[*key, n] for key, n in self.counts.items()])
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_path)
+        self._file.truncate(0)
+        self._file.seek(0)
+        os.fsync(self._file.fileno())
+        self._since_checkpoint = 0
+
+    def checkpoint(self):
+        with self._lock:
+            self._checkpoint()
+
+    def reset(self, airlines, boxes, change_seq=None):
+        """日志与数据库不一致时，以数据库状态为准写入新的检查点"""
+        with self._lock:
+            self.state = JournalState(airlines, {cargo_id: list(box) for cargo_id, box in boxes.items()},
+                                      change_seq)
+            self._checkpoint()
+
+    def close(self):
+        self._closed.set()
+        self._syncer.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    # ---- 统计 ----
+    def records(self, since=None):
+        """按顺序读取最近一次检查点之后的日志记录，since为起始时间戳（秒）"""
+        with self._lock:
+            self._file.flush()
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if since is None or record["t"] >= since:
+                    yield record
+
+    def throughput(self, bucket_seconds=3600, since=None, airline=None):
+        """按时间桶统计入库/出库/移位次数，返回 {桶起始时间戳: {事件类型: 次数}}
+
+        计数按分钟累计，since与桶边界均按分钟取整；只保留最近throughput_retention秒。
+        """
+        since = None if since is None else since // COUNT_BUCKET * COUNT_BUCKET
+        buckets = {}
+        with self._lock:
+            items = list(self.counts.items())
+        for (start, kind, owner), n in sorted(items):
+            if since is not None and start < since:
+                continue
+            if airline is not None and owner != airline:
+                continue
+            counts = buckets.setdefault(int(start // bucket_seconds * bucket_seconds), {})
+            counts[kind] = counts.get(kind, 0) + n
+        return buckets
@@ -0,0 +1,157 @@
+"""出库选箱：按策略从航司货架中挑选下一个出库的货箱
+
+每个航司为每种策略各维护一个最小堆，选箱、入库、出库均为 O(log n)。
+货箱被出库或移位后不立即从堆中删除，而是在弹出时与当前记录比对、丢弃过期条目。
+
+策略：
+    fifo     最早入库的先出
+    top      最高层的先出，避免为取下层货箱而翻动上层
+    nearest  搬运代价最小的先出：最近的AGV经调度中心到货箱所在货架列的代价，加上
+             货架内的搬运距离（行号+列号+层号）。溢出存放的货箱与本航司货箱不在同一列，
+             AGV位置又随调度变化，因此该策略按寄存货架分堆，货架内的距离作为堆的键，
+             选箱时由调用方传入各货架列当前的AGV代价，取各堆堆顶合计代价最小者
+
+溢出存放在其他航司货架上的货箱仍计入所属航司，记录中的host为寄存货架所属航司，
+在本航司货架上时为None。
+"""
+import heapq
+import itertools
+import threading
+
+from dwell import stored_epoch
+
+POLICIES = ("fifo", "top", "nearest")
+POLICY_LABELS = {"fifo": "先进先出", "top": "顶层优先", "nearest": "就近优先"}
+
+
+def _policy_key(policy, timestamp, x, y, z, host=None):
+    if policy == "fifo":
+        # 与在库时长监控使用同一个整数入库时间戳
+        return (stored_epoch(timestamp), z, y, x)
+    if policy == "top":
+        return (-z, timestamp, y, x)
+    return (x + y + z, timestamp, z)
+
+
+def _heap_key(airline, policy, record):
+    # nearest按寄存货架分堆，其余策略每个航司一个堆
+    return (airline, policy, record[4] if policy == "nearest" else None)
+
+
+class OutboundSelector:
+    def __init__(self):
+        self.boxes = {}   # airline -> {cargo_id: (timestamp, x, y, z, host)}
+        # (airline, policy, host) -> [(key, cargo_id, seq, record), ...]；seq避免比较记录中的host
+        self.heaps = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def clear(self, airline=None):
+        with self._lock:
+            if airline is None:
+                self.boxes.clear()
+                self.heaps.clear()
+            else:
+                self.boxes.pop(airline, None)
+                for key in [key for key in self.heaps if key[0] == airline]:
+                    del self.heaps[key]
+
+    def add(self, airline, cargo_id, timestamp, x, y, z, host=None):
+        with self._lock:
+            self._add(airline, cargo_id, (timestamp, x, y, z, host))
+
+    def _add(self, airline, cargo_id, record):
+        self.boxes.setdefault(airline, {})[cargo_id] = record
+        for policy in POLICIES:
+            heap = self.heaps.setdefault(_heap_key(airline, policy, record), [])
+            heapq.heappush(heap, (_policy_key(policy, *record), cargo_id, next(self._seq), record))
+
+    def load(self, rows):
+        """批量建堆，rows为 (airline, cargo_id, timestamp, x, y, z, host)"""
+        with self._lock:
+            for airline, cargo_id, timestamp, x, y, z, host in rows:
+                self.boxes.setdefault(airline, {})[cargo_id] = (timestamp, x, y, z, host)
+            self.heaps.clear()
+            for airline, records in self.boxes.items():
+                for cargo_id, record in records.items():
+                    for policy in POLICIES:
+                        self.heaps.setdefault(_heap_key(airline, policy, record), []).append(
+                            (_policy_key(policy, *record), cargo_id, next(self._seq), record))
+            for heap in self.heaps.values():
+                heapq.heapify(heap)
+
+    def discard(self, airline, cargo_id):
+        with self._lock:
+            return self.boxes.get(airline, {}).pop(cargo_id, None)
+
+    def move(self, airline, cargo_id, x, y, z, host=None):
+        with self._lock:
+            record = self.boxes.get(airline, {}).get(cargo_id)
+            if record is not None:
+                self._add(airline, cargo_id, (record[0], x, y, z, host))
+
+    def overflow(self):
+        """溢出存放在其他航司货架上的货箱，按入库时间排序，返回 [(airline, cargo_id), ...]"""
+        with self._lock:
+            boxes = [(record[0], airline, cargo_id) for airline, records in self.boxes.items()
+                     for cargo_id, record in records.items() if record[4] is not None]
+        return [(airline, cargo_id) for _, airline, cargo_id in sorted(boxes)]
+
+    def count(self, airline):
+        return len(self.boxes.get(airline, ()))
+
+    def _clean_top(self, heap, records):
+        while heap and records.get(heap[0][1]) != heap[0][3]:
+            heapq.heappop(heap)
+        return heap
+
+    def _best_heap(self, airline, policy, host_costs):
+        """返回堆顶为下一个出库货箱的堆，没有货箱时返回None
+
+        host_costs: {寄存货架(本航司货架为None): AGV到该货架列的代价}，仅nearest使用，缺省为0。
+        """
+        records = self.boxes.get(airline, {})
+        if policy != "nearest":
+            return self._clean_top(self.heaps.get((airline, policy, None), []), records) or None
+        best, best_key = None, None
+        for (owner, heap_policy, host), heap in self.heaps.items():
+            if owner != airline or heap_policy != policy or not self._clean_top(heap, records):
+                continue
+            distance, *rest = heap[0][0]
+            key = (distance + (host_costs or {}).get(host, 0), *rest)
+            if best_key is None or key < best_key:
+                best, best_key = heap, key
+        return best
+
+    def peek(self, airline, policy="fifo", host_costs=None):
+        """按策略返回下一个出库货箱 (cargo_id, timestamp, x, y, z, host)，没有货箱时返回None"""
+        if policy not in POLICIES:
+            raise ValueError(f"未知的出库策略: {policy}")
+        with self._lock:
+            heap = self._best_heap(airline, policy, host_costs)
+            if heap is None:
+                return None
+            _, cargo_id, _, record = heap[0]
+            return (cargo_id, *record)
+
+    def take(self, airline, policy="fifo", count=1, host_costs=None):
+        """按策略取出至多count个货箱并从索引中移除，返回 [(cargo_id, timestamp, x, y, z, host), ...]"""
+        if policy not in POLICIES:
+            raise ValueError(f"未知的出库策略: {policy}")
+        taken = []
+        with self._lock:
+            records = self.boxes.get(airline, {})
+            while len(taken) < count:
+                heap = self._best_heap(airline, policy, host_costs)
+                if heap is None:
+                    break
+                _, cargo_id, _, record = heapq.heappop(heap)
+                del records[cargo_id]
+                taken.append((cargo_id, *record))
+        return taken
+
+    def restore(self, airline, taken):
+        """出库提交失败时把take取出的货箱放回索引"""
+        with self._lock:
+            for cargo_id, *record in taken:
+                self._add(airline, cargo_id, tuple(record))
@@ -0,0 +1,162 @@
+"""货箱按重量重排（re-slotting）
+
+贪心入库加上频繁出入库之后，重货会留在高层、轻货沉在低层。ReslottingPlanner
+在不改变各层货箱数量的前提下，为每个货箱重新分配层（越重越靠下），并给出一组
+尽量少的移库动作；ReslottingScheduler 在货场空闲时于后台线程分批执行这些动作，
+每轮最多执行 max_moves_per_cycle 步，入库请求到来时立即让出。每轮开始时先把
+溢出存放在其他航司货架上的货箱移回本航司货架。
+"""
+import sys
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+import numpy as np
+
+from instrumentation import instruments
+
+Move = namedtuple("Move", ["cargo_id", "source", "target"])
+
+
+class ReslottingPlanner:
+    def target_layers(self, boxes, shape):
+        """保持每层货箱数不变，按重量从重到轻自下而上分配目标层
+
+        boxes: [(cargo_id, weight, (x, y, z)), ...]；重量相同的货箱优先留在原层。
+        """
+        layers = shape[2]
+        counts = np.bincount([pos[2] for _, _, pos in boxes], minlength=layers)
+        ordered = sorted(boxes, key=lambda box: (-box[1], box[2][2]))
+        layer_of_rank = np.repeat(np.arange(layers), counts)
+        return {box[0]: int(layer) for box, layer in zip(ordered, layer_of_rank)}
+
+    def plan(self, occupancy, boxes, max_moves=None):
+        """返回把货箱恢复为重量分层顺序所需的移库序列
+
+        occupancy: 货架占用数组（非0即不可用，含预留位置）；
+        每个错层货箱至多直接移动一次，目标层已满时借用一个空位中转。
+        """
+        occupied = np.asarray(occupancy) != 0
+        targets = self.target_layers(boxes, occupied.shape)
+        positions = {cargo_id: tuple(pos) for cargo_id, _, pos in boxes}
+        by_position = {pos: cargo_id for cargo_id, pos in positions.items()}
+        moves = []
+
+        def misplaced():
+            pending = [cid for cid, pos in positions.items() if pos[2] != targets[cid]]
+            # 离目标层最远的先移
+            return sorted(pending, key=lambda cid: -abs(positions[cid][2] - targets[cid]))
+
+        def free_slot(layer=None, exclude_layer=None):
+            free = np.argwhere(~occupied)
+            if layer is not None:
+                free = free[free[:, 2] == layer]
+            if exclude_layer is not None:
+                free = free[free[:, 2] != exclude_layer]
+            return tuple(int(v) for v in free[0]) if len(free) else None
+
+        def move(cargo_id, target):
+            source = positions[cargo_id]
+            occupied[source] = False
+            occupied[target] = True
+            del by_position[source]
+            by_position[target] = cargo_id
+            positions[cargo_id] = target
+            moves.append(Move(cargo_id, source, target))
+
+        pending = misplaced()
+        while pending and (max_moves is None or len(moves) < max_moves):
+            cargo_id = pending[0]
+            layer = targets[cargo_id]
+            slot = free_slot(layer)
+            if slot is not None:
+                move(cargo_id, slot)
+            else:
+                # 目标层已满：其中必有一个不属于该层的货箱，先把它移走腾出位置
+                blocker = next(cid for pos, cid in by_position.items()
+                               if pos[2] == layer and targets[cid] != layer)
+                vacated = positions[blocker]
+                slot = free_slot(targets[blocker]) or free_slot(exclude_layer=layer)
+                if slot is None:
+                    break  # 货架没有任何空位可以中转
+                move(blocker, slot)
+                if max_moves is not None and len(moves) >= max_moves:
+                    break
+                move(cargo_id, vacated)
+            pending = misplaced()
+        return moves
+
+
+class ReslottingScheduler:
+    """空闲时在后台线程分批执行重排计划
+
+    只有当入库队列为空、且距上次入库超过idle_seconds时才执行，每轮每个货架最多
+    max_moves_per_cycle步；每步单独提交，目标位置被入库请求预留时直接跳过。
+    """
+
+    def __init__(self, cargo_mgr, planner=None, interval=5.0, idle_seconds=10.0,
+                 max_moves_per_cycle=4, on_moved=None):
+        self.cargo_mgr = cargo_mgr
+        self.planner = planner or ReslottingPlanner()
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.max_moves_per_cycle = max_moves_per_cycle
+        self.on_moved = on_moved
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="reslotting", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_idle(self):
+        worker = self.cargo_mgr.placement_worker
+        if worker is not None and worker.pending():
+            return False
+        return time.monotonic() - self.cargo_mgr.last_activity >= self.idle_seconds
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.is_idle():
+                continue
+            # 单轮失败（数据库被锁、货架被其他工位删除等）不能让后台线程退出，记录后等下一轮
+            try:
+                self.run_cycle()
+            except Exception as e:
+                instruments.count("reslotting.errors")
+                print(f"后台重排失败: {e}", file=sys.stderr)
+                traceback.print_exc()
+
+    def run_cycle(self):
+        """对每个货架执行一轮有限步数的重排，返回已执行的移库动作"""
+        done = []
+        with instruments.timer("reslotting.cycle"):
+            # 先把溢出存放在其他航司货架上的货箱移回本航司货架
+            instruments.count("reslotting.rehomed", len(self.cargo_mgr.rehome_overflow(self.max_moves_per_cycle)))
+            for airline in list(self.cargo_mgr.airline_shelves):
+                shelf = self.cargo_mgr.airline_shelves.get(airline)
+                if shelf is None:
+                    continue
+                boxes = self.cargo_mgr.shelf_boxes(airline)
+                plan = self.planner.plan(shelf.storage, boxes, self.max_moves_per_cycle)
+                for move in plan:
+                    if not self.is_idle() and self.idle_seconds > 0:
+                        break  # 有新的入库请求，立即让出
+                    try:
+                        self.cargo_mgr.move_cargo(move.cargo_id, move.target)
+                    except ValueError:
+                        break  # 状态已变化，下一轮重新规划
+                    done.append(move)
+        instruments.count("reslotting.moves", len(done))
+        if done and self.on_moved:
+            self.on_moved(done)
+        return done
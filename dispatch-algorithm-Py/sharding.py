@@ -0,0 +1,206 @@
+"""按航司分片的多进程货场
+
+各航司的货架互不影响，分片模式把航司分配到多个工作进程，每个进程持有自己负责航司的
+货架和一个独立的SQLite分片库，ShardRouter按航司把请求转发到对应进程：不同航司的入库
+在多个CPU核上并行求解和提交；全场查询、按ID出库等操作同时发往所有分片再合并结果。
+
+航司在分片库中保留全场统一的行号（即货场列号），位置字符串与单库模式一致。
+AGV按分片划分，每个分片默认一台，停在该分片第一个航司所在列。
+
+    router = ShardRouter(AIRLINE_LIST, shard_count=4, db_dir="shards")
+    router.smart_store_many([("AEK-001", "东方航空", 120), ("AEK-002", "南方航空", 300)])
+    router.search_cargo("位置", {"行数": "0", "列数": "0", "层数": "0"})
+    router.close()
+"""
+import itertools
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+
+def _shard_main(conn, db_path, journal_path):
+    """分片工作进程：持有一个CargoManager，按顺序执行路由器转发的方法调用"""
+    from Airport import CargoManager
+
+    cargo_mgr = CargoManager(db_path, journal_path=journal_path)
+    with sqlite3.connect(db_path) as db:
+        cargo_mgr.airline_list = [name for name, in db.execute("SELECT name FROM airlines ORDER BY row_index")]
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        request_id, method, args, kwargs = message
+        try:
+            if method.startswith("_"):
+                raise AttributeError(f"不允许调用私有方法: {method}")
+            conn.send((request_id, True, getattr(cargo_mgr, method)(*args, **kwargs)))
+        except Exception as e:
+            conn.send((request_id, False, e))
+    conn.close()
+
+
+class _Shard:
+    def __init__(self, index, db_path, airlines, journal_path, context):
+        self.index = index
+        self.db_path = db_path
+        self.airlines = airlines
+        self._conn, child = context.Pipe()
+        self._pending = {}
+        self._ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self.process = context.Process(target=_shard_main, args=(child, db_path, journal_path),
+                                       name=f"yard-shard-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self._reader = threading.Thread(target=self._read_results, name=f"yard-shard-{index}-reader",
+                                        daemon=True)
+        self._reader.start()
+
+    def submit(self, method, *args, **kwargs):
+        future = Future()
+        with self._send_lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self._conn.send((request_id, method, args, kwargs))
+        return future
+
+    def _read_results(self):
+        while True:
+            try:
+                request_id, ok, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        # 进程退出后仍在等待的请求全部失败
+        for future in self._pending.values():
+            future.set_exception(RuntimeError(f"分片{self.index}已停止"))
+        self._pending.clear()
+
+    def close(self):
+        with self._send_lock:
+            self._conn.send(None)
+        self.process.join()
+        self._reader.join()
+        self._conn.close()
+
+
+class ShardRouter:
+    def __init__(self, airlines, shard_count=None, db_dir=".", prefix="cargo_shard", agv_per_shard=1,
+                 journal=False):
+        from Airport import DatabaseManager
+
+        self.airlines = list(airlines)
+        self.shard_count = max(1, min(shard_count or os.cpu_count() or 1, len(self.airlines)))
+        # 按全场行号轮流分配，保证各分片的航司数相差不超过1
+        self.row_index = {airline: row for row, airline in enumerate(self.airlines)}
+        self.shard_of = {airline: row % self.shard_count for airline, row in self.row_index.items()}
+        # 工作进程用spawn启动，避免fork时复制GUI和后台线程的状态
+        context = multiprocessing.get_context("spawn")
+        self.shards = []
+        for index in range(self.shard_count):
+            owned = [airline for airline in self.airlines if self.shard_of[airline] == index]
+            db_path = os.path.join(db_dir, f"{prefix}_{index}.db")
+            DatabaseManager(db_path).initialize_database()
+            self._seed_shard(db_path, owned, agv_per_shard)
+            journal_path = os.path.splitext(db_path)[0] + ".oplog" if journal else None
+            self.shards.append(_Shard(index, db_path, owned, journal_path, context))
+
+    def _seed_shard(self, db_path, owned, agv_per_shard):
+        """新分片库写入所负责航司的全场行号和AGV，已有数据时保持不变"""
+        with sqlite3.connect(db_path) as conn:
+            if conn.execute("SELECT COUNT(*) FROM airlines").fetchone()[0] == 0:
+                conn.executemany("INSERT INTO airlines (name, row_index) VALUES (?,?)",
+                                 [(airline, self.row_index[airline]) for airline in owned])
+            if conn.execute("SELECT COUNT(*) FROM agv").fetchone()[0] == 0:
+                conn.executemany("INSERT INTO agv (position) VALUES (?)",
+                                 [(self.row_index[owned[0]],)] * agv_per_shard)
+            conn.commit()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 路由 ----
+    def shard_for(self, airline):
+        if airline not in self.shard_of:
+            raise ValueError(f"未知的航空公司: {airline}")
+        return self.shards[self.shard_of[airline]]
+
+    def submit(self, airline, method, *args, **kwargs):
+        """把方法调用转发给航司所在分片，返回Future"""
+        return self.shard_for(airline).submit(method, *args, **kwargs)
+
+    def fan_out(self, method, *args, **kwargs):
+        """同时调用全部分片，按分片顺序返回结果列表"""
+        futures = [shard.submit(method, *args, **kwargs) for shard in self.shards]
+        return [future.result() for future in futures]
+
+    # ---- 入库 ----
+    def smart_store(self, cargo_id, airline, weight):
+        record, error = self.smart_store_many([(cargo_id, airline, weight)])[0]
+        if error:
+            raise error
+        return record
+
+    def smart_store_many(self, items):
+        """按航司拆分后各分片并行组提交，返回与items对应的[(入库记录, 异常), ...]
+
+        货箱ID在全场唯一，提交前先向所有分片查询已存在的ID。
+        """
+        items = list(items)
+        existing = set().union(*self.fan_out("existing_ids", [item[0] for item in items]))
+        results = [None] * len(items)
+        groups = {}
+        seen = set()
+        for i, (cargo_id, airline, weight) in enumerate(items):
+            if cargo_id in existing or cargo_id in seen:
+                results[i] = (None, ValueError("货箱ID已存在"))
+            elif airline not in self.shard_of:
+                results[i] = (None, ValueError(f"未知的航空公司: {airline}"))
+            else:
+                seen.add(cargo_id)
+                groups.setdefault(self.shard_of[airline], []).append(i)
+        futures = {index: self.shards[index].submit("smart_store_batch", [items[i] for i in indices])
+                   for index, indices in groups.items()}
+        for index, future in futures.items():
+            for i, result in zip(groups[index], future.result()):
+                results[i] = result
+        return results
+
+    # ---- 出库 ----
+    def release_airline(self, airline, count=1, policy="fifo"):
+        return self.submit(airline, "release_airline", airline, count, policy).result()
+
+    def retrieve_many(self, cargo_ids):
+        cargo_ids = list(cargo_ids)
+        return [row for rows in self.fan_out("retrieve_many", cargo_ids) for row in rows]
+
+    def retrieve_cargo(self, cargo_id):
+        rows = self.retrieve_many([cargo_id])
+        return rows[0] if rows else None
+
+    def retrieve_all(self):
+        return sum(self.fan_out("retrieve_all"))
+
+    # ---- 查询 ----
+    def search_cargo(self, property, inputs):
+        """按航司查询只发往所在分片，其余查询发往全部分片并按入库时间合并"""
+        if property == "航空公司":
+            return self.submit(inputs[property], "search_cargo", property, inputs).result()
+        rows = [row for rows in self.fan_out("search_cargo", property, inputs) for row in rows]
+        return sorted(rows, key=lambda row: row[2])
+
+    def shelf_boxes(self, airline):
+        return self.submit(airline, "shelf_boxes", airline).result()
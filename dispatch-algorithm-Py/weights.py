@@ -0,0 +1,16 @@
+"""按重量选层的参数，控制台版（AEK_Manager）与图形界面版（Airport）共用
+
+货箱重量占最大重量的比例越高，理想层越靠下；调整分段时只改这里。
+"""
+MAX_WEIGHT = 500
+# 重量占比阈值，依次对应理想层0~3，更轻的货箱放在第4层
+WEIGHT_BANDS = (0.8, 0.6, 0.4, 0.2)
+HEAVY_RATIO = WEIGHT_BANDS[2]  # 达到该占比的重货优先放低层
+LIGHT_RATIO = WEIGHT_BANDS[3]  # 低于该占比的轻货优先放高层
+
+
+def weight_band(weight, layers, max_weight=MAX_WEIGHT):
+    """按重量占比映射理想层：越重越靠下，不超过货架的最高层"""
+    ratio = weight / max_weight
+    band = next((layer for layer, threshold in enumerate(WEIGHT_BANDS) if ratio >= threshold), len(WEIGHT_BANDS))
+    return min(band, layers - 1)